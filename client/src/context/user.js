@@ -2,6 +2,19 @@ import React, { useState, useEffect, useCallback } from "react";
 
 const UserContext = React.createContext();
 
+// Collection endpoints return one page at a time; follow X-Next-Cursor to the end.
+const fetchAllPages = async (url) => {
+  const rows = [];
+  let after = 0;
+  while (after !== null) {
+    const r = await fetch(`${url}?limit=1000&after=${after}`, { credentials: "include" });
+    if (!r.ok) throw new Error(`${url} returned ${r.status}`);
+    rows.push(...(await r.json()));
+    after = r.headers.get("X-Next-Cursor");
+  }
+  return rows;
+};
+
 function UserProvider({ children }) {
   const [user, setUser] = useState(null);
   const [hospitals, setHospitals] = useState([]);
@@ -35,8 +48,7 @@ function UserProvider({ children }) {
   };
 
   const fetchHospitals = useCallback(() => {
-    fetch("http://localhost:5555/hospitals", { credentials: "include" })
-      .then(r => r.json())
+    fetchAllPages("http://localhost:5555/hospitals")
       .then(data => setHospitals(data))
       .catch(err => {
         console.error("Failed to fetch hospitals:", err);
@@ -45,8 +57,7 @@ function UserProvider({ children }) {
   }, []);
 
   const fetchDepartments = useCallback(() => {
-    fetch("http://localhost:5555/departments", { credentials: "include" })
-      .then(r => r.json())
+    fetchAllPages("http://localhost:5555/departments")
       .then(data => setDepartments(data))
       .catch(err => {
         console.error("Failed to fetch departments:", err);
@@ -1,23 +1,46 @@
 #!/usr/bin/env python3
 
 # Standard library imports
-from datetime import datetime
+import hashlib
+import json
+import time
+from collections import namedtuple
+from functools import wraps
+from datetime import date, datetime, timezone
+from urllib.parse import urlencode
 
 # Remote library imports
-from flask import request, session, make_response
-from flask_restful import Resource
+from flask import Response, g, request, session, make_response, stream_with_context
+from flask_restful import Resource, abort
 from flask_cors import cross_origin
+from sqlalchemy import event, select
 
 # Local imports
-from config import app, db, api, ma, bcrypt
-from models import User, Hospital, Department, Patient
+from bulk import (
+    EXPORT_MIMETYPES, PLACEMENT_KEYS, PatientImport, delete_placement, export_chunks, read_rows, stream_format,
+    transfer_patients,
+)
+from caching import TTLCache, create_response_cache
+from census import census_report, reconcile_command
+from changes import change_feed, compact_command, latest_version
+from config import app, db, api, ma, bcrypt, broker
+from database import commit, sync_replicas_command
+from instrumentation import TimedDumpMixin
+from models import (
+    User, Hospital, Department, Patient, Shift, Availability, TableVersion, ALL_PATIENTS_VERSION,
+    CHANGES_FLOOR_VERSION, deferred_unique_checks, patient_version_name
+)
+from passwords import PasswordHasherBusy
+from scheduler import current_time, repair_command, repair_schedules, repair_summary, schedule_week, week_bounds
+from search import search
+from seed import seed_command
 
 
 # --------------------
 # Schemas
 # --------------------
 
-class UserSchema(ma.SQLAlchemySchema):
+class UserSchema(TimedDumpMixin, ma.SQLAlchemySchema):
     class Meta:
         model = User
         load_instance = True
@@ -29,36 +52,54 @@ class UserSchema(ma.SQLAlchemySchema):
     hospitals = ma.Method("get_hospitals")
     departments = ma.Method("get_departments")
 
-    def get_hospitals(self, user):
-        hospitals_data = []
-        unique_hospitals = {p.hospital.id: p.hospital for p in user.patients if p.hospital}
+    def dump(self, obj, *, many=None):
+        many = self.many if many is None else bool(many)
+        users = obj if many else [obj]
+        caseloads = {user.id: [] for user in users}
 
-        for hospital in unique_hospitals.values():
-            user_patients = [p for p in hospital.patients if p.user_id == user.id]
-            hospital_dict = hospital_schema.dump(hospital)
-            hospital_dict["patients"] = patients_schema.dump(user_patients)
-            hospitals_data.append(hospital_dict)
+        if caseloads and self.fields.keys() & {"patients", "hospitals", "departments"}:
+            patients = (
+                Patient.with_relations(patients_schema.fields)
+                .filter(Patient.user_id.in_(caseloads))
+                .order_by(Patient.id)
+            )
+            for patient in patients:
+                caseloads[patient.user_id].append(patient)
 
-        return hospitals_data
-    
-    def get_departments(self, user):
-        departments_data = []
-        unique_departments = {p.department.id: p.department for p in user.patients if p.department}
+        loaded = [Caseload(user.id, user.name, caseloads[user.id]) for user in users]
+        return super().dump(loaded if many else loaded[0], many=many)
+
+    def get_hospitals(self, caseload):
+        return group_patients(caseload.patients, "hospital", hospital_schema)
+
+    def get_departments(self, caseload):
+        return group_patients(caseload.patients, "department", department_schema)
+
+
+Caseload = namedtuple("Caseload", ["id", "name", "patients"])
+
+
+def group_patients(patients, relation, schema):
+    groups = {}
+    for patient in patients:
+        parent = getattr(patient, relation)
+        if parent:
+            groups.setdefault(parent.id, (parent, []))[1].append(patient)
 
-        for department in unique_departments.values():
-            user_patients = [p for p in department.patients if p.user_id == user.id]
-            department_dict = department_schema.dump(department)
-            department_dict["patients"] = patients_schema.dump(user_patients)
-            departments_data.append(department_dict)
+    grouped_data = []
+    for parent, parent_patients in groups.values():
+        parent_dict = schema.dump(parent)
+        parent_dict["patients"] = patients_schema.dump(parent_patients)
+        grouped_data.append(parent_dict)
 
-        return departments_data
+    return grouped_data
 
 
 user_schema = UserSchema()
 users_schema = UserSchema(many=True)
 
 
-class PatientSchema(ma.SQLAlchemySchema):
+class PatientSchema(TimedDumpMixin, ma.SQLAlchemySchema):
     class Meta:
         model = Patient
         load_instance = True
@@ -74,7 +115,7 @@ patient_schema = PatientSchema()
 patients_schema = PatientSchema(many=True)
 
 
-class HospitalSchema(ma.SQLAlchemySchema):
+class HospitalSchema(TimedDumpMixin, ma.SQLAlchemySchema):
     class Meta:
         model = Hospital
         load_instance = True
@@ -88,7 +129,7 @@ hospital_schema = HospitalSchema()
 hospitals_schema = HospitalSchema(many=True)
 
 
-class DepartmentSchema(ma.SQLAlchemySchema):
+class DepartmentSchema(TimedDumpMixin, ma.SQLAlchemySchema):
     class Meta:
         model = Department
         load_instance = True
@@ -101,14 +142,238 @@ department_schema = DepartmentSchema()
 departments_schema = DepartmentSchema(many=True)
 
 
+class ShiftSchema(TimedDumpMixin, ma.SQLAlchemySchema):
+    class Meta:
+        model = Shift
+        load_instance = True
+
+    id = ma.auto_field()
+    starts_at = ma.DateTime()
+    ends_at = ma.DateTime()
+    required_nurses = ma.auto_field()
+    hospital = ma.Nested("HospitalSchema", only=("id", "name"))
+    department = ma.Nested("DepartmentSchema", only=("id", "name"))
+    nurses = ma.Method("get_nurses")
+
+    def get_nurses(self, shift):
+        users = sorted((assignment.user for assignment in shift.assignments), key=lambda user: user.id)
+        return [{"id": user.id, "name": user.name} for user in users]
+
+
+shift_schema = ShiftSchema(exclude=("nurses",))
+shifts_schema = ShiftSchema(many=True, exclude=("nurses",))
+schedule_schema = ShiftSchema(many=True)
+
+
+class AvailabilitySchema(TimedDumpMixin, ma.SQLAlchemySchema):
+    class Meta:
+        model = Availability
+        load_instance = True
+
+    id = ma.auto_field()
+    starts_at = ma.DateTime()
+    ends_at = ma.DateTime()
+
+
+availability_schema = AvailabilitySchema()
+availabilities_schema = AvailabilitySchema(many=True)
+
+
+# --------------------
+# Pagination
+# --------------------
+
+Page = namedtuple("Page", ["limit", "after", "schema"])
+
+
+def page_from_request(schema_class):
+    try:
+        limit = int(request.args.get("limit", app.config["PAGE_SIZE"]))
+        after = int(request.args.get("after", 0))
+    except ValueError:
+        abort(400, error="400: limit and after must be integers")
+
+    if limit < 1:
+        abort(400, error="400: limit must be positive")
+
+    only = [field.strip() for field in request.args.get("fields", "").split(",") if field.strip()]
+    if only:
+        unknown = sorted(set(only) - set(schema_class._declared_fields))
+        if unknown:
+            abort(400, error=f"400: Unknown fields: {', '.join(unknown)}")
+
+    schema = schema_class(many=True, only=only or None)
+    return Page(min(limit, app.config["MAX_PAGE_SIZE"]), after, schema)
+
+
+def page_response(query, model, page):
+    rows = (
+        query.filter(model.id > page.after)
+        .order_by(None)
+        .order_by(model.id)
+        .limit(page.limit + 1)
+        .all()
+    )
+    has_next = len(rows) > page.limit
+    rows = rows[:page.limit]
+
+    response = make_response(page.schema.dump(rows), 200)
+    if has_next:
+        next_cursor = rows[-1].id
+        args = {**request.args.to_dict(), "after": next_cursor, "limit": page.limit}
+        response.headers["Link"] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return response
+
+
+# --------------------
+# Conditional GET
+# --------------------
+
+versioned_responses = TTLCache(
+    maxsize=app.config["VERSIONED_CACHE_SIZE"], ttl=app.config["VERSIONED_CACHE_TTL"]
+)
+
+
+def versioned_response(table, build):
+    if g.get("batch", False):
+        # Uncommitted writes in the batch may already show in the response.
+        return build()
+
+    digest = hashlib.sha1(request.url.encode("utf-8")).hexdigest()[:16]
+    etag = f"{table}-{TableVersion.current(table)}-{digest}"
+
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+
+    cached = versioned_responses.get(etag)
+    if cached is None:
+        response = build()
+        if response.status_code != 200:
+            return response
+        headers = [(key, value) for key, value in response.headers if key != "Content-Length"]
+        cached = (response.get_data(), headers)
+        versioned_responses.set(etag, cached)
+
+    body, headers = cached
+    response = app.response_class(body, 200, headers)
+    response.set_etag(etag)
+    return response
+
+
+# --------------------
+# Per-user Response Cache
+# --------------------
+
+response_cache = create_response_cache(app.config)
+
+
+def user_cached(method):
+    """Cache a GET handler's 200 responses per user, URL and data version.
+
+    Any patient write for the user, or any hospital/department write, bumps a
+    version in the key, so stale entries are never read and age out of the LRU.
+    """
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        # Inside a batch the response may show writes that are later rolled back.
+        if response_cache is None or not g.user or g.get("batch", False):
+            return method(*args, **kwargs)
+
+        version_names = [
+            ALL_PATIENTS_VERSION, patient_version_name(g.user.id), Hospital.__tablename__, Department.__tablename__
+        ]
+        versions = ".".join(str(version) for version in TableVersion.current_many(version_names))
+        key = f"{request.endpoint}|{g.user.id}|{request.url}|{versions}"
+
+        cached = response_cache.get(key)
+        if cached is not None:
+            headers, body = cached.split(b"\n", 1)
+            return app.response_class(body, 200, json.loads(headers))
+
+        response = method(*args, **kwargs)
+        if isinstance(response, app.response_class) and response.status_code == 200:
+            headers = [[name, value] for name, value in response.headers if name != "Content-Length"]
+            response_cache.set(key, json.dumps(headers).encode("utf-8") + b"\n" + response.get_data())
+        return response
+
+    return wrapper
+
+
+# --------------------
+# Export
+# --------------------
+
+def export_response(query, filename):
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in EXPORT_MIMETYPES:
+        abort(400, error="400: format must be ndjson or csv")
+
+    chunks = export_chunks(query, fmt, yield_per=app.config["EXPORT_YIELD_PER"])
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+# --------------------
+# Dates
+# --------------------
+
+def parse_week(value):
+    if not value:
+        return date.today()
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        abort(400, error="400: Invalid week format. Use YYYY-MM-DD")
+
+
+def parse_datetime(data, key):
+    try:
+        value = datetime.fromisoformat(data.get(key) or "")
+    except (TypeError, ValueError):
+        abort(400, error=f"400: Invalid {key} format. Use YYYY-MM-DDTHH:MM")
+    # Times are stored naive, in UTC.
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
 # --------------------
 # Authentication Middleware
 # --------------------
 
+UserIdentity = namedtuple("UserIdentity", ["id", "name"])
+
+user_identities = TTLCache(
+    maxsize=app.config["USER_CACHE_SIZE"], ttl=app.config["USER_CACHE_TTL"]
+)
+
+
+def load_user_identity(user_id):
+    identity = user_identities.get(user_id)
+    if identity is None:
+        row = db.session.execute(select(User.id, User.name).where(User.id == user_id)).first()
+        if row:
+            identity = UserIdentity(*row)
+            user_identities.set(user_id, identity)
+    return identity
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_user_identity(mapper, connection, target):
+    user_identities.pop(target.id)
+
+
 @app.before_request
 def check_if_logged_in():
     if request.method == "OPTIONS":
         return
+    user_id = session.get("user_id")
+    g.user = load_user_identity(user_id) if user_id else None
     allowed_routes = [
         "login",
         "signup",
@@ -116,8 +381,9 @@ def check_if_logged_in():
         "index",
         "hospitals",
         "departments",
+        "metrics",
     ]
-    if request.endpoint not in allowed_routes and not session.get("user_id"):
+    if request.endpoint not in allowed_routes and not g.user:
         return {"error": "401: Unauthorized"}, 401
 
 
@@ -130,6 +396,10 @@ class Index(Resource):
         return "<h1>Project Server</h1>"
 
 
+def hasher_busy():
+    return {"error": "429: Too many logins in progress, try again shortly"}, 429, {"Retry-After": "1"}
+
+
 class Login(Resource):
     def post(self):
         data = request.get_json()
@@ -140,10 +410,25 @@ class Login(Resource):
             return {"error": "400: Name and password are required"}, 400
 
         user = User.query.filter_by(name=name).first()
-        if not user or not user.authenticate(password):
-            return {"error": "401: Invalid username or password"}, 401
+        try:
+            if not user or not user.authenticate(password):
+                return {"error": "401: Invalid username or password"}, 401
+        except PasswordHasherBusy:
+            return hasher_busy()
+
+        # Upgrade hashes made with a different BCRYPT_LOG_ROUNDS while the
+        # plain password is at hand. The password checked out, so a busy
+        # hasher only postpones the upgrade to a later login.
+        if user.needs_rehash:
+            try:
+                user.password_hash = password
+            except PasswordHasherBusy:
+                pass
+            else:
+                commit(db.session)
 
         session["user_id"] = user.id
+        user_identities.set(user.id, UserIdentity(user.id, user.name))
         return make_response(user_schema.dump(user), 200)
 
 
@@ -160,9 +445,12 @@ class Signup(Resource):
             return {"error": "400: User already exists"}, 400
 
         new_user = User(name=name)
-        new_user.password_hash = password
+        try:
+            new_user.password_hash = password
+        except PasswordHasherBusy:
+            return hasher_busy()
         db.session.add(new_user)
-        db.session.commit()
+        commit(db.session)
 
         session["user_id"] = new_user.id
         return make_response(user_schema.dump(new_user), 201)
@@ -170,7 +458,7 @@ class Signup(Resource):
 
 class CheckSession(Resource):
     def get(self):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if user:
             return make_response(user_schema.dump(user), 200)
         return {"message": "401: Not Authorized"}, 401
@@ -188,15 +476,18 @@ class Logout(Resource):
 
 class Patients(Resource):
     @cross_origin(supports_credentials=True, origins="http://localhost:3000")
+    @user_cached
     def get(self):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "404: User not found"}, 404
 
-        return make_response(patients_schema.dump(user.patients), 200)
+        page = page_from_request(PatientSchema)
+        patients = Patient.query_for_user(user.id, only=page.schema.fields)
+        return page_response(patients, Patient, page)
 
     def post(self):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "404: User not found"}, 404
 
@@ -227,16 +518,92 @@ class Patients(Resource):
             return {"error": "404: Department not found"}, 404
 
         new_patient = Patient(
-            name=name, date_of_birth=date_of_birth, user=user, hospital=hospital, department=department
+            name=name, date_of_birth=date_of_birth, user_id=user.id, hospital=hospital, department=department
         )
         db.session.add(new_patient)
-        db.session.commit()
+        commit(db.session)
         return make_response(patient_schema.dump(new_patient), 201)
 
 
+class PatientsBulk(Resource):
+    def post(self):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        fmt = stream_format(request.mimetype)
+        if not fmt:
+            return {"error": "415: Send patients as application/x-ndjson or text/csv"}, 415
+
+        patient_import = PatientImport(user.id, chunk_size=app.config["BULK_CHUNK_SIZE"])
+        patient_import.run(read_rows(request.stream, fmt))
+        commit(db.session)
+
+        status = 201 if patient_import.inserted else 400
+        return make_response(patient_import.report(), status)
+
+
+class PatientsExport(Resource):
+    def get(self):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        return export_response(Patient.query_for_user(user.id), "patients")
+
+
+def placement_arg(data, field):
+    """Read ``{"hospital_id": ..., "department_id": ...}`` (either or both)
+    from ``data[field]``; raise ValueError if it is not one."""
+    placement = data.get(field)
+    if not isinstance(placement, dict) or not placement or set(placement) - {"hospital_id", "department_id"}:
+        raise ValueError(f"{field} must give a hospital_id, a department_id or both")
+    if not all(type(value) is int for value in placement.values()):
+        raise ValueError(f"{field} ids must be integers")
+    return placement
+
+
+class PatientsTransfer(Resource):
+    def post(self):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or ("patient_ids" in data) == ("from" in data):
+            return {"error": "400: Give either patient_ids or from"}, 400
+
+        patient_ids = data.get("patient_ids")
+        source = None
+        try:
+            target = placement_arg(data, "to")
+            if patient_ids is None:
+                source = placement_arg(data, "from")
+        except ValueError as error:
+            return {"error": f"400: {error}"}, 400
+        if patient_ids is not None:
+            if not isinstance(patient_ids, list) or not all(type(patient_id) is int for patient_id in patient_ids):
+                return {"error": "400: patient_ids must be a list of integers"}, 400
+            if len(patient_ids) > app.config["BULK_TRANSFER_MAX_IDS"]:
+                return {"error": f"400: At most {app.config['BULK_TRANSFER_MAX_IDS']} patient_ids per transfer"}, 400
+
+        for model, key in PLACEMENT_KEYS.items():
+            if key in target and db.session.get(model, target[key]) is None:
+                return {"error": f"404: {model.__name__} not found"}, 404
+
+        matched, transferred = transfer_patients(
+            user.id, target, app.config["BULK_TRANSFER_CHUNK_SIZE"], patient_ids=patient_ids, source=source
+        )
+        body = {"matched": matched, "transferred": transferred, "unchanged": matched - transferred}
+        if patient_ids is not None:
+            # Other nurses' patients are counted as not found, not as forbidden.
+            body["not_found"] = len(set(patient_ids)) - matched
+        return make_response(body, 200)
+
+
 class PatientDetail(Resource):
     def get(self, patient_id):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "401: Unauthorized"}, 401
 
@@ -250,7 +617,7 @@ class PatientDetail(Resource):
         return make_response(patient_schema.dump(patient), 200)
 
     def patch(self, patient_id):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "401: Unauthorized"}, 401
 
@@ -288,11 +655,11 @@ class PatientDetail(Resource):
                 return {"error": "404: Department not found"}, 404
             patient.department = department
 
-        db.session.commit()
+        commit(db.session)
         return make_response(patient_schema.dump(patient), 202)
 
     def delete(self, patient_id):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "401: Unauthorized"}, 401
 
@@ -304,7 +671,7 @@ class PatientDetail(Resource):
             return {"error": "403: Forbidden"}, 403
 
         db.session.delete(patient)
-        db.session.commit()
+        commit(db.session)
         return make_response("", 204)
 
 
@@ -314,8 +681,9 @@ class PatientDetail(Resource):
 
 class Hospitals(Resource):
     def get(self):
-        hospitals = Hospital.query.all()
-        return make_response(hospitals_schema.dump(hospitals), 200)
+        return versioned_response("hospitals", lambda: page_response(
+            Hospital.query, Hospital, page_from_request(HospitalSchema)
+        ))
 
     def post(self):
         data = request.get_json()
@@ -324,13 +692,14 @@ class Hospitals(Resource):
             phone_number=data.get("phone_number")
         )
         db.session.add(new_hospital)
-        db.session.commit()
+        commit(db.session)
         return make_response(hospital_schema.dump(new_hospital), 201)
 
 
 class HospitalDetail(Resource):
+    @user_cached
     def get(self, hospital_id):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "401: Unauthorized"}, 401
 
@@ -338,8 +707,8 @@ class HospitalDetail(Resource):
         if not hospital:
             return {"message": "404: Hospital not found"}, 404
 
-        patients = Patient.query.filter_by(
-            hospital_id=hospital.id, user_id=user.id
+        patients = Patient.query_for_user(
+            user.id, only=patients_schema.fields, hospital_id=hospital.id
         ).all()
 
         hospital_data = hospital_schema.dump(hospital)
@@ -347,7 +716,7 @@ class HospitalDetail(Resource):
         return make_response(hospital_data, 200)
 
     def patch(self, hospital_id):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "401: Unauthorized"}, 401
 
@@ -359,11 +728,11 @@ class HospitalDetail(Resource):
         for attr in request.json:
             setattr(hospital, attr, data[attr])
 
-        db.session.commit()
+        commit(db.session)
         return make_response(hospital_schema.dump(hospital), 202)
 
     def delete(self, hospital_id):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "401: Unauthorized"}, 401
 
@@ -371,41 +740,55 @@ class HospitalDetail(Resource):
         if not hospital:
             return {"message": "404: Hospital not found"}, 404
 
-        db.session.delete(hospital)
-        db.session.commit()
-        return make_response("", 204)
+        deleted = delete_placement(Hospital, hospital.id, app.config["BULK_DELETE_CHUNK_SIZE"])
+        return make_response({"deleted_patients": deleted}, 200)
     
 
 class HospitalPatients(Resource):
+    @user_cached
     def get(self, hospital_id):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "401: Unauthorized"}, 401
 
-        patients = Patient.query.filter_by(hospital_id=hospital_id, user_id=user.id).all()
+        patients = Patient.query_for_user(
+            user.id, only=patients_schema.fields, hospital_id=hospital_id
+        ).all()
         return make_response(patients_schema.dump(patients), 200)
 
 
+class HospitalPatientsExport(Resource):
+    def get(self, hospital_id):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        patients = Patient.query_for_user(user.id, hospital_id=hospital_id)
+        return export_response(patients, f"hospital-{hospital_id}-patients")
+
+
 # --------------------
 # Departments
 # --------------------
 
 class Departments(Resource):
     def get(self):
-        departments = Department.query.all()
-        return make_response(departments_schema.dump(departments), 200)
+        return versioned_response("departments", lambda: page_response(
+            Department.query, Department, page_from_request(DepartmentSchema)
+        ))
 
     def post(self):
         data = request.get_json()
         new_department = Department(name=data.get("name"))
         db.session.add(new_department)
-        db.session.commit()
+        commit(db.session)
         return make_response(department_schema.dump(new_department), 201)
 
 
 class DepartmentDetail(Resource):
+    @user_cached
     def get(self, department_id):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "401: Unauthorized"}, 401
 
@@ -413,8 +796,8 @@ class DepartmentDetail(Resource):
         if not department:
             return {"message": "404: Department not found"}, 404
 
-        patients = Patient.query.filter_by(
-            department_id=department.id, user_id=user.id
+        patients = Patient.query_for_user(
+            user.id, only=patients_schema.fields, department_id=department.id
         ).all()
 
         department_data = department_schema.dump(department)
@@ -422,7 +805,7 @@ class DepartmentDetail(Resource):
         return make_response(department_data, 200)
 
     def patch(self, department_id):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "401: Unauthorized"}, 401
 
@@ -434,11 +817,11 @@ class DepartmentDetail(Resource):
         for attr in request.json:
             setattr(department, attr, data[attr])
 
-        db.session.commit()
+        commit(db.session)
         return make_response(department_schema.dump(department), 202)
 
     def delete(self, department_id):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "401: Unauthorized"}, 401
 
@@ -446,39 +829,349 @@ class DepartmentDetail(Resource):
         if not department:
             return {"message": "404: Department not found"}, 404
 
-        db.session.delete(department)
-        db.session.commit()
-        return make_response("", 204)
+        deleted = delete_placement(Department, department.id, app.config["BULK_DELETE_CHUNK_SIZE"])
+        return make_response({"deleted_patients": deleted}, 200)
     
     
 class DepartmentPatients(Resource):
+    @user_cached
     def get(self, department_id):
-        user = User.query.get(session.get("user_id"))
+        user = g.user
         if not user:
             return {"error": "401: Unauthorized"}, 401
 
-        patients = Patient.query.filter_by(department_id=department_id, user_id=user.id).all()
+        patients = Patient.query_for_user(
+            user.id, only=patients_schema.fields, department_id=department_id
+        ).all()
         return make_response(patients_schema.dump(patients), 200)
 
 
+class DepartmentPatientsExport(Resource):
+    def get(self, department_id):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        patients = Patient.query_for_user(user.id, department_id=department_id)
+        return export_response(patients, f"department-{department_id}-patients")
+
+
 # --------------------
 # Users
 # --------------------
 
 class Users(Resource):
     def get(self):
-        users = User.query.all()
-        return make_response(users_schema.dump(users), 200)
+        page = page_from_request(UserSchema)
+        return page_response(User.query, User, page)
 
 
 class UserDetail(Resource):
-    def get(self, id):
-        user = User.query.get(id)
+    def get(self, user_id):
+        user = User.query.get(user_id)
         if not user:
             return {"error": "404: User not found"}, 404
         return make_response(user_schema.dump(user), 200)
 
 
+# --------------------
+# Scheduling
+# --------------------
+
+class Shifts(Resource):
+    def get(self):
+        starts_at, ends_at = week_bounds(parse_week(request.args.get("week")))
+        shifts = Shift.between(starts_at, ends_at).all()
+        return make_response(shifts_schema.dump(shifts), 200)
+
+    def post(self):
+        data = request.get_json()
+        hospital_id = data.get("hospital_id")
+        department_id = data.get("department_id")
+
+        if not all([hospital_id, department_id, data.get("starts_at"), data.get("ends_at")]):
+            return {"error": "400: hospital_id, department_id, starts_at and ends_at are required"}, 400
+
+        hospital = Hospital.query.get(hospital_id)
+        if not hospital:
+            return {"error": "404: Hospital not found"}, 404
+
+        department = Department.query.get(department_id)
+        if not department:
+            return {"error": "404: Department not found"}, 404
+
+        try:
+            new_shift = Shift(
+                hospital=hospital,
+                department=department,
+                starts_at=parse_datetime(data, "starts_at"),
+                ends_at=parse_datetime(data, "ends_at"),
+                required_nurses=data.get("required_nurses"),
+            )
+        except ValueError as error:
+            return {"error": f"400: {error}"}, 400
+
+        db.session.add(new_shift)
+        commit(db.session)
+        return make_response(shift_schema.dump(new_shift), 201)
+
+
+class Availabilities(Resource):
+    def get(self):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        starts_at, ends_at = week_bounds(parse_week(request.args.get("week")))
+        availabilities = (
+            Availability.query
+            .filter(Availability.user_id == user.id)
+            .filter(Availability.ends_at > starts_at, Availability.starts_at < ends_at)
+            .order_by(Availability.starts_at)
+            .all()
+        )
+        return make_response(availabilities_schema.dump(availabilities), 200)
+
+    def post(self):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        data = request.get_json()
+        try:
+            new_availability = Availability(
+                user_id=user.id,
+                starts_at=parse_datetime(data, "starts_at"),
+                ends_at=parse_datetime(data, "ends_at"),
+            )
+        except ValueError as error:
+            return {"error": f"400: {error}"}, 400
+
+        db.session.add(new_availability)
+        commit(db.session)
+        return make_response(availability_schema.dump(new_availability), 201)
+
+
+class Schedules(Resource):
+    def get(self):
+        starts_at, ends_at = week_bounds(parse_week(request.args.get("week")))
+        shifts = Shift.between(starts_at, ends_at, with_nurses=True).all()
+        return make_response(schedule_schema.dump(shifts), 200)
+
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        week = parse_week(data.get("week"))
+
+        started = time.perf_counter()
+        shifts, schedule = schedule_week(
+            week,
+            patients_per_nurse=app.config["SCHEDULER_PATIENTS_PER_NURSE"],
+            float_penalty=app.config["SCHEDULER_FLOAT_PENALTY"],
+        )
+        commit(db.session)
+
+        return make_response({
+            "week": week_bounds(week)[0].date().isoformat(),
+            "shifts": len(shifts),
+            "demand": sum(shift.demand for shift in shifts),
+            "assigned": len(schedule.assignments),
+            "unfilled": sum(schedule.unfilled.values()),
+            "unfilled_shifts": sorted(schedule.unfilled),
+            "cost": schedule.cost,
+            "seconds": round(time.perf_counter() - started, 3),
+        }, 201)
+
+
+class Census(Resource):
+    def get(self):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        return make_response(census_report(user.id), 200)
+
+
+def changed_rows(query, model, schema, ids):
+    """Dump the rows of ``query`` among ``ids``; ids no longer found were deleted since."""
+    rows = query.filter(model.id.in_(ids)).all() if ids else []
+    found = {row.id for row in rows}
+    return schema.dump(rows), [row_id for row_id in ids if row_id not in found]
+
+
+class Changes(Resource):
+    def get(self):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        since = request.args.get("since")
+        if since is None:
+            # A client starts here, loads everything, then polls from this version.
+            return make_response({"version": latest_version()}, 200)
+        try:
+            since = int(since)
+        except ValueError:
+            return {"error": "400: Invalid since. Use a version from /changes"}, 400
+        if since < 0:
+            return {"error": "400: Invalid since. Use a version from /changes"}, 400
+
+        floor = TableVersion.current(CHANGES_FLOOR_VERSION)
+        if since < floor:
+            # Deletions after ``since`` were compacted away: reload everything,
+            # then poll from the version returned.
+            return {"error": "410: Changes since this version are no longer available. Reload", "version": latest_version()}, 410
+
+        version, more, upserted, deleted = change_feed(user.id, since, app.config["CHANGES_PAGE_SIZE"])
+        body = {"version": version, "more": more}
+        for table, query, model, schema in (
+            ("hospitals", Hospital.query, Hospital, hospitals_schema),
+            ("departments", Department.query, Department, departments_schema),
+            ("patients", Patient.query_for_user(user.id, only=patients_schema.fields), Patient, patients_schema),
+        ):
+            rows, missing = changed_rows(query, model, schema, upserted[table])
+            body[table] = {"upserted": rows, "deleted": deleted[table] + missing}
+        return make_response(body, 200)
+
+
+# Sessions, streams and uploads need a request of their own.
+BATCH_EXCLUDED_ENDPOINTS = {
+    "batch", "login", "signup", "logout", "events", "patientsbulk",
+    "patientsexport", "hospitalpatientsexport", "departmentpatientsexport",
+}
+BATCH_METHODS = {"GET", "POST", "PATCH", "DELETE"}
+BATCH_HEADERS = ("Link", "X-Next-Cursor")
+
+
+def run_batch_operation(operation):
+    """Dispatch one operation of a batch to its resource and return the response.
+
+    Only the routing and the handler run: before_request hooks are skipped,
+    so the batch's user, resolved once, serves every operation.
+    """
+    with app.test_request_context(
+        operation["path"], base_url=request.root_url, method=operation["method"], json=operation.get("body")
+    ):
+        if request.routing_exception is not None:
+            error = request.routing_exception
+            return make_response({"error": f"{error.code}: {error.name}"}, error.code)
+        if request.endpoint in BATCH_EXCLUDED_ENDPOINTS:
+            return make_response({"error": f"400: {operation['path']} cannot run in a batch"}, 400)
+        try:
+            # Names are checked once per flush, which raises outside the
+            # handler's own error handling.
+            with deferred_unique_checks(db.session):
+                rv = app.dispatch_request()
+        except ValueError as error:
+            rv = {"error": f"400: {error}"}, 400
+        except Exception as error:
+            rv = app.handle_user_exception(error)
+        return app.make_response(rv)
+
+
+class Batch(Resource):
+    def post(self):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        data = request.get_json(silent=True) or {}
+        operations = data.get("requests")
+        if not isinstance(operations, list) or not operations:
+            return {"error": "400: requests must be a non-empty list"}, 400
+        if len(operations) > app.config["BATCH_MAX_REQUESTS"]:
+            return {"error": f"400: A batch holds at most {app.config['BATCH_MAX_REQUESTS']} requests"}, 400
+        for operation in operations:
+            if (
+                not isinstance(operation, dict)
+                or str(operation.get("method", "")).upper() not in BATCH_METHODS
+                or not str(operation.get("path", "")).startswith("/")
+            ):
+                return {"error": "400: Each request needs a method (GET, POST, PATCH or DELETE) and a path"}, 400
+            operation["method"] = operation["method"].upper()
+
+        # Operations flush instead of committing; all of them commit together,
+        # or none do if one fails.
+        g.batch = True
+        results = []
+        try:
+            for operation in operations:
+                response = run_batch_operation(operation)
+                result = {"status": response.status_code, "body": response.get_json(silent=True)}
+                headers = {name: response.headers[name] for name in BATCH_HEADERS if name in response.headers}
+                if headers:
+                    result["headers"] = headers
+                results.append(result)
+                if response.status_code >= 400:
+                    db.session.rollback()
+                    return make_response({"committed": False, "results": results}, response.status_code)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            g.batch = False
+
+        return make_response({"committed": True, "results": results}, 200)
+
+
+class Search(Resource):
+    def get(self):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        query = request.args.get("q", "")
+        try:
+            limit = int(request.args.get("limit", app.config["SEARCH_PAGE_SIZE"]))
+            offset = int(request.args.get("offset", 0))
+        except ValueError:
+            return {"error": "400: limit and offset must be integers"}, 400
+        if limit < 1 or offset < 0:
+            return {"error": "400: limit must be positive and offset not negative"}, 400
+        limit = min(limit, app.config["MAX_PAGE_SIZE"])
+
+        results, has_next = search(user.id, query, limit, offset)
+        if results is None:
+            return {"error": "400: q must contain a word to search for"}, 400
+
+        response = make_response(results, 200)
+        if has_next:
+            args = {**request.args.to_dict(), "offset": offset + limit, "limit": limit}
+            response.headers["Link"] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+            response.headers["X-Next-Cursor"] = str(offset + limit)
+        return response
+
+
+class Events(Resource):
+    def get(self):
+        user = g.user
+        if not user:
+            return {"error": "401: Unauthorized"}, 401
+
+        # Deliberately not stream_with_context: the request context, and the
+        # database session with it, is released before the stream starts, so
+        # an open stream holds no pooled connection.
+        response = Response(broker.stream(user.id), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+
+class SchedulesRepair(Resource):
+    def post(self):
+        started = time.perf_counter()
+        cells, repairs = repair_schedules(
+            current_time(),
+            patients_per_nurse=app.config["SCHEDULER_PATIENTS_PER_NURSE"],
+            float_penalty=app.config["SCHEDULER_FLOAT_PENALTY"],
+        )
+        commit(db.session)
+
+        summary = repair_summary(cells, repairs)
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        return make_response(summary, 200)
+
+
 # --------------------
 # Routes
 # --------------------
@@ -490,19 +1183,46 @@ api.add_resource(CheckSession, "/check_session", endpoint="checksession")
 api.add_resource(Logout, "/logout")
 
 api.add_resource(Patients, "/patients")
+api.add_resource(PatientsBulk, "/patients/bulk", endpoint="patientsbulk")
+api.add_resource(PatientsExport, "/patients/export", endpoint="patientsexport")
+api.add_resource(PatientsTransfer, "/patients/transfer", endpoint="patientstransfer")
 api.add_resource(PatientDetail, "/patients/<int:patient_id>", endpoint="patientbyid")
 
 api.add_resource(Hospitals, "/hospitals")
 api.add_resource(HospitalDetail, "/hospitals/<int:hospital_id>", endpoint="hospitalbyid")
 api.add_resource(HospitalPatients, "/hospitals/<int:hospital_id>/patients")
+api.add_resource(HospitalPatientsExport, "/hospitals/<int:hospital_id>/patients/export")
 
 api.add_resource(Departments, "/departments")
 api.add_resource(DepartmentDetail, "/departments/<int:department_id>", endpoint="departmentbyid")
 api.add_resource(DepartmentPatients, "/departments/<int:department_id>/patients")
+api.add_resource(DepartmentPatientsExport, "/departments/<int:department_id>/patients/export")
 
 api.add_resource(Users, "/users", endpoint="users")
 api.add_resource(UserDetail, "/users/<int:user_id>", endpoint="userbyid")
 
+api.add_resource(Census, "/census", endpoint="census")
+api.add_resource(Changes, "/changes", endpoint="changes")
+api.add_resource(Events, "/events", endpoint="events")
+api.add_resource(Search, "/search", endpoint="search")
+api.add_resource(Batch, "/batch", endpoint="batch")
+
+api.add_resource(Shifts, "/shifts", endpoint="shifts")
+api.add_resource(Availabilities, "/availability", endpoint="availability")
+api.add_resource(Schedules, "/schedules", endpoint="schedules")
+api.add_resource(SchedulesRepair, "/schedules/repair", endpoint="schedulesrepair")
+
+
+# --------------------
+# CLI
+# --------------------
+
+app.cli.add_command(seed_command)
+app.cli.add_command(repair_command)
+app.cli.add_command(reconcile_command)
+app.cli.add_command(sync_replicas_command)
+app.cli.add_command(compact_command)
+
 
 # --------------------
 # Run Server
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Times a ward transfer of N patients done as N PATCH /patients/<id> requests
+# (one commit each) against the same N operations sent as one POST /batch
+# (one commit), once per SQLITE_PROFILE, on a database file.
+#
+#   python -m benchmarks.batch
+#   python -m benchmarks.batch --operations 50 --rounds 5
+
+
+def run(profile, operations, rounds, queue):
+    directory = tempfile.mkdtemp(prefix="benchmarks-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'batch.db')}"
+    os.environ["SQLITE_PROFILE"] = profile
+    os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+    os.environ["PASSWORD_HASH_WORKERS"] = "0"
+
+    from sqlalchemy import event, select
+    from app import app
+    from config import db
+    from models import Patient
+    from seed import generate
+
+    with app.app_context():
+        db.create_all()
+        names = generate(users=4, hospitals=5, departments=5, patients=2000, seed=1,
+                         shared_password="benchmark", shifts=0)
+        patient_ids = db.session.execute(
+            select(Patient.id).filter_by(user_id=1).limit(operations)
+        ).scalars().all()
+        commits = []
+        event.listen(db.engine, "commit", lambda connection: commits.append(1))
+
+    client = app.test_client()
+    client.post("/login", json={"name": names[0], "password": "benchmark"})
+
+    results = {"sequential": [], "batch": []}
+    for number in range(rounds):
+        department_id = number % 5 + 1
+        commits.clear()
+        started = time.perf_counter()
+        for patient_id in patient_ids:
+            client.patch(f"/patients/{patient_id}", json={"department_id": department_id})
+        results["sequential"].append((time.perf_counter() - started, len(commits)))
+
+        department_id = (number + 2) % 5 + 1
+        commits.clear()
+        started = time.perf_counter()
+        client.post("/batch", json={"requests": [
+            {"method": "PATCH", "path": f"/patients/{patient_id}", "body": {"department_id": department_id}}
+            for patient_id in patient_ids
+        ]})
+        results["batch"].append((time.perf_counter() - started, len(commits)))
+
+    queue.put(results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--operations", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--profiles", default="default,production")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{args.operations} patient transfers, median of {args.rounds} rounds")
+    print(f"{'profile':<12} {'mode':<12} {'total ms':>9} {'per op ms':>10} {'commits':>8}")
+    for profile in args.profiles.split(","):
+        # A fresh process per profile, as the app reads its config on import.
+        queue = context.Queue()
+        process = context.Process(target=run, args=(profile, args.operations, args.rounds, queue))
+        process.start()
+        results = queue.get()
+        process.join()
+        for mode, samples in results.items():
+            seconds = statistics.median(elapsed for elapsed, _ in samples)
+            print(f"{profile:<12} {mode:<12} {seconds * 1000:9.1f} {seconds * 1000 / args.operations:10.2f} "
+                  f"{samples[-1][1]:8d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Times POST /patients/bulk importing N new patients as NDJSON and as CSV
+# into a seeded database, and reports rows per second.
+#
+#   python -m benchmarks.bulk_import
+#   python -m benchmarks.bulk_import --rows 20000 --rounds 5
+
+
+def ndjson_body(rows):
+    return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+def csv_body(rows):
+    lines = ["name,date_of_birth,hospital_id,department_id"]
+    lines += [f"{row['name']},{row['date_of_birth']},{row['hospital_id']},{row['department_id']}" for row in rows]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000, help="Patients per import.")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--patients", type=int, default=100_000, help="Patients seeded before importing.")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="benchmarks-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'import.db')}"
+    os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+    os.environ["PASSWORD_HASH_WORKERS"] = "0"
+
+    from app import app
+    from config import db
+    from seed import generate
+
+    with app.app_context():
+        db.create_all()
+        names = generate(users=max(4, args.patients // 200), hospitals=20, departments=10, patients=args.patients,
+                         seed=1, shared_password="benchmark", shifts=0)
+
+    client = app.test_client()
+    client.post("/login", json={"name": names[0], "password": "benchmark"})
+
+    print(f"{args.rows} patients per import into {args.patients}, median of {args.rounds} rounds")
+    print(f"{'format':<8} {'seconds':>8} {'rows/s':>9}")
+    for fmt, build, mimetype in (("ndjson", ndjson_body, "application/x-ndjson"), ("csv", csv_body, "text/csv")):
+        samples = []
+        for number in range(args.rounds):
+            rows = [
+                {"name": f"Imported {fmt} {number} {index}", "date_of_birth": "1980-01-01",
+                 "hospital_id": index % 20 + 1, "department_id": index % 10 + 1}
+                for index in range(args.rows)
+            ]
+            body = build(rows)
+            started = time.perf_counter()
+            response = client.post("/patients/bulk", data=body, content_type=mimetype)
+            samples.append(time.perf_counter() - started)
+            report = response.get_json()
+            if report["inserted"] != args.rows:
+                print(f"{fmt}: inserted {report['inserted']} of {args.rows}: {report['errors'][:3]}")
+                return 1
+        seconds = statistics.median(samples)
+        print(f"{fmt:<8} {seconds:8.2f} {args.rows / seconds:9.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from itertools import count
+
+# Drives every route registered in app.py through the Flask test client against
+# generated datasets of increasing size, and records p50/p95 latency, SQL
+# statement count and peak traced memory per endpoint, and how long
+# ``flask seed`` took to generate each dataset. The run fails when any
+# endpoint issues more statements than the stored baseline, or has no
+# baseline to compare with. Latency and memory depend on the machine, so
+# growth past the threshold is reported but does not fail the run.
+#
+#   python -m benchmarks.endpoints --sizes 1000,10000,100000
+#   python -m benchmarks.endpoints --update-baseline
+
+
+BENCHMARK_PASSWORD = "benchmark"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+Scenario = namedtuple("Scenario", ["name", "endpoint", "method", "request", "iterations"])
+Scenario.__new__.__defaults__ = (None,)
+
+_unique = count()
+
+
+def unique(prefix):
+    return f"{prefix} {os.getpid()}-{next(_unique)}"
+
+
+# --------------------
+# Scenarios
+# --------------------
+# Each request callable takes (client, state) and returns the response. Scenarios
+# run in order, so a create is always followed by the delete that undoes it.
+
+def create_patient(client, state):
+    response = client.post("/patients", json={
+        "name": unique("Benchmark Patient"),
+        "date_of_birth": "1980-01-01",
+        "hospital_id": state["hospital_id"],
+        "department_id": state["department_id"],
+    })
+    state["created_patients"].append(response.get_json()["id"])
+    return response
+
+
+def create_hospital(client, state):
+    response = client.post("/hospitals", json={"name": unique("Benchmark Hospital"), "phone_number": "5555555555"})
+    state["created_hospitals"].append(response.get_json()["id"])
+    return response
+
+
+def create_department(client, state):
+    response = client.post("/departments", json={"name": unique("Benchmark Department")})
+    state["created_departments"].append(response.get_json()["id"])
+    return response
+
+
+def bulk_import(client, state):
+    rows = "".join(
+        json.dumps({
+            "name": unique("Benchmark Bulk"),
+            "date_of_birth": "1980-01-01",
+            "hospital_id": state["hospital_id"],
+            "department_id": state["department_id"],
+        }) + "\n"
+        for _ in range(100)
+    )
+    return client.post("/patients/bulk", data=rows, content_type="application/x-ndjson")
+
+
+def create_shift(client, state):
+    return client.post("/shifts", json={
+        "hospital_id": state["hospital_id"],
+        "department_id": state["department_id"],
+        "starts_at": "2026-01-05T07:00",
+        "ends_at": "2026-01-05T15:00",
+        "required_nurses": 2,
+    })
+
+
+def create_availability(client, state):
+    return client.post("/availability", json={"starts_at": "2026-01-05T06:00", "ends_at": "2026-01-06T00:00"})
+
+
+def repair_after_admission(client, state):
+    # Admit a patient first so the repair has a changed department to consume.
+    create_patient(client, state)
+    return client.post("/schedules/repair")
+
+
+def open_events(client, state):
+    # The stream never ends: read the first message and hang up.
+    response = client.get("/events")
+    next(response.response)
+    response.close()
+    return response
+
+
+def run_batch(client, state):
+    # The patient form's lookups plus a transfer, in one round trip and one commit.
+    return client.post("/batch", json={"requests": [
+        {"method": "GET", "path": "/hospitals"},
+        {"method": "GET", "path": "/departments"},
+        {"method": "PATCH", "path": f"/patients/{state['patient_id']}", "body": {"department_id": state["department_id"]}},
+    ]})
+
+
+def transfer_department(client, state):
+    # Move the nurse's patients in one hospital across two departments and back.
+    source, target = state["transfer_departments"]
+    state["transfer_departments"] = (target, source)
+    return client.post("/patients/transfer", json={
+        "from": {"hospital_id": state["hospital_id"], "department_id": source},
+        "to": {"department_id": target},
+    })
+
+
+def login(client, state):
+    return client.post("/login", json={"name": state["user_name"], "password": BENCHMARK_PASSWORD})
+
+
+def logout_and_login(client, state):
+    response = client.delete("/logout")
+    login(client, state)
+    return response
+
+
+SCENARIOS = [
+    Scenario("GET /", "index", "GET", lambda c, s: c.get("/")),
+    Scenario("POST /login", "login", "POST", login, 5),
+    Scenario("POST /signup", "signup", "POST",
+             lambda c, s: c.post("/signup", json={"name": unique("Benchmark Nurse"), "password": BENCHMARK_PASSWORD}), 5),
+    Scenario("re-login after signup", "login", "POST", login, 1),
+    Scenario("GET /check_session", "checksession", "GET", lambda c, s: c.get("/check_session")),
+    Scenario("DELETE /logout", "logout", "DELETE", logout_and_login, 5),
+    Scenario("GET /patients", "patients", "GET", lambda c, s: c.get("/patients")),
+    Scenario("POST /patients", "patients", "POST", create_patient),
+    Scenario("GET /patients/<id>", "patientbyid", "GET", lambda c, s: c.get(f"/patients/{s['patient_id']}")),
+    Scenario("PATCH /patients/<id>", "patientbyid", "PATCH",
+             lambda c, s: c.patch(f"/patients/{s['patient_id']}", json={"hospital_id": s["hospital_id"]})),
+    Scenario("DELETE /patients/<id>", "patientbyid", "DELETE",
+             lambda c, s: c.delete(f"/patients/{s['created_patients'].pop()}")),
+    Scenario("GET /patients/export", "patientsexport", "GET", lambda c, s: c.get("/patients/export")),
+    Scenario("POST /patients/transfer", "patientstransfer", "POST", transfer_department),
+    Scenario("GET /hospitals", "hospitals", "GET", lambda c, s: c.get("/hospitals")),
+    Scenario("POST /hospitals", "hospitals", "POST", create_hospital),
+    Scenario("GET /hospitals/<id>", "hospitalbyid", "GET", lambda c, s: c.get(f"/hospitals/{s['hospital_id']}")),
+    Scenario("PATCH /hospitals/<id>", "hospitalbyid", "PATCH",
+             lambda c, s: c.patch(f"/hospitals/{s['created_hospitals'][-1]}", json={"phone_number": "5555555556"})),
+    Scenario("DELETE /hospitals/<id>", "hospitalbyid", "DELETE",
+             lambda c, s: c.delete(f"/hospitals/{s['created_hospitals'].pop()}")),
+    Scenario("GET /hospitals/<id>/patients", "hospitalpatients", "GET",
+             lambda c, s: c.get(f"/hospitals/{s['hospital_id']}/patients")),
+    Scenario("GET /hospitals/<id>/patients/export", "hospitalpatientsexport", "GET",
+             lambda c, s: c.get(f"/hospitals/{s['hospital_id']}/patients/export")),
+    Scenario("GET /departments", "departments", "GET", lambda c, s: c.get("/departments")),
+    Scenario("POST /departments", "departments", "POST", create_department),
+    Scenario("GET /departments/<id>", "departmentbyid", "GET",
+             lambda c, s: c.get(f"/departments/{s['department_id']}")),
+    Scenario("PATCH /departments/<id>", "departmentbyid", "PATCH",
+             lambda c, s: c.patch(f"/departments/{s['created_departments'][-1]}", json={"name": unique("Benchmark Department")})),
+    Scenario("DELETE /departments/<id>", "departmentbyid", "DELETE",
+             lambda c, s: c.delete(f"/departments/{s['created_departments'].pop()}")),
+    Scenario("GET /departments/<id>/patients", "departmentpatients", "GET",
+             lambda c, s: c.get(f"/departments/{s['department_id']}/patients")),
+    Scenario("GET /departments/<id>/patients/export", "departmentpatientsexport", "GET",
+             lambda c, s: c.get(f"/departments/{s['department_id']}/patients/export")),
+    Scenario("GET /users", "users", "GET", lambda c, s: c.get("/users")),
+    Scenario("GET /users/<id>", "userbyid", "GET", lambda c, s: c.get(f"/users/{s['user_id']}")),
+    Scenario("GET /census", "census", "GET", lambda c, s: c.get("/census")),
+    Scenario("POST /batch", "batch", "POST", run_batch),
+    Scenario("GET /search", "search", "GET", lambda c, s: c.get("/search?q=jo")),
+    Scenario("GET /events", "events", "GET", open_events),
+    Scenario("GET /changes", "changes", "GET", lambda c, s: c.get(f"/changes?since={s['changes_version']}")),
+    Scenario("GET /shifts", "shifts", "GET", lambda c, s: c.get("/shifts")),
+    Scenario("POST /shifts", "shifts", "POST", create_shift, 5),
+    Scenario("GET /availability", "availability", "GET", lambda c, s: c.get("/availability")),
+    Scenario("POST /availability", "availability", "POST", create_availability, 5),
+    Scenario("POST /schedules", "schedules", "POST", lambda c, s: c.post("/schedules", json={}), 5),
+    Scenario("GET /schedules", "schedules", "GET", lambda c, s: c.get("/schedules")),
+    Scenario("POST /schedules/repair", "schedulesrepair", "POST", repair_after_admission, 5),
+    # Only registered when INSTRUMENTATION=1.
+    Scenario("GET /metrics", "metrics", "GET", lambda c, s: c.get("/metrics")),
+    # Last, because the imported rows grow the benchmark nurse's caseload.
+    Scenario("POST /patients/bulk", "patientsbulk", "POST", bulk_import, 5),
+]
+
+# Routes that cannot be measured request/response style through the test client.
+EXCLUDED_ROUTES = {"static"}
+
+
+def uncovered_routes(app):
+    covered = {(scenario.endpoint, scenario.method) for scenario in SCENARIOS}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint in EXCLUDED_ROUTES:
+            continue
+        for method in sorted(rule.methods - {"HEAD", "OPTIONS"}):
+            if (rule.endpoint, method) not in covered:
+                missing.append(f"{method} {rule.rule}")
+    return missing
+
+
+# --------------------
+# Measurement
+# --------------------
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(client, scenario, state, iterations, statements):
+    durations = []
+    counts = []
+    for _ in range(iterations + 1):
+        statements.clear()
+        started = time.perf_counter()
+        response = scenario.request(client, state)
+        response.get_data()
+        durations.append((time.perf_counter() - started) * 1000)
+        response.close()
+        counts.append(len(statements))
+        if response.status_code >= 400:
+            raise RuntimeError(f"{scenario.name} returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    # The first call warms caches and is left out of the latency figures.
+    durations, counts = durations[1:], counts[1:]
+
+    tracemalloc.start()
+    response = scenario.request(client, state)
+    response.get_data()
+    response.close()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(statistics.median(durations), 3),
+        "p95_ms": round(percentile(durations, 0.95), 3),
+        "statements": max(counts),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def dataset_shape(patients):
+    return {
+        "users": max(4, patients // 200),
+        "hospitals": 20,
+        "departments": 10,
+        "patients": patients,
+    }
+
+
+def run_size(app, db, patients, iterations):
+    from sqlalchemy import event, select
+    from changes import latest_version
+    from models import Department, Patient
+    from seed import generate
+
+    shape = dataset_shape(patients)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, "before_cursor_execute", listener)
+
+        # Seeding is timed once, untraced: tracemalloc would slow it several times over.
+        started = time.perf_counter()
+        user_names = generate(**shape, seed=1, shared_password=BENCHMARK_PASSWORD)
+        seed_ms = round((time.perf_counter() - started) * 1000, 3)
+        results = {"flask seed": {"p50_ms": seed_ms, "p95_ms": seed_ms, "statements": len(statements), "peak_kb": 0.0}}
+
+        patient = db.session.execute(select(Patient).where(Patient.user_id == 1).limit(1)).scalar_one()
+        state = {
+            "user_id": 1,
+            "user_name": user_names[0],
+            "patient_id": patient.id,
+            "hospital_id": patient.hospital_id,
+            "department_id": patient.department_id,
+            "transfer_departments": (patient.department_id, db.session.execute(
+                select(Department.id).where(Department.id != patient.department_id).limit(1)
+            ).scalar_one()),
+            "changes_version": latest_version(),
+            "created_patients": [],
+            "created_hospitals": [],
+            "created_departments": [],
+        }
+
+    client = app.test_client()
+    login(client, state)
+
+    registered = {rule.endpoint for rule in app.url_map.iter_rules()}
+    try:
+        for scenario in [scenario for scenario in SCENARIOS if scenario.endpoint in registered]:
+            results[scenario.name] = measure(
+                client, scenario, state, scenario.iterations or iterations, statements
+            )
+    finally:
+        with app.app_context():
+            event.remove(db.engine, "before_cursor_execute", listener)
+    return results
+
+
+# --------------------
+# Baseline
+# --------------------
+
+def regressions(results, baseline):
+    found = []
+    for size, endpoints in results.items():
+        for name, metrics in endpoints.items():
+            expected = baseline.get(size, {}).get(name)
+            if not expected:
+                found.append(f"[{size}] {name}: not in the baseline")
+            elif metrics["statements"] > expected["statements"]:
+                found.append(f"[{size}] {name}: {expected['statements']} -> {metrics['statements']} statements")
+    return found
+
+
+def slowdowns(results, baseline, threshold):
+    found = []
+    for size, endpoints in results.items():
+        for name, metrics in endpoints.items():
+            expected = baseline.get(size, {}).get(name)
+            for metric in ("p50_ms", "p95_ms", "peak_kb"):
+                if expected and metrics[metric] > expected[metric] * (1 + threshold):
+                    found.append(f"[{size}] {name}: {metric} {expected[metric]} -> {metrics[metric]}")
+    return found
+
+
+def print_table(size, endpoints):
+    print(f"\n== {size} patients ==")
+    print(f"{'endpoint':44} {'p50 ms':>9} {'p95 ms':>9} {'stmts':>6} {'peak KB':>9}")
+    for name, metrics in endpoints.items():
+        print(f"{name:44} {metrics['p50_ms']:9.2f} {metrics['p95_ms']:9.2f} "
+              f"{metrics['statements']:6d} {metrics['peak_kb']:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Comma-separated patient counts to generate.")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Fractional increase in latency and memory over the baseline worth reporting.")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--database", help="SQLite file to use instead of a temporary one.")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="benchmarks-")
+    database = args.database or os.path.join(directory, "benchmark.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(database)}"
+
+    from app import app
+    from config import db
+
+    missing = uncovered_routes(app)
+    if missing:
+        print("Routes without a benchmark scenario:\n  " + "\n  ".join(missing))
+        return 1
+
+    results = {}
+    for size in [int(size) for size in args.sizes.split(",")]:
+        results[str(size)] = run_size(app, db, size, args.iterations)
+        print_table(size, results[str(size)])
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    # Without a baseline nothing is gated, which must not pass for a clean run.
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to record one.")
+        return 1
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+
+    slower = slowdowns(results, baseline, args.threshold)
+    if slower:
+        print("\nSlower than the baseline (not gated; compare runs on the same machine):\n  " + "\n  ".join(slower))
+
+    found = regressions(results, baseline)
+    if found:
+        print("\nRegressions:\n  " + "\n  ".join(found))
+        return 1
+
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
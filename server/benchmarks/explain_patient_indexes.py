@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Remote library imports
+from sqlalchemy import create_engine, select, text
+
+# Local imports
+from models import db, Patient
+
+# Shows the SQLite query plan for the patient lookups used by HospitalPatients,
+# DepartmentPatients, HospitalDetail and DepartmentDetail, first without the
+# patient indexes declared in models.py and then with them.
+#
+#   python -m benchmarks.explain_patient_indexes --patients 1000000
+
+
+QUERIES = {
+    "hospital patients": select(Patient).where(Patient.hospital_id == 3, Patient.user_id == 7),
+    "department patients": select(Patient).where(Patient.department_id == 3, Patient.user_id == 7),
+    "nurse caseload": select(Patient).where(Patient.user_id == 7).order_by(Patient.id),
+}
+
+
+def populate(engine, patients, users, hospitals, departments, batch_size=50_000):
+    rng = random.Random(0)
+    first_birthday = date(1930, 1, 1)
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO users (id, name, _password_hash) VALUES (?, ?, ?)",
+            [(i, f"nurse-{i}", "x") for i in range(1, users + 1)],
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO hospitals (id, name, phone_number) VALUES (?, ?, ?)",
+            [(i, f"hospital-{i}", "5555555555") for i in range(1, hospitals + 1)],
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO departments (id, name) VALUES (?, ?)",
+            [(i, f"department-{i}") for i in range(1, departments + 1)],
+        )
+
+        for start in range(1, patients + 1, batch_size):
+            stop = min(start + batch_size, patients + 1)
+            connection.exec_driver_sql(
+                "INSERT INTO patients (id, name, date_of_birth, user_id, hospital_id, department_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        i,
+                        f"patient-{i}",
+                        (first_birthday + timedelta(days=rng.randrange(30_000))).isoformat(),
+                        rng.randint(1, users),
+                        rng.randint(1, hospitals),
+                        rng.randint(1, departments),
+                    )
+                    for i in range(start, stop)
+                ],
+            )
+
+
+def explain(engine, label):
+    print(f"\n== {label} ==")
+    with engine.connect() as connection:
+        for name, query in QUERIES.items():
+            sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+
+            started = time.perf_counter()
+            rows = len(connection.execute(text(sql)).fetchall())
+            elapsed = (time.perf_counter() - started) * 1000
+
+            print(f"{name}: {rows} rows in {elapsed:.2f} ms")
+            for row in plan:
+                print(f"    {row[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--hospitals", type=int, default=50)
+    parser.add_argument("--departments", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'explain.db')}")
+        db.metadata.create_all(engine)
+        indexes = list(Patient.__table__.indexes)
+        for index in indexes:
+            index.drop(engine)
+
+        print(f"Populating {args.patients} patients...")
+        populate(engine, args.patients, args.users, args.hospitals, args.departments)
+        explain(engine, "without patient indexes")
+
+        for index in indexes:
+            index.create(engine)
+        with engine.begin() as connection:
+            connection.exec_driver_sql("ANALYZE")
+        explain(engine, "with patient indexes")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Serves the app from a fixed pool of request threads (as a threaded gunicorn
+# worker would) and measures GET /hospitals latency while a crowd of clients
+# logs in as fast as it can, first with passwords hashed in the request thread
+# (the old behaviour) and then in the bounded password hashing pool.
+#
+#   python -m benchmarks.login_storm
+#   python -m benchmarks.login_storm --threads 8 --storm-clients 32 --seconds 5
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return float("nan")
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def serve(app, threads):
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    class PooledServer(BaseWSGIServer):
+        # Requests beyond ``threads`` wait in the executor's queue, like a
+        # worker's backlog.
+        executor = ThreadPoolExecutor(threads)
+
+        def process_request(self, request, client_address):
+            self.executor.submit(self.handle, request, client_address)
+
+        def handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledServer("127.0.0.1", 0, app, handler=QuietHandler)
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def request(port, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def run_phase(port, names, password, storm_clients, seconds):
+    stop = threading.Event()
+    statuses = []
+    latencies = []
+
+    def storm(number):
+        while not stop.is_set():
+            name = names[number % len(names)]
+            status = request(port, "POST", "/login", {"name": name, "password": password})
+            statuses.append(status)
+            if status == 429:
+                # Back off briefly, as a client honouring Retry-After would.
+                time.sleep(0.1)
+
+    def probe():
+        while not stop.is_set():
+            started = time.perf_counter()
+            request(port, "GET", "/hospitals")
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.02)
+
+    workers = [threading.Thread(target=storm, args=(number,)) for number in range(storm_clients)]
+    workers.append(threading.Thread(target=probe))
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return latencies, statuses
+
+
+def report(label, latencies, statuses, seconds):
+    ok = sum(status == 200 for status in statuses)
+    busy = sum(status == 429 for status in statuses)
+    print(f"{label:<22} {percentile(latencies, 0.5) * 1000:8.1f} {percentile(latencies, 0.95) * 1000:8.1f} "
+          f"{percentile(latencies, 0.99) * 1000:8.1f} {len(latencies):7d} {ok / seconds:9.1f} {busy:7d}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8, help="Request threads serving the app.")
+    parser.add_argument("--storm-clients", type=int, default=32, help="Clients logging in concurrently.")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=None, help="PASSWORD_HASH_WORKERS for the pooled phase.")
+    parser.add_argument("--max-pending", type=int, default=None, help="PASSWORD_HASH_MAX_PENDING for the pooled phase.")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="benchmarks-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'login_storm.db')}"
+    if args.workers is not None:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    if args.max_pending is not None:
+        os.environ["PASSWORD_HASH_MAX_PENDING"] = str(args.max_pending)
+
+    from app import app
+    from config import db, password_hasher
+    from seed import generate
+
+    password = "benchmark"
+    with app.app_context():
+        db.create_all()
+        names = generate(users=200, hospitals=20, departments=10, patients=2000, seed=1,
+                         shared_password=password, shifts=0)
+
+    server = serve(app, args.threads)
+    port = server.server_port
+    pooled = (password_hasher.workers, password_hasher.slots)
+    print(f"{args.threads} request threads, {args.storm_clients} clients logging in, "
+          f"{password_hasher.workers} hash workers, {app.config['PASSWORD_HASH_MAX_PENDING']} pending hashes max")
+    print(f"{'GET /hospitals':<22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'probes':>7} {'logins/s':>9} {'429s':>7}")
+
+    # Start the pool before timing anything.
+    request(port, "POST", "/login", {"name": names[0], "password": password})
+
+    latencies, statuses = run_phase(port, names, password, 0, args.seconds)
+    report("idle", latencies, statuses, args.seconds)
+
+    password_hasher.workers, password_hasher.slots = 0, threading.BoundedSemaphore(10 ** 6)
+    latencies, statuses = run_phase(port, names, password, args.storm_clients, args.seconds)
+    report("storm, inline hashing", latencies, statuses, args.seconds)
+
+    password_hasher.workers, password_hasher.slots = pooled
+    latencies, statuses = run_phase(port, names, password, args.storm_clients, args.seconds)
+    report("storm, hashing pool", latencies, statuses, args.seconds)
+
+    server.shutdown()
+    password_hasher.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+# Schedules a generated week (2,000 nurses x 500 department shifts by default)
+# with scheduler.schedule_week against a throwaway SQLite database and checks
+# the result against the max-hours, availability and no-overlap constraints.
+# Then it admits, moves and discharges patients in a few departments and
+# compares repairing the schedule (scheduler.repair_schedules) with solving
+# the whole week again.
+#
+#   python -m benchmarks.scheduler
+#   python -m benchmarks.scheduler --nurses 2000 --shifts 500 --changes 200 --changed-cells 2
+
+
+def add_availability(db, users, share, week_start, seed):
+    # Some nurses only work the day and evening shifts of five days a week.
+    from sqlalchemy import insert
+    from models import Availability
+
+    rng = random.Random(seed)
+    rows = []
+    for user_id in range(1, users + 1):
+        if rng.random() >= share:
+            continue
+        for day in sorted(rng.sample(range(7), 5)):
+            opens = week_start + timedelta(days=day, hours=6)
+            rows.append({"user_id": user_id, "starts_at": opens, "ends_at": opens + timedelta(hours=18)})
+    if rows:
+        db.session.execute(insert(Availability.__table__), rows)
+
+
+def change_census(db, cells, changes, seed):
+    # Half the cells see a surge of admissions and patients moved in from the
+    # other half, which discharge. Changes go through the ORM, as they do in
+    # the Patients handlers, so the flush hooks record the changed cells.
+    from sqlalchemy import func, select
+    from models import Patient
+
+    rng = random.Random(seed)
+    surging, quiet = cells[::2], cells[1::2] or cells[::2]
+    users = db.session.execute(select(func.max(Patient.user_id))).scalar()
+    for number in range(changes):
+        action = rng.choice(("admit", "move", "discharge"))
+        if action == "admit":
+            hospital_id, department_id = rng.choice(surging)
+            db.session.add(Patient(
+                name=f"Census Change {seed}-{number}", date_of_birth=date(1980, 1, 1),
+                user_id=rng.randint(1, users), hospital_id=hospital_id, department_id=department_id,
+            ))
+            continue
+
+        hospital_id, department_id = rng.choice(quiet)
+        patient = db.session.execute(
+            select(Patient).filter_by(hospital_id=hospital_id, department_id=department_id).limit(1)
+        ).scalar()
+        if patient is None:
+            continue
+        if action == "discharge":
+            db.session.delete(patient)
+        else:
+            patient.hospital_id, patient.department_id = rng.choice(surging)
+        db.session.flush()
+    db.session.commit()
+
+
+def violations(shifts, nurses, assignments):
+    shifts = {shift.id: shift for shift in shifts}
+    nurses = {nurse.id: nurse for nurse in nurses}
+    worked = defaultdict(float)
+    booked = defaultdict(list)
+    found = []
+
+    for shift_id, nurse_id in assignments:
+        shift, nurse = shifts[shift_id], nurses[nurse_id]
+        worked[nurse_id] += shift.hours
+        booked[nurse_id].append((shift.starts_at, shift.ends_at))
+        if nurse.windows and not any(
+            opens <= shift.starts_at and shift.ends_at <= closes for opens, closes in nurse.windows
+        ):
+            found.append(f"nurse {nurse_id} is not available for shift {shift_id}")
+
+    for nurse_id, hours in worked.items():
+        if hours > nurses[nurse_id].max_hours:
+            found.append(f"nurse {nurse_id} works {hours}h, over {nurses[nurse_id].max_hours}h")
+    for nurse_id, times in booked.items():
+        times.sort()
+        for (_, ends_at), (starts_at, _) in zip(times, times[1:]):
+            if starts_at < ends_at:
+                found.append(f"nurse {nurse_id} is booked into overlapping shifts at {starts_at}")
+    return found
+
+
+def quality(shifts, nurses, assignments):
+    cells = {nurse.id: nurse.cells for nurse in nurses}
+    by_id = {shift.id: shift for shift in shifts}
+    staffed = Counter(shift_id for shift_id, _ in assignments)
+    floats = sum(by_id[shift_id].cell not in cells[nurse_id] for shift_id, nurse_id in assignments)
+    unfilled = sum(max(0, shift.demand - staffed[shift.id]) for shift in shifts)
+    return f"assigned {len(assignments)}, unfilled {unfilled}, floats {floats}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nurses", type=int, default=2000)
+    parser.add_argument("--shifts", type=int, default=500)
+    parser.add_argument("--hospitals", type=int, default=4)
+    parser.add_argument("--departments", type=int, default=6)
+    parser.add_argument("--patients", type=int, default=20_000)
+    parser.add_argument("--patients-per-nurse", type=int, default=60,
+                        help="Census per nurse on a shift; the default gives about 14 nurses per shift.")
+    parser.add_argument("--availability-share", type=float, default=0.3,
+                        help="Fraction of nurses who record availability for the week.")
+    parser.add_argument("--changes", type=int, default=300, help="Patients admitted, moved or discharged.")
+    parser.add_argument("--changed-cells", type=int, default=2,
+                        help="Hospital/department pairs the census changes fall in.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="benchmarks-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'scheduler.db')}"
+
+    from sqlalchemy import select
+    from app import app
+    from config import db
+    from models import Assignment
+    from scheduler import load_nurses, load_shifts, repair_schedules, repair_summary, schedule_week, week_bounds
+    from seed import generate
+
+    week = date.today()
+    week_start, week_end = week_bounds(week)
+    float_penalty = app.config["SCHEDULER_FLOAT_PENALTY"]
+
+    def current_state():
+        shifts = load_shifts(week_start, week_end, args.patients_per_nurse)
+        nurses = load_nurses(week_start, week_end)
+        assignments = db.session.execute(select(Assignment.shift_id, Assignment.user_id)).all()
+        return shifts, nurses, assignments
+
+    with app.app_context():
+        db.create_all()
+        generate(users=args.nurses, hospitals=args.hospitals, departments=args.departments,
+                 patients=args.patients, seed=args.seed, shared_password="benchmark",
+                 shifts=args.shifts)
+        add_availability(db, args.nurses, args.availability_share, week_start, args.seed)
+        db.session.commit()
+
+        started = time.perf_counter()
+        shifts, schedule = schedule_week(week, args.patients_per_nurse, float_penalty)
+        db.session.commit()
+        full = time.perf_counter() - started
+
+        shifts, nurses, assignments = current_state()
+        print(f"{len(nurses)} nurses x {len(shifts)} shifts, demand {sum(shift.demand for shift in shifts)}")
+        print(f"full solve   {full * 1000:9.1f} ms   {quality(shifts, nurses, assignments)}")
+        found = violations(shifts, nurses, assignments)
+
+        cells = random.Random(args.seed).sample(sorted({shift.cell for shift in shifts}), args.changed_cells)
+        change_census(db, cells, args.changes, args.seed)
+
+        started = time.perf_counter()
+        changed, repairs = repair_schedules(week_start, args.patients_per_nurse, float_penalty)
+        db.session.commit()
+        repaired = time.perf_counter() - started
+
+        shifts, nurses, assignments = current_state()
+        summary = repair_summary(changed, repairs)
+        print(f"repair       {repaired * 1000:9.1f} ms   {quality(shifts, nurses, assignments)}   "
+              f"(+{summary['added']} -{summary['removed']} in {summary['cells']} cells)")
+        found += violations(shifts, nurses, assignments)
+
+        started = time.perf_counter()
+        schedule_week(week, args.patients_per_nurse, float_penalty)
+        db.session.commit()
+        resolved = time.perf_counter() - started
+
+        shifts, nurses, assignments = current_state()
+        print(f"full re-solve {resolved * 1000:8.1f} ms   {quality(shifts, nurses, assignments)}")
+        found += violations(shifts, nurses, assignments)
+
+    if found:
+        print("Constraint violations:\n  " + "\n  ".join(found[:20]))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
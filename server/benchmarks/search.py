@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Seeds a large database (1M patients by default) and times GET /search for
+# typeahead-style queries: growing prefixes of a nurse's patient names, a
+# first name plus the start of a last name, and hospital name prefixes.
+#
+#   python -m benchmarks.search
+#   python -m benchmarks.search --patients 100000 --users 500
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return float("nan")
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def queries(rng, patient_names, hospital_names, count):
+    """Yield ``(kind, query)`` pairs: what a nurse types, keystroke by keystroke."""
+    for _ in range(count):
+        first, last = rng.choice(patient_names).split()[:2]
+        for length in range(1, min(len(first), 4) + 1):
+            yield f"{length} letter{'s' if length > 1 else ''}", first[:length]
+        yield "first name + 1 letter", f"{first} {last[0]}"
+        yield "first name + 3 letters", f"{first} {last[:3]}"
+        yield "hospital, 2 letters", rng.choice(hospital_names)[:2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=None, help="Nurses (default: one per 200 patients).")
+    parser.add_argument("--nurses", type=int, default=20, help="Nurses to search as.")
+    args = parser.parse_args()
+    users = args.users or max(4, args.patients // 200)
+
+    directory = tempfile.mkdtemp(prefix="benchmarks-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'search.db')}"
+    os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+    os.environ["PASSWORD_HASH_WORKERS"] = "0"
+
+    from sqlalchemy import select
+    from app import app
+    from config import db
+    from models import Hospital, Patient
+    from seed import generate
+
+    password = "benchmark"
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        names = generate(users=users, hospitals=20, departments=10, patients=args.patients, seed=1,
+                         shared_password=password, shifts=0)
+        hospital_names = db.session.execute(select(Hospital.name)).scalars().all()
+    print(f"{args.patients} patients, {users} nurses: seeded and indexed in {time.perf_counter() - started:.0f}s")
+
+    rng = random.Random(1)
+    timings = {}
+    returned = {}
+    for user_id in rng.sample(range(1, users + 1), min(args.nurses, users)):
+        with app.app_context():
+            patient_names = db.session.execute(select(Patient.name).filter_by(user_id=user_id)).scalars().all()
+        if not patient_names:
+            continue
+        client = app.test_client()
+        client.post("/login", json={"name": names[user_id - 1], "password": password})
+        for kind, query in queries(rng, patient_names, hospital_names, 10):
+            client.get("/search", query_string={"q": query})
+            started = time.perf_counter()
+            response = client.get("/search", query_string={"q": query})
+            timings.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+            returned.setdefault(kind, []).append(len(response.get_json()))
+
+    print(f"{'GET /search?q=':<24} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'results':>8}")
+    for kind, samples in timings.items():
+        print(f"{kind:<24} {percentile(samples, 0.5):8.2f} {percentile(samples, 0.95):8.2f} "
+              f"{max(samples):8.2f} {sum(returned[kind]) / len(returned[kind]):8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# Runs mixed read/write traffic from several worker processes (as gunicorn
+# would run them) against one SQLite file, once per SQLITE_PROFILE, and
+# compares throughput, latency and failed requests.
+#
+#   python -m benchmarks.sqlite_concurrency
+#   python -m benchmarks.sqlite_concurrency --processes 4 --threads 4 --write-share 0.2 --seconds 10
+
+
+def environment(database_url, profile):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SQLITE_PROFILE"] = profile
+    # Measure the database, not the response cache or bcrypt.
+    os.environ["RESPONSE_CACHE_BACKEND"] = ""
+    os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+    os.environ["PASSWORD_HASH_WORKERS"] = "0"
+    os.environ["PASSWORD_HASH_MAX_PENDING"] = "64"
+
+
+def prepare(database_url, profile, users, patients):
+    environment(database_url, profile)
+    from app import app
+    from config import db
+    from seed import generate
+
+    with app.app_context():
+        db.create_all()
+        generate(users=users, hospitals=10, departments=10, patients=patients, seed=1,
+                 shared_password="benchmark", shifts=0)
+
+
+def client_loop(app, name, seconds, write_share, seed, results):
+    from sqlalchemy import select
+    from config import db
+    from models import Patient, User
+
+    client = app.test_client()
+    client.post("/login", json={"name": name, "password": "benchmark"})
+    with app.app_context():
+        user_id = db.session.execute(select(User.id).filter_by(name=name)).scalar()
+        patient_ids = db.session.execute(select(Patient.id).filter_by(user_id=user_id).limit(50)).scalars().all()
+        hospital_ids = db.session.execute(select(Patient.hospital_id).distinct()).scalars().all()
+
+    rng = random.Random(seed)
+    deadline = time.perf_counter() + seconds
+    number = 0
+    while time.perf_counter() < deadline:
+        write = rng.random() < write_share
+        started = time.perf_counter()
+        if not write:
+            if rng.random() < 0.5:
+                response = client.get("/patients?limit=100")
+            else:
+                response = client.get(f"/hospitals/{rng.choice(hospital_ids)}/patients")
+        elif rng.random() < 0.5 or not patient_ids:
+            number += 1
+            response = client.post("/patients", json={
+                "name": f"Concurrency {seed}-{number}", "date_of_birth": "1980-01-01",
+                "hospital_id": rng.choice(hospital_ids), "department_id": rng.randint(1, 10),
+            })
+        else:
+            response = client.patch(
+                f"/patients/{rng.choice(patient_ids)}", json={"department_id": rng.randint(1, 10)}
+            )
+        results.append((write, time.perf_counter() - started, response.status_code < 400))
+
+
+def worker(database_url, profile, names, threads, seconds, write_share, seed, queue):
+    environment(database_url, profile)
+    from app import app
+
+    app.logger.disabled = True
+    results = []
+    clients = [
+        threading.Thread(target=client_loop, args=(
+            app, names[number % len(names)], seconds, write_share, seed * 1000 + number, results
+        ))
+        for number in range(threads)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    queue.put(results)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return float("nan")
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(profile, args):
+    directory = tempfile.mkdtemp(prefix="benchmarks-")
+    database_url = f"sqlite:///{os.path.join(directory, 'concurrency.db')}"
+    context = multiprocessing.get_context("spawn")
+
+    setup = context.Process(target=prepare, args=(database_url, profile, args.users, args.patients))
+    setup.start()
+    setup.join()
+
+    names = user_names(database_url)
+    queue = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(
+            database_url, profile, names, args.threads, args.seconds, args.write_share,
+            number + 1, queue,
+        ))
+        for number in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    results = [result for _ in processes for result in queue.get()]
+    for process in processes:
+        process.join()
+
+    reads = [seconds for write, seconds, ok in results if not write]
+    writes = [seconds for write, seconds, ok in results if write]
+    failed = sum(not ok for _, _, ok in results)
+    print(f"{profile:<12} {len(results) / args.seconds:9.1f} {len(reads) / args.seconds:9.1f} "
+          f"{len(writes) / args.seconds:9.1f} {percentile(reads, 0.95) * 1000:10.1f} "
+          f"{percentile(writes, 0.95) * 1000:11.1f} {failed:7d}")
+
+
+def user_names(database_url):
+    import sqlite3
+    from sqlalchemy.engine import make_url
+
+    connection = sqlite3.connect(make_url(database_url).database)
+    try:
+        return [name for name, in connection.execute("SELECT name FROM users ORDER BY id")]
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4, help="Client threads per process.")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-share", type=float, default=0.2)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=50_000)
+    parser.add_argument("--profiles", default="default,production")
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes x {args.threads} threads, {args.write_share:.0%} writes, {args.seconds:g}s each")
+    print(f"{'profile':<12} {'req/s':>9} {'reads/s':>9} {'writes/s':>9} {'read p95':>10} {'write p95':>11} {'failed':>7}")
+    for profile in args.profiles.split(","):
+        run(profile, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import http.client
+import json
+import os
+import resource
+import selectors
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# Holds thousands of idle GET /events streams open against one threaded worker,
+# then measures what they cost (memory, threads), how long a hospital update
+# takes to reach every stream, that a patient update only reaches its nurse's
+# streams, and GET /hospitals latency while the streams are open.
+#
+#   python -m benchmarks.sse_connections
+#   python -m benchmarks.sse_connections --connections 1000 --users 20
+
+EVENT = b"event: changes"
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return float("nan")
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def resident_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def serve(app):
+    from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    class Server(ThreadedWSGIServer):
+        request_queue_size = 4096
+
+    server = Server("127.0.0.1", 0, app, handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def request(port, method, path, body=None, cookie=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        if cookie:
+            headers["Cookie"] = cookie
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        return response, data
+    finally:
+        connection.close()
+
+
+def login(port, name, password):
+    response, _ = request(port, "POST", "/login", {"name": name, "password": password})
+    return response.getheader("Set-Cookie").split(";", 1)[0]
+
+
+class Streams:
+    """Raw sockets reading GET /events, all watched from one thread."""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.streams = []
+
+    def open(self, port, cookie, user_id):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(
+            f"GET /events HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\n"
+            "Accept: text/event-stream\r\n\r\n".encode()
+        )
+        sock.setblocking(False)
+        stream = {"socket": sock, "user_id": user_id, "connected": False, "events": 0, "tail": b"", "at": None}
+        self.selector.register(sock, selectors.EVENT_READ, stream)
+        self.streams.append(stream)
+
+    def poll(self, timeout):
+        for key, _ in self.selector.select(timeout):
+            stream = key.data
+            try:
+                data = stream["socket"].recv(65536)
+            except BlockingIOError:
+                continue
+            data = stream["tail"] + data
+            stream["connected"] = stream["connected"] or b": connected" in data
+            found = data.count(EVENT)
+            if found:
+                stream["events"] += found
+                stream["at"] = time.perf_counter()
+            stream["tail"] = data[-(len(EVENT) - 1):]
+
+    def wait(self, condition, seconds):
+        deadline = time.perf_counter() + seconds
+        while not condition() and time.perf_counter() < deadline:
+            self.poll(0.05)
+        return condition()
+
+    def close(self):
+        for stream in self.streams:
+            self.selector.unregister(stream["socket"])
+            stream["socket"].close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=50, help="Nurses the connections are spread over.")
+    parser.add_argument("--stack-kb", type=int, default=256, help="Stack size of each request thread.")
+    args = parser.parse_args()
+
+    # Each stream needs a socket on both ends.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = 2 * args.connections + 256
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+    # One thread per open stream: smaller stacks keep 5,000 of them cheap.
+    threading.stack_size(args.stack_kb * 1024)
+
+    directory = tempfile.mkdtemp(prefix="benchmarks-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'sse.db')}"
+    os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+    os.environ["PASSWORD_HASH_WORKERS"] = "0"
+
+    from app import app
+    from config import broker, db
+    from seed import generate
+
+    password = "benchmark"
+    with app.app_context():
+        db.create_all()
+        names = generate(users=args.users, hospitals=20, departments=10, patients=2000, seed=1,
+                         shared_password=password, shifts=0)
+
+    server = serve(app)
+    port = server.server_port
+    cookies = [login(port, name, password) for name in names]
+    baseline_mb, baseline_threads = resident_mb(), threading.active_count()
+
+    streams = Streams()
+    started = time.perf_counter()
+    for number in range(args.connections):
+        streams.open(port, cookies[number % len(cookies)], number % len(cookies) + 1)
+        if number % 100 == 99:
+            streams.poll(0)
+    opened = streams.wait(lambda: all(stream["connected"] for stream in streams.streams), 120)
+    connect_seconds = time.perf_counter() - started
+    if not opened:
+        print(f"only {sum(s['connected'] for s in streams.streams)} of {args.connections} streams connected")
+        return 1
+
+    held_mb, held_threads = resident_mb(), threading.active_count()
+    print(f"{args.connections} streams over {len(cookies)} nurses, connected in {connect_seconds:.1f}s")
+    print(f"  subscribers: {broker.subscriber_count()}, threads: {baseline_threads} -> {held_threads}")
+    print(f"  resident memory: {baseline_mb:.0f} MB -> {held_mb:.0f} MB "
+          f"({(held_mb - baseline_mb) * 1024 / args.connections:.1f} KB per stream)")
+
+    # Reference data reaches every stream.
+    published = time.perf_counter()
+    request(port, "PATCH", "/hospitals/1", {"phone_number": "5555555555"}, cookies[0])
+    write_ms = (time.perf_counter() - published) * 1000
+    delivered = streams.wait(lambda: all(stream["events"] >= 1 for stream in streams.streams), 60)
+    arrivals = [(stream["at"] - published) * 1000 for stream in streams.streams if stream["events"]]
+    print(f"  hospital update reached {len(arrivals)}/{args.connections} streams: "
+          f"p50 {percentile(arrivals, 0.5):.0f} ms, p95 {percentile(arrivals, 0.95):.0f} ms, "
+          f"last {max(arrivals):.0f} ms" + ("" if delivered else " (timed out)"))
+    print(f"  PATCH /hospitals/1 itself took {write_ms:.0f} ms")
+
+    # A patient update only reaches its nurse's streams.
+    before = {id(stream): stream["events"] for stream in streams.streams}
+    response, _ = request(port, "POST", "/patients", {
+        "name": "Streaming Patient", "date_of_birth": "1980-01-01", "hospital_id": 1, "department_id": 1,
+    }, cookies[0])
+    own = [stream for stream in streams.streams if stream["user_id"] == 1]
+    streams.wait(lambda: all(stream["events"] > before[id(stream)] for stream in own), 60)
+    streams.wait(lambda: False, 0.5)
+    reached = [stream for stream in streams.streams if stream["events"] > before[id(stream)]]
+    others = sum(stream["user_id"] != 1 for stream in reached)
+    print(f"  patient update reached {len(reached)} streams ({len(own)} of its nurse's, {others} others)")
+
+    latencies = []
+    for _ in range(50):
+        started = time.perf_counter()
+        request(port, "GET", "/hospitals")
+        latencies.append((time.perf_counter() - started) * 1000)
+    print(f"  GET /hospitals while held: p50 {percentile(latencies, 0.5):.1f} ms, p95 {percentile(latencies, 0.95):.1f} ms")
+
+    broker.close()
+    streams.close()
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Seeds one nurse with N patients per hospital and times POST /patients/transfer
+# moving a whole hospital's patients (by filter, then by id list) against the
+# same move done as one PATCH /patients/<id> per patient, timed on a sample
+# and scaled up.
+#
+#   python -m benchmarks.transfer
+#   python -m benchmarks.transfer --patients 10000 --sample 200
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=100_000, help="Patients per hospital.")
+    parser.add_argument("--sample", type=int, default=500, help="Patients moved one PATCH at a time.")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="benchmarks-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'transfer.db')}"
+    os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+    os.environ["PASSWORD_HASH_WORKERS"] = "0"
+
+    from sqlalchemy import event, func, select
+    from app import app
+    from config import db
+    from census import current_counts
+    from models import Patient, rebuild_census
+    from seed import generate
+
+    hospitals = 3
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        names = generate(users=1, hospitals=hospitals, departments=5, patients=args.patients * hospitals, seed=1,
+                         shared_password="benchmark", shifts=0)
+        commits = []
+        event.listen(db.engine, "commit", lambda connection: commits.append(1))
+    seconds = time.perf_counter() - started
+    print(f"{args.patients * hospitals} patients over {hospitals} hospitals, seeded in {seconds:.0f}s")
+
+    client = app.test_client()
+    client.post("/login", json={"name": names[0], "password": "benchmark"})
+
+    print(f"{'move':<28} {'patients':>9} {'total ms':>9} {'commits':>8}")
+
+    def transfer(label, body):
+        commits.clear()
+        started = time.perf_counter()
+        response = client.post("/patients/transfer", json=body)
+        elapsed = time.perf_counter() - started
+        print(f"{label:<28} {response.get_json()['transferred']:9d} {elapsed * 1000:9.1f} {len(commits):8d}")
+
+    transfer("hospital 1 -> 2 (filter)", {"from": {"hospital_id": 1}, "to": {"hospital_id": 2}})
+    with app.app_context():
+        patient_ids = db.session.execute(select(Patient.id).filter_by(hospital_id=2)).scalars().all()
+    transfer("hospital 2 -> 3 (id list)", {"patient_ids": patient_ids[:100_000], "to": {"hospital_id": 3}})
+
+    with app.app_context():
+        sample = db.session.execute(select(Patient.id).filter_by(hospital_id=3).limit(args.sample)).scalars().all()
+    commits.clear()
+    started = time.perf_counter()
+    for patient_id in sample:
+        client.patch(f"/patients/{patient_id}", json={"hospital_id": 1})
+    elapsed = time.perf_counter() - started
+    print(f"{'one PATCH each':<28} {len(sample):9d} {elapsed * 1000:9.1f} {len(commits):8d}"
+          f"  (~{elapsed / len(sample) * args.patients:.0f}s for {args.patients})")
+
+    with app.app_context():
+        counts = current_counts()
+        rebuild_census(db.session.connection())
+        rebuilt = current_counts()
+        db.session.rollback()
+        placed = db.session.execute(
+            select(Patient.hospital_id, func.count()).group_by(Patient.hospital_id)
+        ).all()
+    print(f"patients per hospital: {dict(placed)}; census matches a rebuild: {counts == rebuilt}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,395 @@
+# Standard library imports
+import csv
+import io
+import json
+from collections import Counter
+from datetime import date
+from itertools import chain
+
+# Remote library imports
+from sqlalchemy import bindparam, delete, insert, select, update
+
+# Local imports
+from config import db
+from database import commit
+from models import (
+    Patient, Hospital, Department, Shift, Assignment, CensusCount, PendingCensusChange, adjust_census,
+    bump_versions, census_keys, existing_names, ids_in, patient_version_name, queue_events, record_census_changes,
+    record_changes
+)
+from search import create_search_triggers, drop_search_triggers, index_rows
+
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+CSV_TYPES = ("text/csv", "application/csv")
+
+
+# --------------------
+# Parsing
+# --------------------
+
+def stream_format(mimetype):
+    if mimetype in NDJSON_TYPES:
+        return "ndjson"
+    if mimetype in CSV_TYPES:
+        return "csv"
+    return None
+
+
+def read_rows(stream, fmt):
+    """Yield ``(row_number, row, error)`` for each record in an NDJSON or CSV stream."""
+    lines = (line.decode("utf-8") for line in stream)
+
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for row_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield row_number, None, "Invalid JSON."
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, "Each line must be a JSON object."
+            continue
+        yield row_number, row, None
+
+
+def reference_ids(model):
+    # Rows may name a hospital/department either by id or by name.
+    lookup = {}
+    for id, name in db.session.execute(select(model.id, model.name)):
+        lookup[str(id)] = id
+        lookup[name] = id
+    return lookup
+
+
+def parse_patient_row(row, hospitals, departments, today):
+    name = (row.get("name") or "").strip()
+    if not name:
+        raise ValueError("Patient name cannot be empty.")
+
+    try:
+        date_of_birth = date.fromisoformat(str(row.get("date_of_birth") or ""))
+    except ValueError:
+        raise ValueError("Invalid date_of_birth format. Use YYYY-MM-DD")
+    if date_of_birth >= today:
+        raise ValueError("Date of birth must be in the past.")
+
+    hospital_id = hospitals.get(str(row.get("hospital_id") or row.get("hospital") or ""))
+    if hospital_id is None:
+        raise ValueError("Hospital not found.")
+
+    department_id = departments.get(str(row.get("department_id") or row.get("department") or ""))
+    if department_id is None:
+        raise ValueError("Department not found.")
+
+    return {
+        "name": name,
+        "date_of_birth": date_of_birth,
+        "hospital_id": hospital_id,
+        "department_id": department_id,
+    }
+
+
+# --------------------
+# Import
+# --------------------
+
+class PatientImport:
+    def __init__(self, user_id, chunk_size=5000, max_errors=1000):
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+
+        self._hospitals = reference_ids(Hospital)
+        self._departments = reference_ids(Department)
+        self._seen_names = set()
+        self._pending = []
+        self._today = date.today()
+        self._indexing = False
+
+    def run(self, rows):
+        for row_number, row, error in rows:
+            if error is None:
+                try:
+                    values = parse_patient_row(row, self._hospitals, self._departments, self._today)
+                except ValueError as exc:
+                    error = str(exc)
+
+            if error is None and values["name"] in self._seen_names:
+                error = "This patient name is already in use."
+
+            if error is not None:
+                self._error(row_number, error)
+                continue
+
+            self._seen_names.add(values["name"])
+            values["user_id"] = self.user_id
+            self._pending.append((row_number, values))
+            if len(self._pending) >= self.chunk_size:
+                self._flush()
+                # More chunks are likely, so index whole chunks from here on
+                # rather than row by row. The first chunk's insert has begun
+                # the transaction, so a rollback restores the triggers.
+                if self.inserted and not self._indexing:
+                    drop_search_triggers(db.session.connection(), Patient.__tablename__)
+                    self._indexing = True
+
+        self._flush()
+        if self._indexing:
+            create_search_triggers(db.session.connection())
+        return self
+
+    def report(self):
+        errors = sorted(self.errors, key=lambda error: error["row"])
+        return {"inserted": self.inserted, "error_count": self.error_count, "errors": errors}
+
+    def _error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "error": message})
+
+    def _flush(self):
+        if not self._pending:
+            return
+
+        taken = existing_names(db.session, Patient, (values["name"] for _, values in self._pending))
+        batch = []
+        for row_number, values in self._pending:
+            if values["name"] in taken:
+                self._error(row_number, "This patient name is already in use.")
+            else:
+                batch.append(values)
+
+        if batch:
+            ids = db.session.execute(insert(Patient.__table__).returning(Patient.id), batch).scalars().all()
+            connection = db.session.connection()
+            if self._indexing:
+                index_rows(connection, Patient.__tablename__, ids)
+            changes = [(Patient.__tablename__, patient_id, self.user_id, False) for patient_id in ids]
+            record_changes(connection, changes)
+            queue_events(db.session, changes)
+            # Census work per cell, not per row.
+            cells = Counter((values["hospital_id"], values["department_id"]) for values in batch)
+            record_census_changes(connection, set(cells))
+            deltas = Counter()
+            for cell, count in cells.items():
+                for key in census_keys(*cell, self.user_id):
+                    deltas[key] += count
+            adjust_census(connection, deltas)
+            if not self.inserted:
+                bump_versions(connection, patient_version_name(self.user_id))
+            self.inserted += len(batch)
+        self._pending = []
+
+
+# --------------------
+# Delete
+# --------------------
+
+PLACEMENT_KEYS = {Hospital: "hospital_id", Department: "department_id"}
+
+
+def delete_placement(model, placement_id, chunk_size):
+    """Delete a hospital or department with its shifts and patients.
+
+    Rows are removed with set-based DELETEs rather than through the ORM
+    cascade, and patients go ``chunk_size`` at a time, each chunk in its own
+    transaction, so a large hospital never holds the write lock for long. An
+    interrupted delete leaves the hospital in place to be deleted again.
+    Inside POST /batch the chunks share the batch's one transaction.
+    Returns the number of patients deleted.
+    """
+    column = PLACEMENT_KEYS[model]
+    shifts = select(Shift.id).where(getattr(Shift, column) == placement_id)
+    db.session.execute(delete(Assignment).where(Assignment.shift_id.in_(shifts)))
+    db.session.execute(delete(Shift).where(getattr(Shift, column) == placement_id))
+    commit(db.session)
+
+    deleted = 0
+    while True:
+        rows = db.session.execute(
+            select(Patient.id, Patient.hospital_id, Patient.department_id, Patient.user_id)
+            .where(getattr(Patient, column) == placement_id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+
+        connection = db.session.connection()
+        connection.execute(delete(Patient.__table__).where(Patient.id.in_([row.id for row in rows])))
+        deltas = Counter()
+        deltas.subtract(chain.from_iterable(census_keys(*row[1:]) for row in rows))
+        adjust_census(connection, deltas)
+        changes = [(Patient.__tablename__, row.id, row.user_id, True) for row in rows if row.user_id is not None]
+        record_changes(connection, changes)
+        queue_events(db.session, changes)
+        bump_versions(connection, model.__tablename__, *sorted(
+            {patient_version_name(row.user_id) for row in rows if row.user_id is not None}
+        ))
+        commit(db.session)
+        deleted += len(rows)
+
+    # Every cell the patients were in belongs to this hospital/department, whose
+    # shifts are gone, so there is nothing left for a schedule repair to do.
+    connection = db.session.connection()
+    connection.execute(delete(PendingCensusChange).where(getattr(PendingCensusChange, column) == placement_id))
+    connection.execute(delete(CensusCount).where(getattr(CensusCount, column) == placement_id))
+    connection.execute(delete(model.__table__).where(model.id == placement_id))
+    changes = [(model.__tablename__, placement_id, 0, True)]
+    record_changes(connection, changes)
+    queue_events(db.session, changes)
+    bump_versions(connection, model.__tablename__)
+    commit(db.session)
+    return deleted
+
+
+# --------------------
+# Transfer
+# --------------------
+
+def expire_patients(session, patient_ids):
+    # Patients the session has already loaded (say, earlier in a batch) would
+    # otherwise keep their old placement until the next commit.
+    for (model, (patient_id, *_), _), obj in list(session.identity_map.items()):
+        if model is Patient and patient_id in patient_ids:
+            session.expire(obj)
+
+
+def transfer_chunks(user_id, source, patient_ids, chunk_size):
+    """Yield the ``(id, hospital_id, department_id)`` rows of the nurse's
+    patients in ``patient_ids``, or else placed at ``source``, ``chunk_size``
+    at a time in id order."""
+    # Plain Core rows: the ORM's row processing costs more than the query here.
+    columns = (Patient.id, Patient.hospital_id, Patient.department_id)
+    if patient_ids is not None:
+        ids = sorted(set(patient_ids))
+        # By id alone, so SQLite looks the ids up instead of walking the
+        # nurse's index; other nurses' patients are dropped here.
+        rows = (
+            select(*columns, Patient.user_id)
+            .where(Patient.id.in_(bindparam("ids", expanding=True)))
+            .order_by(Patient.id)
+        )
+        for start in range(0, len(ids), chunk_size):
+            found = db.session.connection().execute(rows, {"ids": ids[start:start + chunk_size]}).all()
+            chunk = [(patient_id, hospital_id, department_id)
+                     for patient_id, hospital_id, department_id, owner_id in found if owner_id == user_id]
+            if chunk:
+                yield chunk
+        return
+
+    conditions = [Patient.user_id == user_id, *(getattr(Patient, key) == value for key, value in source.items())]
+    rows = select(*columns).where(*conditions).order_by(Patient.id)
+    after = 0
+    while chunk := db.session.connection().execute(rows.where(Patient.id > after).limit(chunk_size)).all():
+        yield chunk
+        after = chunk[-1][0]
+
+
+def transfer_patients(user_id, target, chunk_size, patient_ids=None, source=None):
+    """Move a nurse's patients to the ``target`` hospital and/or department.
+
+    The patients are those in ``patient_ids``, or those placed at ``source``
+    (``{"hospital_id": ..., "department_id": ...}``, either or both). Each
+    chunk of ``chunk_size`` patients is moved with one UPDATE, and its census
+    counts, change feed entries and cache versions are adjusted in the same
+    transaction, as with ``delete_placement``. Returns ``(matched, transferred)``;
+    patients already at the target are matched but left alone.
+    """
+    matched = transferred = 0
+    for rows in transfer_chunks(user_id, source, patient_ids, chunk_size):
+        matched += len(rows)
+        moves = {}
+        for cell, count in Counter((hospital_id, department_id) for _, hospital_id, department_id in rows).items():
+            new_cell = (target.get("hospital_id", cell[0]), target.get("department_id", cell[1]))
+            if new_cell != cell:
+                moves[cell] = (new_cell, count)
+        moved = [
+            patient_id for patient_id, hospital_id, department_id in rows if (hospital_id, department_id) in moves
+        ]
+        if not moved:
+            continue
+
+        # The chunk was read in this transaction, so its ids alone pick the rows.
+        connection = db.session.connection()
+        for condition in ids_in(connection, Patient.id, moved):
+            db.session.execute(
+                update(Patient).where(condition).values(**target),
+                execution_options={"synchronize_session": False},
+            )
+        expire_patients(db.session, set(moved))
+        deltas = Counter()
+        for cell, (new_cell, count) in moves.items():
+            for key in census_keys(*cell, user_id):
+                deltas[key] -= count
+            for key in census_keys(*new_cell, user_id):
+                deltas[key] += count
+        adjust_census(connection, deltas)
+        record_census_changes(connection, set(moves) | {new_cell for new_cell, _ in moves.values()})
+        changes = [(Patient.__tablename__, patient_id, user_id, False) for patient_id in moved]
+        record_changes(connection, changes)
+        queue_events(db.session, changes)
+        bump_versions(connection, patient_version_name(user_id))
+        commit(db.session)
+        transferred += len(moved)
+
+    return matched, transferred
+
+
+# --------------------
+# Export
+# --------------------
+
+EXPORT_FIELDS = ("id", "name", "date_of_birth", "hospital_id", "hospital", "department_id", "department")
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def export_rows(query, yield_per):
+    # Plain column rows rather than Patient instances keep per-row cost and memory flat.
+    rows = query.with_entities(
+        Patient.id,
+        Patient.name,
+        Patient.date_of_birth,
+        Patient.hospital_id,
+        Hospital.name,
+        Patient.department_id,
+        Department.name,
+    ).outerjoin(Patient.hospital).outerjoin(Patient.department)
+
+    for row in rows.yield_per(yield_per):
+        record = dict(zip(EXPORT_FIELDS, row))
+        record["date_of_birth"] = record["date_of_birth"].isoformat()
+        yield record
+
+
+def export_chunks(query, fmt, yield_per=1000):
+    """Yield the patients in ``query`` as NDJSON or CSV text, ``yield_per`` rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS) if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+
+    for count, record in enumerate(export_rows(query, yield_per), start=1):
+        if writer:
+            writer.writerow(record)
+        else:
+            buffer.write(json.dumps(record))
+            buffer.write("\n")
+
+        if count % yield_per == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,212 @@
+# Standard library imports
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, maxsize=1024, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, self._clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# --------------------
+# Response cache backends
+# --------------------
+# Backends store opaque byte strings under string keys and evict least recently
+# used entries once the stored bytes exceed ``max_bytes``.
+
+class MemoryCache:
+    """Single-process backend."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self.size -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class SQLiteCache:
+    """Backend shared by every worker on a host through one SQLite file."""
+
+    # Reads refresh an entry's LRU position at most this often, so hot keys do
+    # not turn every cache hit into a write.
+    TOUCH_INTERVAL = 5
+
+    def __init__(self, path, max_bytes, clock=time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_response_cache_accessed ON response_cache (accessed)"
+            )
+            # One row holding the stored bytes, kept up to date by every write so
+            # set() never has to sum the table.
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache_size ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO response_cache_size (id, total) "
+                "SELECT 0, COALESCE(SUM(size), 0) FROM response_cache"
+            )
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value, accessed FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        now = self._clock()
+        if now - row[1] > self.TOUCH_INTERVAL:
+            connection.execute("UPDATE response_cache SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    @property
+    def size(self):
+        return self._connection().execute("SELECT total FROM response_cache_size").fetchone()[0]
+
+    def _add_size(self, connection, delta):
+        connection.execute("UPDATE response_cache_size SET total = total + ?", (delta,))
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            previous = connection.execute("SELECT size FROM response_cache WHERE key = ?", (key,)).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), self._clock()),
+            )
+            self._add_size(connection, len(value) - (previous[0] if previous else 0))
+            excess = self.size - self.max_bytes
+            if excess > 0:
+                evict = []
+                freed = 0
+                for old_key, size in connection.execute(
+                    "SELECT key, size FROM response_cache ORDER BY accessed"
+                ):
+                    evict.append((old_key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                connection.executemany("DELETE FROM response_cache WHERE key = ?", evict)
+                self._add_size(connection, -freed)
+
+    def delete(self, key):
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            previous = connection.execute("SELECT size FROM response_cache WHERE key = ?", (key,)).fetchone()
+            if previous:
+                connection.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._add_size(connection, -previous[0])
+
+    def clear(self):
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM response_cache")
+            connection.execute("UPDATE response_cache_size SET total = 0")
+
+
+def create_response_cache(config):
+    backend = config.get("RESPONSE_CACHE_BACKEND")
+    if backend == "memory":
+        return MemoryCache(config["RESPONSE_CACHE_MAX_BYTES"])
+    if backend == "sqlite":
+        return SQLiteCache(config["RESPONSE_CACHE_PATH"], config["RESPONSE_CACHE_MAX_BYTES"])
+    if backend:
+        raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {backend}")
+    return None
@@ -0,0 +1,75 @@
+# Standard library imports
+import time
+
+# Remote library imports
+import click
+from sqlalchemy import and_, func, select
+
+# Local imports
+from config import app, db
+from models import CensusCount, Department, Hospital, rebuild_census
+
+
+def totals(model, hospital_id, department_id):
+    # Every hospital/department, with the count from its (h, 0, 0) or (0, d, 0) row.
+    return db.session.execute(
+        select(model.id, model.name, func.coalesce(CensusCount.patient_count, 0))
+        .outerjoin(CensusCount, and_(
+            CensusCount.hospital_id == hospital_id,
+            CensusCount.department_id == department_id,
+            CensusCount.user_id == 0,
+        ))
+        .order_by(model.id)
+    ).all()
+
+
+def census_report(user_id):
+    """Patient counts per hospital, per department within it, per department
+    and for the nurse ``user_id``, read from the census counters alone."""
+    departments = [
+        {"id": id, "name": name, "patient_count": count}
+        for id, name, count in totals(Department, 0, Department.id)
+    ]
+    names = {department["id"]: department["name"] for department in departments}
+
+    cells = {}
+    for hospital_id, department_id, count in db.session.execute(
+        select(CensusCount.hospital_id, CensusCount.department_id, CensusCount.patient_count)
+        .where(CensusCount.hospital_id > 0, CensusCount.department_id > 0, CensusCount.user_id == 0)
+        .where(CensusCount.patient_count > 0)
+        .order_by(CensusCount.hospital_id, CensusCount.department_id)
+    ):
+        cells.setdefault(hospital_id, []).append(
+            {"id": department_id, "name": names.get(department_id), "patient_count": count}
+        )
+
+    hospitals = [
+        {"id": id, "name": name, "patient_count": count, "departments": cells.get(id, [])}
+        for id, name, count in totals(Hospital, Hospital.id, 0)
+    ]
+    caseload = db.session.execute(
+        select(CensusCount.patient_count).filter_by(hospital_id=0, department_id=0, user_id=user_id)
+    ).scalar()
+
+    return {"hospitals": hospitals, "departments": departments, "caseload": caseload or 0}
+
+
+def current_counts():
+    rows = db.session.execute(select(
+        CensusCount.hospital_id, CensusCount.department_id, CensusCount.user_id, CensusCount.patient_count
+    ))
+    return {(hospital_id, department_id, user_id): count for hospital_id, department_id, user_id, count in rows if count}
+
+
+@click.command('reconcile-census')
+def reconcile_command():
+    """Rebuild the census counters from the patients table."""
+    started = time.perf_counter()
+    with app.app_context():
+        before = current_counts()
+        rebuild_census(db.session.connection())
+        after = current_counts()
+        db.session.commit()
+
+    drifted = sum(before.get(key, 0) != after.get(key, 0) for key in before.keys() | after.keys())
+    click.echo(f'Rebuilt {len(after)} census counters in {time.perf_counter() - started:.1f}s; {drifted} had drifted.')
@@ -0,0 +1,67 @@
+# Standard library imports
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+# Remote library imports
+import click
+from sqlalchemy import delete, func, select
+
+# Local imports
+from config import app, db
+from models import CHANGES_FLOOR_VERSION, Change, TableVersion, set_version
+
+
+def latest_version():
+    latest = db.session.execute(select(func.max(Change.id))).scalar() or 0
+    return max(latest, TableVersion.current(CHANGES_FLOOR_VERSION))
+
+
+def change_feed(user_id, since, limit):
+    """Return ``(version, more, upserted, deleted)`` for the changes after
+    ``since`` that ``user_id`` can see, at most ``limit`` of them.
+
+    ``upserted`` and ``deleted`` map table names to row ids. Poll again from
+    ``version``; ``more`` means the page was full.
+    """
+    # Read up to a fixed version, so a change committed meanwhile is left
+    # for the next poll instead of being skipped.
+    latest = max(latest_version(), since)
+    rows = db.session.execute(
+        select(Change.id, Change.table_name, Change.row_id, Change.deleted)
+        .where(Change.id > since, Change.id <= latest, Change.user_id.in_((0, user_id)))
+        .order_by(Change.id)
+        .limit(limit + 1)
+    ).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    upserted, deleted = defaultdict(list), defaultdict(list)
+    for row in rows:
+        (deleted if row.deleted else upserted)[row.table_name].append(row.row_id)
+
+    version = rows[-1].id if more else latest
+    return version, more, upserted, deleted
+
+
+@click.command('compact-changes')
+@click.option('--days', type=int, default=None, help='Keep deletions this recent (default CHANGES_RETENTION_DAYS).')
+def compact_command(days):
+    """Drop old deletions from the change feed.
+
+    Clients polling from before the newest dropped deletion get a 410 and
+    reload everything, as they could otherwise miss it.
+    """
+    with app.app_context():
+        days = app.config['CHANGES_RETENTION_DAYS'] if days is None else days
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+        floor = db.session.execute(
+            select(func.max(Change.id)).where(Change.deleted, Change.changed_at < cutoff)
+        ).scalar()
+        if floor is None:
+            click.echo('No deletions to compact.')
+            return
+
+        removed = db.session.execute(delete(Change).where(Change.deleted, Change.id <= floor)).rowcount
+        set_version(db.session.connection(), CHANGES_FLOOR_VERSION, max(floor, TableVersion.current(CHANGES_FLOOR_VERSION)))
+        db.session.commit()
+    click.echo(f'Removed {removed} deletions; clients must reload if polling from before version {floor}.')
@@ -1,4 +1,5 @@
 # Standard library imports
+import os
 
 # Remote library imports
 from flask import Flask
@@ -11,26 +12,78 @@ from flask_migrate import Migrate
 from sqlalchemy import MetaData
 
 # Local imports
+from database import RoutingSession, apply_sqlite_pragmas, configure_replicas, configure_sqlite
+from events import EventBroker
+from instrumentation import Instrumentation
+from passwords import PasswordHasher
 
 # Instantiate app, set attributes
 app = Flask(__name__)
 app.secret_key = "supersecretkey"
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.json.compact = False
+app.config['PAGE_SIZE'] = 100
+app.config['MAX_PAGE_SIZE'] = 1000
+app.config['USER_CACHE_SIZE'] = 1024
+app.config['USER_CACHE_TTL'] = 60
+app.config['BULK_CHUNK_SIZE'] = 5000
+app.config['BULK_DELETE_CHUNK_SIZE'] = 1000
+app.config['BULK_TRANSFER_CHUNK_SIZE'] = 5000
+app.config['BULK_TRANSFER_MAX_IDS'] = 100000
+app.config['EXPORT_YIELD_PER'] = 1000
+app.config['INSTRUMENTATION'] = os.environ.get('INSTRUMENTATION') == '1'
+app.config['N_PLUS_ONE_THRESHOLD'] = 10
+app.config['VERSIONED_CACHE_SIZE'] = 256
+app.config['VERSIONED_CACHE_TTL'] = 3600
+app.config['RESPONSE_CACHE_BACKEND'] = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+app.config['RESPONSE_CACHE_PATH'] = os.environ.get('RESPONSE_CACHE_PATH', os.path.join(app.instance_path, 'response_cache.db'))
+app.config['RESPONSE_CACHE_MAX_BYTES'] = 64 * 1024 * 1024
+app.config['SCHEDULER_PATIENTS_PER_NURSE'] = 5
+app.config['SCHEDULER_FLOAT_PENALTY'] = 12
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 2 * max(1, app.config['PASSWORD_HASH_WORKERS'])))
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'production')
+app.config['SQLITE_PRAGMAS'] = {}
+app.config['SQLITE_POOL_SIZE'] = 10
+app.config['SQLITE_MAX_OVERFLOW'] = 10
+app.config['SQLITE_POOL_TIMEOUT'] = 10
+app.config['READ_REPLICA_URLS'] = [url for url in os.environ.get('READ_REPLICA_URLS', '').split(',') if url]
+app.config['READ_YOUR_WRITES_SECONDS'] = 5
+app.config['CHANGES_PAGE_SIZE'] = 1000
+app.config['CHANGES_RETENTION_DAYS'] = 30
+app.config['SSE_HEARTBEAT_SECONDS'] = 15
+app.config['SSE_QUEUE_SIZE'] = 100
+app.config['SEARCH_PAGE_SIZE'] = 20
+app.config['BATCH_MAX_REQUESTS'] = 100
 
 # Define metadata, instantiate db
 metadata = MetaData(naming_convention={
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
 })
-db = SQLAlchemy(metadata=metadata)
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
 ma = Marshmallow()
-bcrypt = Bcrypt()
+bcrypt = Bcrypt(app)
+password_hasher = PasswordHasher(app)
+broker = EventBroker(app)
 migrate = Migrate(app, db)
+configure_sqlite(app)
+configure_replicas(app)
 db.init_app(app)
+apply_sqlite_pragmas(app, db)
 
 # Instantiate REST API
 api = Api(app)
 
 # Instantiate CORS
-CORS(app, supports_credentials=True, origins=["http://localhost:3000"])
+CORS(
+    app,
+    supports_credentials=True,
+    origins=["http://localhost:3000"],
+    expose_headers=["Link", "X-Next-Cursor", "Server-Timing"],
+)
+
+# Instantiate opt-in request instrumentation
+if app.config['INSTRUMENTATION']:
+    Instrumentation(app, db)
@@ -0,0 +1,179 @@
+# Standard library imports
+import random
+import time
+
+# Remote library imports
+import click
+from flask import current_app, g, has_request_context, request, session
+from flask.cli import with_appcontext
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+# PRAGMAs run on every new SQLite connection, chosen by SQLITE_PROFILE.
+# "default" keeps SQLite's own settings: a rollback journal, synchronous=FULL,
+# a 2 MB page cache and no memory-mapped I/O.
+SQLITE_PROFILES = {
+    "default": {},
+    "production": {
+        # Readers keep reading the last commit while a writer works, and a
+        # commit appends to the log instead of rewriting pages in place.
+        "journal_mode": "WAL",
+        # With WAL this only risks the last commits on power loss, not corruption.
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        # Negative sizes are KiB: 64 MB of page cache per connection.
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def sqlite_pragmas(config):
+    pragmas = dict(SQLITE_PROFILES[config["SQLITE_PROFILE"]])
+    pragmas.update(config["SQLITE_PRAGMAS"])
+    return pragmas
+
+
+def configure_sqlite(app):
+    """Size the pool of a file SQLite database.
+
+    Must run before ``db.init_app(app)``, which reads the engine options;
+    ``apply_sqlite_pragmas`` runs after it.
+    """
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() != "sqlite":
+        return
+
+    # In-memory databases use a single static connection; only file databases pool.
+    if url.database not in (None, "", ":memory:"):
+        options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+        options.setdefault("pool_size", app.config["SQLITE_POOL_SIZE"])
+        options.setdefault("max_overflow", app.config["SQLITE_MAX_OVERFLOW"])
+        options.setdefault("pool_timeout", app.config["SQLITE_POOL_TIMEOUT"])
+
+
+def apply_sqlite_pragmas(app, db):
+    """Apply the SQLITE_PROFILE pragmas to new connections of the app's
+    SQLite engines, the primary and any replicas, and no other engine in
+    the process."""
+    pragmas = sqlite_pragmas(app.config)
+
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", apply_pragmas)
+
+
+def commit(session):
+    """Commit ``session``, or only flush it inside POST /batch, which commits
+    every operation at once at the end."""
+    if has_request_context() and g.get("batch", False):
+        session.flush()
+    else:
+        session.commit()
+
+
+# --------------------
+# Read replicas
+# --------------------
+
+REPLICA_BIND_PREFIX = "replica_"
+
+
+def replica_keys(engines):
+    return sorted(key for key in engines if key and key.startswith(REPLICA_BIND_PREFIX))
+
+
+class RoutingSession(Session):
+    """Send the reads of GET requests to a read replica, everything else to the primary.
+
+    A request stays on the primary once it has written anything, and so does
+    its client for READ_YOUR_WRITES_SECONDS afterwards, so nobody reads past
+    their own writes while replicas catch up.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.reads_from_replica(clause):
+            replicas = replica_keys(self._db.engines)
+            # One replica per session, so a request sees a single snapshot.
+            return self._db.engines[self.info.setdefault("replica", random.choice(replicas))]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def reads_from_replica(self, clause):
+        return (
+            has_request_context()
+            and g.get("read_from_replica", False)
+            and not g.get("wrote_to_primary", False)
+            and not self._flushing
+            and not getattr(clause, "is_dml", False)
+        )
+
+
+def wrote_to_primary():
+    if has_request_context():
+        g.wrote_to_primary = True
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def flushed_to_primary(session, flush_context):
+    wrote_to_primary()
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def executed_on_primary(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        wrote_to_primary()
+
+
+def configure_replicas(app):
+    """Add READ_REPLICA_URLS as replica binds and route GET requests to them.
+
+    Must run before ``db.init_app(app)``, which creates the bind engines.
+    """
+    urls = app.config["READ_REPLICA_URLS"]
+    if not urls:
+        return
+
+    binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+    for number, url in enumerate(urls):
+        binds[f"{REPLICA_BIND_PREFIX}{number}"] = url
+
+    @app.before_request
+    def route_reads():
+        g.read_from_replica = request.method == "GET" and time.time() >= session.get("primary_until", 0)
+
+    @app.after_request
+    def read_your_writes(response):
+        if g.get("wrote_to_primary", False):
+            session["primary_until"] = time.time() + app.config["READ_YOUR_WRITES_SECONDS"]
+        return response
+
+
+@click.command("sync-replicas")
+@with_appcontext
+def sync_replicas_command():
+    """Copy the primary SQLite database over each SQLite read replica."""
+    engines = current_app.extensions["sqlalchemy"].engines
+    primary = engines[None]
+    for key in replica_keys(engines):
+        replica = engines[key]
+        if primary.dialect.name != "sqlite" or replica.dialect.name != "sqlite":
+            click.echo(f"Skipped {key}: only SQLite replicas are copied; others use the database's replication.")
+            continue
+
+        source, target = primary.raw_connection(), replica.raw_connection()
+        try:
+            source.driver_connection.backup(target.driver_connection)
+        finally:
+            target.close()
+            source.close()
+        click.echo(f"Copied the primary database to {key} ({replica.url.database}).")
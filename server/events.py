@@ -0,0 +1,160 @@
+# Standard library imports
+import json
+import queue
+import threading
+from collections import defaultdict, deque
+
+# Pushes committed changes to server-sent event streams. The broker lives in
+# one process: a stream only hears about commits made by its own worker, and
+# clients catch up on the rest from GET /changes.
+
+EVERYONE = 0
+TABLES = ("hospitals", "departments", "patients")
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def group_changes(changes):
+    """Group ``(table_name, row_id, user_id, deleted)`` changes by the user who
+    may see them, as ``{user_id: {table: {"upserted": [...], "deleted": [...]}}}``."""
+    grouped = defaultdict(lambda: {table: {"upserted": [], "deleted": []} for table in TABLES})
+    for table_name, row_id, user_id, deleted in changes:
+        if table_name in TABLES:
+            grouped[user_id][table_name]["deleted" if deleted else "upserted"].append(row_id)
+    return grouped
+
+
+class Subscription:
+    """One event stream's queue, which keeps the newest ``size`` events."""
+
+    def __init__(self, user_id, size):
+        self.user_id = user_id
+        self.events = deque(maxlen=size)
+        self.overflowed = False
+        self.closed = False
+        self.ready = threading.Condition()
+
+    def put(self, event):
+        with self.ready:
+            if len(self.events) == self.events.maxlen:
+                self.overflowed = True
+            self.events.append(event)
+            self.ready.notify()
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+
+    def take(self, timeout):
+        """Wait up to ``timeout`` seconds and return the queued events, with a
+        ``resync`` first if older ones were dropped."""
+        with self.ready:
+            self.ready.wait_for(lambda: self.events or self.closed, timeout)
+            events = list(self.events)
+            self.events.clear()
+            if self.overflowed:
+                self.overflowed = False
+                events.insert(0, format_event("resync", {}))
+            return events
+
+
+class EventBroker:
+    """Fan committed changes out to each user's event streams.
+
+    Reference data (hospitals, departments) goes to every stream, patients
+    only to their nurse's. Each stream buffers at most ``SSE_QUEUE_SIZE``
+    events; past that the oldest are dropped and the client is told to
+    ``resync`` from GET /changes, so a stalled client never holds up the
+    publisher or grows without bound.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        self._outbox = queue.SimpleQueue()
+        self._publisher = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.queue_size = app.config["SSE_QUEUE_SIZE"]
+        self.heartbeat = app.config["SSE_HEARTBEAT_SECONDS"]
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def stream(self, user_id):
+        """Yield ``user_id``'s server-sent events until the client goes away.
+
+        The subscription starts with the first event, so a response that is
+        never sent never subscribes.
+        """
+        subscription = self.subscribe(user_id)
+        try:
+            # Flushes the headers, so the client knows it is subscribed.
+            yield ": connected\n\n"
+            while not subscription.closed:
+                events = subscription.take(self.heartbeat)
+                # A comment line keeps proxies from timing the stream out and
+                # surfaces a disconnected client on the next write.
+                yield "".join(events) if events else ": heartbeat\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, changes):
+        """Queue committed ``changes`` for the publisher thread, so the
+        committing request does not wait while thousands of streams wake up."""
+        self._outbox.put(list(changes))
+        with self._lock:
+            if self._publisher is None:
+                self._publisher = threading.Thread(target=self._publish_forever, name="event-broker", daemon=True)
+                self._publisher.start()
+
+    def _publish_forever(self):
+        while True:
+            self.deliver(self._outbox.get())
+
+    def deliver(self, changes):
+        grouped = group_changes(changes)
+        if not grouped:
+            return
+
+        with self._lock:
+            recipients = {user_id: list(subscriptions) for user_id, subscriptions in self._subscriptions.items()}
+
+        shared = grouped.pop(EVERYONE, None)
+        shared_event = format_event("changes", shared) if shared else None
+        for user_id, subscriptions in recipients.items():
+            own = grouped.get(user_id)
+            if own and shared:
+                own = {table: {kind: shared[table][kind] + own[table][kind] for kind in own[table]} for table in TABLES}
+            event = format_event("changes", own) if own else shared_event
+            if event is None:
+                continue
+            for subscription in subscriptions:
+                subscription.put(event)
+
+    def close(self):
+        """End every stream, e.g. before the worker exits."""
+        with self._lock:
+            subscriptions = [s for group in self._subscriptions.values() for s in group]
+        for subscription in subscriptions:
+            subscription.close()
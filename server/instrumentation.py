@@ -0,0 +1,160 @@
+# Standard library imports
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# Remote library imports
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+
+TIMED_SECTIONS = ("serialize", "bcrypt")
+IN_LIST = re.compile(r"\((?:\?, )+\?\)")
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.sections = defaultdict(float)
+        self.repeated = Counter()
+        self._depth = Counter()
+
+
+def current_stats():
+    if has_request_context():
+        return g.get("request_stats")
+    return None
+
+
+@contextmanager
+def timed(section):
+    """Add the time spent in the block to ``section`` for the current request.
+
+    Nested blocks for the same section (e.g. a schema dumping nested schemas)
+    are only counted once, by the outermost block.
+    """
+    stats = current_stats()
+    if stats is None:
+        yield
+        return
+
+    stats._depth[section] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats._depth[section] -= 1
+        if not stats._depth[section]:
+            stats.sections[section] += time.perf_counter() - started
+
+
+class TimedDumpMixin:
+    def dump(self, obj, *, many=None):
+        with timed("serialize"):
+            return super().dump(obj, many=many)
+
+
+class Instrumentation:
+    def __init__(self, app, db):
+        self.app = app
+        self.threshold = app.config["N_PLUS_ONE_THRESHOLD"]
+        self._lock = threading.Lock()
+        self._totals = defaultdict(Counter)
+
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+                event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+                event.listen(engine, "handle_error", self._handle_error)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule("/metrics", "metrics", self.metrics)
+
+    # SQL events
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._record(conn.info["query_started"].pop(), statement)
+
+    def _handle_error(self, context):
+        # A statement that raises never reaches after_cursor_execute, so its
+        # start time would stay on the connection's stack for good.
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            self._record(started.pop(), context.statement or "")
+
+    def _record(self, started, statement):
+        elapsed = time.perf_counter() - started
+        stats = current_stats()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+            stats.repeated[IN_LIST.sub("(?)", statement)] += 1
+
+    # Request hooks
+
+    def _before_request(self):
+        g.request_stats = RequestStats()
+
+    def _after_request(self, response):
+        stats = g.pop("request_stats", None)
+        if stats is None:
+            return response
+
+        total = time.perf_counter() - stats.started
+        response.headers["Server-Timing"] = ", ".join(
+            [f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.statements} queries"']
+            + [f"{section};dur={stats.sections[section] * 1000:.2f}" for section in TIMED_SECTIONS]
+            + [f"total;dur={total * 1000:.2f}"]
+        )
+
+        key = (request.endpoint or "unknown", request.method)
+        with self._lock:
+            totals = self._totals[key]
+            totals["requests"] += 1
+            totals["statements"] += stats.statements
+            totals["db_seconds"] += stats.db_seconds
+            totals["request_seconds"] += total
+            for section in TIMED_SECTIONS:
+                totals[f"{section}_seconds"] += stats.sections[section]
+
+        if stats.repeated:
+            statement, repeats = stats.repeated.most_common(1)[0]
+            if repeats >= self.threshold:
+                self.app.logger.warning(
+                    "Possible N+1 in %s %s: statement ran %d times: %s",
+                    request.method, request.path, repeats, statement,
+                )
+        return response
+
+    # Prometheus text exposition
+
+    METRICS = (
+        ("requests", "requests_total", "Requests handled."),
+        ("statements", "sql_statements_total", "SQL statements executed."),
+        ("db_seconds", "db_seconds_total", "Time spent executing SQL."),
+        ("serialize_seconds", "serialize_seconds_total", "Time spent in marshmallow dumps."),
+        ("bcrypt_seconds", "bcrypt_seconds_total", "Time spent hashing and checking passwords."),
+        ("request_seconds", "request_seconds_total", "Time spent handling requests."),
+    )
+
+    def metrics(self):
+        with self._lock:
+            totals = {key: Counter(values) for key, values in self._totals.items()}
+
+        lines = []
+        for field, name, description in self.METRICS:
+            lines.append(f"# HELP nurse_scheduler_{name} {description}")
+            lines.append(f"# TYPE nurse_scheduler_{name} counter")
+            for (endpoint, method), values in sorted(totals.items()):
+                lines.append(
+                    f'nurse_scheduler_{name}{{endpoint="{endpoint}",method="{method}"}} {values[field]}'
+                )
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,60 @@
+"""Add search index
+
+Revision ID: 1b0251f2bfaa
+Revises: 855532cfad96
+Create Date: 2026-10-18 08:00:35.411892
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '1b0251f2bfaa'
+down_revision = '855532cfad96'
+branch_labels = None
+depends_on = None
+
+
+# (kind, table, scope, columns the index depends on); a row's rowid is id * 4 + kind.
+KINDS = [
+    (1, 'patients', "'u' || {row}.user_id", 'name, user_id'),
+    (2, 'hospitals', "'all'", 'name'),
+    (3, 'departments', "'all'", 'name'),
+]
+
+
+def upgrade():
+    op.execute(
+        'CREATE VIRTUAL TABLE search_index USING fts5(name, scope, '
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3', detail = column)"
+    )
+    for kind, table, scope, columns in KINDS:
+        op.execute(
+            f'INSERT INTO search_index (rowid, name, scope) '
+            f'SELECT id * 4 + {kind}, name, {scope.format(row=table)} FROM {table}'
+        )
+        op.execute(
+            f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN '
+            f'INSERT INTO search_index (rowid, name, scope) VALUES (NEW.id * 4 + {kind}, NEW.name, {scope.format(row="NEW")}); '
+            'END'
+        )
+        op.execute(
+            f'CREATE TRIGGER {table}_search_update AFTER UPDATE OF {columns} ON {table} BEGIN '
+            f'DELETE FROM search_index WHERE rowid = OLD.id * 4 + {kind}; '
+            f'INSERT INTO search_index (rowid, name, scope) VALUES (NEW.id * 4 + {kind}, NEW.name, {scope.format(row="NEW")}); '
+            'END'
+        )
+        op.execute(
+            f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN '
+            f'DELETE FROM search_index WHERE rowid = OLD.id * 4 + {kind}; '
+            'END'
+        )
+    # Merge the backfill into one segment.
+    op.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+
+
+def downgrade():
+    for _, table, _, _ in KINDS:
+        for action in ('insert', 'update', 'delete'):
+            op.execute(f'DROP TRIGGER {table}_search_{action}')
+    op.execute('DROP TABLE search_index')
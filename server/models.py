@@ -1,8 +1,19 @@
+import json
+from sqlalchemy import DateTime, bindparam, event, func, inspect, literal, select, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import validates
-from datetime import date
-from config import db, bcrypt
+from sqlalchemy.orm import Session, joinedload, selectinload, validates
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from itertools import chain
+from datetime import date, datetime, timezone
+from config import broker, db, password_hasher
+from instrumentation import timed
+
+
+UNIQUE_CHECK_CHUNK_SIZE = 500
+DEFER_UNIQUE_CHECKS = 'defer_unique_checks'
 
 
 class User(db.Model):
@@ -11,11 +22,18 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, unique=True, nullable=False)
     _password_hash = db.Column(db.String, nullable=False)
+    max_weekly_hours = db.Column(db.Integer, nullable=False, default=40, server_default='40')
 
     # relationships
     patients = db.relationship(
         'Patient', back_populates='user', cascade='all, delete-orphan'
     )
+    assignments = db.relationship(
+        'Assignment', back_populates='user', cascade='all, delete-orphan'
+    )
+    availabilities = db.relationship(
+        'Availability', back_populates='user', cascade='all, delete-orphan'
+    )
     hospitals = association_proxy(
         'patients', 'hospital', creator=lambda hospital_obj: Patient(hospital=hospital_obj)
     )
@@ -27,17 +45,22 @@ class User(db.Model):
     serialize_rules = ('-patients.user',)
 
     # validations
+    unique_name_error = 'This user name is already in use.'
+
     @validates('name')
     def validate_name(self, key, name):
         if not name:
             raise ValueError('User name cannot be empty.')
 
-        existing_user = User.query.filter_by(name=name).first()
-        if existing_user and existing_user.id != self.id:
-            raise ValueError('This user name is already in use.')
-
+        check_unique_name(self, name)
         return name
 
+    @validates('max_weekly_hours')
+    def validate_max_weekly_hours(self, key, max_weekly_hours):
+        if max_weekly_hours is None or max_weekly_hours < 0:
+            raise ValueError('Max weekly hours must be zero or more.')
+        return max_weekly_hours
+
     @hybrid_property
     def password_hash(self):
         return self._password_hash
@@ -47,11 +70,16 @@ class User(db.Model):
         if not password:
             raise ValueError('Password cannot be empty.')
 
-        password_hash = bcrypt.generate_password_hash(password.encode('utf-8'))
-        self._password_hash = password_hash.decode('utf-8')
+        with timed('bcrypt'):
+            self._password_hash = password_hasher.hash(password)
 
     def authenticate(self, password):
-        return bcrypt.check_password_hash(self._password_hash, password.encode('utf-8'))
+        with timed('bcrypt'):
+            return password_hasher.check(self._password_hash, password)
+
+    @property
+    def needs_rehash(self):
+        return password_hasher.needs_rehash(self._password_hash)
 
     def __repr__(self):
         return f'<User: {self.name}>'
@@ -59,14 +87,26 @@ class User(db.Model):
 
 class Patient(db.Model):
     __tablename__ = 'patients'
+    __table_args__ = (
+        db.Index('ix_patients_user_id_hospital_id', 'user_id', 'hospital_id'),
+        db.Index('ix_patients_user_id_department_id', 'user_id', 'department_id'),
+        db.Index('ix_patients_hospital_id', 'hospital_id'),
+        db.Index('ix_patients_department_id', 'department_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, unique=True, nullable=False)
     date_of_birth = db.Column(db.Date, nullable=False)
 
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    hospital_id = db.Column(db.Integer, db.ForeignKey('hospitals.id'))
-    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'))
+    # The placement columns load their old value when assigned on an expired
+    # patient, so the flush still sees where the patient came from.
+    user_id = db.column_property(db.Column(db.Integer, db.ForeignKey('users.id')), active_history=True)
+    hospital_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('hospitals.id', ondelete='CASCADE')), active_history=True
+    )
+    department_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('departments.id', ondelete='CASCADE')), active_history=True
+    )
 
     # relationships
     user = db.relationship('User', back_populates='patients')
@@ -76,16 +116,28 @@ class Patient(db.Model):
     # serialize_rules
     serialize_rules = ('-user.patients', '-hospital.patients', '-department.patients',)
 
+    # queries
+    @classmethod
+    def with_relations(cls, only=None):
+        query = cls.query
+        for relation in ('hospital', 'department'):
+            if only is None or relation in only:
+                query = query.options(joinedload(getattr(cls, relation)))
+        return query
+
+    @classmethod
+    def query_for_user(cls, user_id, only=None, **filters):
+        return cls.with_relations(only).filter_by(user_id=user_id, **filters).order_by(cls.id)
+
     # validations
+    unique_name_error = 'This patient name is already in use.'
+
     @validates('name')
     def validate_name(self, key, name):
         if not name:
             raise ValueError('Patient name cannot be empty.')
 
-        existing_patient = Patient.query.filter_by(name=name).first()
-        if existing_patient and existing_patient.id != self.id:
-            raise ValueError('This patient name is already in use.')
-
+        check_unique_name(self, name)
         return name
 
     @validates('date_of_birth')
@@ -117,7 +169,10 @@ class Hospital(db.Model):
 
     # relationships
     patients = db.relationship(
-        'Patient', back_populates='hospital', cascade='all, delete-orphan'
+        'Patient', back_populates='hospital', cascade='all, delete-orphan', passive_deletes=True
+    )
+    shifts = db.relationship(
+        'Shift', back_populates='hospital', cascade='all, delete-orphan', passive_deletes=True
     )
     users = association_proxy(
         'patients', 'user', creator=lambda user_obj: Patient(user=user_obj)
@@ -130,15 +185,14 @@ class Hospital(db.Model):
     serialize_rules = ('-patients.hospital',)
 
     # validations
+    unique_name_error = 'This hospital name is already in use.'
+
     @validates('name')
     def validate_name(self, key, name):
         if not name:
             raise ValueError('Invalid hospital name.')
 
-        existing_hospital = Hospital.query.filter_by(name=name).first()
-        if existing_hospital and existing_hospital.id != self.id:
-            raise ValueError('This hospital name is already in use.')
-
+        check_unique_name(self, name)
         return name
 
     @validates('phone_number')
@@ -164,7 +218,10 @@ class Department(db.Model):
 
     # relationships
     patients = db.relationship(
-        'Patient', back_populates='department', cascade='all, delete-orphan'
+        'Patient', back_populates='department', cascade='all, delete-orphan', passive_deletes=True
+    )
+    shifts = db.relationship(
+        'Shift', back_populates='department', cascade='all, delete-orphan', passive_deletes=True
     )
     users = association_proxy(
         'patients', 'user', creator=lambda user_obj: Patient(user=user_obj)
@@ -177,16 +234,552 @@ class Department(db.Model):
     serialize_rules = ('-patients.department',)
 
     # validations
+    unique_name_error = 'This department name is already in use.'
+
     @validates('name')
     def validate_name(self, key, name):
         if not name:
             raise ValueError('Invalid department name.')
 
-        existing_department = Department.query.filter_by(name=name).first()
-        if existing_department and existing_department.id != self.id:
-            raise ValueError('This department name is already in use.')
-
+        check_unique_name(self, name)
         return name
 
     def __repr__(self):
         return f'<Department of {self.name}>'
+
+
+class Shift(db.Model):
+    __tablename__ = 'shifts'
+    __table_args__ = (
+        db.Index('ix_shifts_starts_at', 'starts_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    hospital_id = db.Column(db.Integer, db.ForeignKey('hospitals.id', ondelete='CASCADE'), nullable=False)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id', ondelete='CASCADE'), nullable=False)
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False)
+    # Overrides the census-based demand when set.
+    required_nurses = db.Column(db.Integer)
+
+    # relationships
+    hospital = db.relationship('Hospital', back_populates='shifts')
+    department = db.relationship('Department', back_populates='shifts')
+    assignments = db.relationship(
+        'Assignment', back_populates='shift', cascade='all, delete-orphan', passive_deletes=True
+    )
+
+    # queries
+    @classmethod
+    def between(cls, starts_at, ends_at, with_nurses=False):
+        query = cls.query.options(joinedload(cls.hospital), joinedload(cls.department))
+        if with_nurses:
+            query = query.options(
+                selectinload(cls.assignments).joinedload(Assignment.user).load_only(User.id, User.name)
+            )
+        return query.filter(cls.starts_at >= starts_at, cls.starts_at < ends_at).order_by(cls.starts_at, cls.id)
+
+    @property
+    def hours(self):
+        return (self.ends_at - self.starts_at).total_seconds() / 3600
+
+    # validations
+    @validates('starts_at', 'ends_at')
+    def validate_times(self, key, value):
+        if not isinstance(value, datetime):
+            raise ValueError(f'Invalid {key} format.')
+
+        starts_at = value if key == 'starts_at' else self.starts_at
+        ends_at = value if key == 'ends_at' else self.ends_at
+        if starts_at and ends_at and ends_at <= starts_at:
+            raise ValueError('A shift must end after it starts.')
+
+        return value
+
+    @validates('required_nurses')
+    def validate_required_nurses(self, key, required_nurses):
+        if required_nurses is not None and required_nurses < 0:
+            raise ValueError('Required nurses must be zero or more.')
+        return required_nurses
+
+    def __repr__(self):
+        return f'<Shift: {self.hospital_id}/{self.department_id}, {self.starts_at} - {self.ends_at}>'
+
+
+class Assignment(db.Model):
+    __tablename__ = 'assignments'
+    __table_args__ = (
+        db.UniqueConstraint('shift_id', 'user_id', name='uq_assignments_shift_id_user_id'),
+        db.Index('ix_assignments_user_id', 'user_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    shift_id = db.Column(db.Integer, db.ForeignKey('shifts.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    # relationships
+    shift = db.relationship('Shift', back_populates='assignments')
+    user = db.relationship('User', back_populates='assignments')
+
+    def __repr__(self):
+        return f'<Assignment: shift {self.shift_id}, user {self.user_id}>'
+
+
+class Availability(db.Model):
+    __tablename__ = 'availabilities'
+    __table_args__ = (
+        db.Index('ix_availabilities_user_id_starts_at', 'user_id', 'starts_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False)
+
+    # relationships
+    user = db.relationship('User', back_populates='availabilities')
+
+    # validations
+    @validates('starts_at', 'ends_at')
+    def validate_times(self, key, value):
+        if not isinstance(value, datetime):
+            raise ValueError(f'Invalid {key} format.')
+
+        starts_at = value if key == 'starts_at' else self.starts_at
+        ends_at = value if key == 'ends_at' else self.ends_at
+        if starts_at and ends_at and ends_at <= starts_at:
+            raise ValueError('Availability must end after it starts.')
+
+        return value
+
+    def __repr__(self):
+        return f'<Availability: user {self.user_id}, {self.starts_at} - {self.ends_at}>'
+
+
+class PendingCensusChange(db.Model):
+    __tablename__ = 'pending_census_changes'
+
+    # One row per hospital/department whose census changed since the last
+    # schedule repair.
+    hospital_id = db.Column(db.Integer, primary_key=True)
+    department_id = db.Column(db.Integer, primary_key=True)
+
+    def __repr__(self):
+        return f'<PendingCensusChange: {self.hospital_id}/{self.department_id}>'
+
+
+class CensusCount(db.Model):
+    __tablename__ = 'census_counts'
+
+    # Zero in a key column means "any": (h, 0, 0) counts a hospital's patients,
+    # (0, d, 0) a department's, (h, d, 0) a department within a hospital and
+    # (0, 0, u) a nurse's caseload. Kept in step by record_changed_census.
+    hospital_id = db.Column(db.Integer, primary_key=True, default=0)
+    department_id = db.Column(db.Integer, primary_key=True, default=0)
+    user_id = db.Column(db.Integer, primary_key=True, default=0)
+    patient_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CensusCount {self.hospital_id}/{self.department_id}/{self.user_id}: {self.patient_count}>'
+
+
+class Change(db.Model):
+    __tablename__ = 'changes'
+    __table_args__ = (
+        db.UniqueConstraint('table_name', 'row_id', 'user_id', name='uq_changes_table_name_row_id_user_id'),
+        # Ids are the change feed's versions, so they must never be reused.
+        {'sqlite_autoincrement': True},
+    )
+
+    # Only the latest change per row and audience is kept. user_id 0 means
+    # everyone (hospitals and departments); otherwise it is the nurse whose
+    # caseload the patient is in, or has just left.
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String, nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False, default=0)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<Change {self.id}: {self.table_name} {self.row_id} {"deleted" if self.deleted else "upserted"}>'
+
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_versions'
+
+    name = db.Column(db.String, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def current(cls, name):
+        return db.session.execute(select(cls.version).where(cls.name == name)).scalar() or 0
+
+    @classmethod
+    def current_many(cls, names):
+        versions = dict(db.session.execute(select(cls.name, cls.version).where(cls.name.in_(names))).all())
+        return [versions.get(name, 0) for name in names]
+
+    def __repr__(self):
+        return f'<TableVersion {self.name}: {self.version}>'
+
+
+def check_unique_name(instance, name):
+    # In deferred mode the check runs once per flush in check_deferred_unique_names.
+    if db.session.info.get(DEFER_UNIQUE_CHECKS):
+        return
+    existing = type(instance).query.filter_by(name=name).first()
+    if existing and existing.id != instance.id:
+        raise ValueError(instance.unique_name_error)
+
+
+def existing_names(session, model, names):
+    names = list(names)
+    # One cached statement for every chunk, run as plain Core rows.
+    query = select(model.name, model.id).where(model.name.in_(bindparam('names', expanding=True)))
+    connection = session.connection()
+    taken = {}
+    for start in range(0, len(names), UNIQUE_CHECK_CHUNK_SIZE):
+        taken.update(connection.execute(query, {'names': names[start:start + UNIQUE_CHECK_CHUNK_SIZE]}).all())
+    return taken
+
+
+UNIQUE_NAME_MODELS = {model.__tablename__: model for model in (User, Patient, Hospital, Department)}
+
+
+@event.listens_for(Session, 'before_flush')
+def check_deferred_unique_names(session, flush_context, instances):
+    if not session.info.get(DEFER_UNIQUE_CHECKS):
+        return
+    pending = {}
+    for obj in session.new | session.dirty:
+        if type(obj) not in UNIQUE_NAME_MODELS.values():
+            continue
+        if obj in session.new or inspect(obj).attrs.name.history.has_changes():
+            pending.setdefault(type(obj), []).append(obj)
+    with session.no_autoflush:
+        for model, objs in pending.items():
+            names = Counter(obj.name for obj in objs)
+            if any(count > 1 for count in names.values()):
+                raise ValueError(model.unique_name_error)
+            taken = existing_names(session, model, names)
+            if any(obj.name in taken and taken[obj.name] != obj.id for obj in objs):
+                raise ValueError(model.unique_name_error)
+
+
+def unique_violation_message(error):
+    # SQLite reports e.g. "UNIQUE constraint failed: patients.name".
+    for tablename, model in UNIQUE_NAME_MODELS.items():
+        if f'{tablename}.name' in str(error.orig):
+            return model.unique_name_error
+    return None
+
+
+@contextmanager
+def deferred_unique_checks(session=None):
+    """Check name uniqueness once per flush instead of on every assignment.
+
+    A name taken between the check and the insert still fails the unique
+    index; its IntegrityError is raised as the model's ValueError.
+    """
+    session = session or db.session
+    deferred = session.info.get(DEFER_UNIQUE_CHECKS)
+    session.info[DEFER_UNIQUE_CHECKS] = True
+    try:
+        yield session
+    except IntegrityError as error:
+        session.rollback()
+        message = unique_violation_message(error)
+        if message is None:
+            raise
+        raise ValueError(message) from error
+    finally:
+        if not deferred:
+            session.info.pop(DEFER_UNIQUE_CHECKS, None)
+
+
+VERSIONED_MODELS = (Hospital, Department)
+
+# Bumped by set-based writes that touch many nurses' patients at once.
+ALL_PATIENTS_VERSION = 'patients'
+
+
+def patient_version_name(user_id):
+    return f'patients:user:{user_id}'
+
+
+# Changes up to this version may have been compacted away.
+CHANGES_FLOOR_VERSION = 'changes:floor'
+
+
+def set_version(connection, name, version):
+    table = TableVersion.__table__
+    updated = connection.execute(table.update().where(table.c.name == name).values(version=version)).rowcount
+    if not updated:
+        connection.execute(table.insert().values(name=name, version=version))
+
+
+def bump_versions(connection, *names):
+    table = TableVersion.__table__
+    for name in names:
+        updated = connection.execute(
+            table.update().where(table.c.name == name).values(version=table.c.version + 1)
+        ).rowcount
+        if not updated:
+            connection.execute(table.insert().values(name=name, version=1))
+
+
+def changed_version_names(session):
+    names = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, VERSIONED_MODELS):
+            names.add(obj.__tablename__)
+        elif isinstance(obj, Patient):
+            # A patient moved between nurses invalidates both caseloads.
+            state = inspect(obj)
+            for user_id in chain([state.dict.get('user_id')], state.attrs.user_id.history.deleted or ()):
+                if user_id is not None:
+                    names.add(patient_version_name(user_id))
+    return names
+
+
+@event.listens_for(Session, 'after_flush')
+def bump_versioned_tables(session, flush_context):
+    names = changed_version_names(session)
+    if names:
+        bump_versions(session.connection(), *sorted(names))
+
+
+def census_keys(hospital_id, department_id, user_id):
+    keys = []
+    if hospital_id is not None:
+        keys.append((hospital_id, 0, 0))
+    if department_id is not None:
+        keys.append((0, department_id, 0))
+    if hospital_id is not None and department_id is not None:
+        keys.append((hospital_id, department_id, 0))
+    if user_id is not None:
+        keys.append((0, 0, user_id))
+    return keys
+
+
+def adjust_census(connection, deltas):
+    rows = [
+        {'key_hospital_id': hospital_id, 'key_department_id': department_id, 'key_user_id': user_id, 'delta': delta}
+        for (hospital_id, department_id, user_id), delta in sorted(deltas.items()) if delta
+    ]
+    if not rows:
+        return
+
+    table = CensusCount.__table__
+    updated = connection.execute(
+        table.update()
+        .where(
+            table.c.hospital_id == bindparam('key_hospital_id'),
+            table.c.department_id == bindparam('key_department_id'),
+            table.c.user_id == bindparam('key_user_id'),
+        )
+        .values(patient_count=table.c.patient_count + bindparam('delta')),
+        rows,
+    ).rowcount
+    if updated == len(rows):
+        return
+
+    keys = [(row['key_hospital_id'], row['key_department_id'], row['key_user_id']) for row in rows]
+    existing = set(connection.execute(
+        select(table.c.hospital_id, table.c.department_id, table.c.user_id)
+        .where(tuple_(table.c.hospital_id, table.c.department_id, table.c.user_id).in_(keys))
+    ).all())
+    connection.execute(table.insert(), [
+        {'hospital_id': hospital_id, 'department_id': department_id, 'user_id': user_id, 'patient_count': row['delta']}
+        for (hospital_id, department_id, user_id), row in zip(keys, rows)
+        if (hospital_id, department_id, user_id) not in existing
+    ])
+
+
+def rebuild_census(connection):
+    table, patients = CensusCount.__table__, Patient.__table__
+    connection.execute(table.delete())
+
+    hospital, department, user = patients.c.hospital_id, patients.c.department_id, patients.c.user_id
+    for keys in ((hospital, None, None), (None, department, None), (hospital, department, None), (None, None, user)):
+        grouped = [key for key in keys if key is not None]
+        connection.execute(table.insert().from_select(
+            ['hospital_id', 'department_id', 'user_id', 'patient_count'],
+            select(*[literal(0) if key is None else key for key in keys], func.count())
+            .where(*[key.is_not(None) for key in grouped])
+            .group_by(*grouped),
+        ))
+
+
+def record_census_changes(connection, cells):
+    cells = {cell for cell in cells if None not in cell}
+    if not cells:
+        return
+
+    table = PendingCensusChange.__table__
+    pending = set(connection.execute(
+        select(table.c.hospital_id, table.c.department_id)
+        .where(tuple_(table.c.hospital_id, table.c.department_id).in_(cells))
+    ).all())
+    missing = cells - pending
+    if missing:
+        connection.execute(table.insert(), [
+            {'hospital_id': hospital_id, 'department_id': department_id}
+            for hospital_id, department_id in sorted(missing)
+        ])
+
+
+PLACEMENT_COLUMNS = ('hospital_id', 'department_id', 'user_id')
+
+
+def changed_placements(session):
+    """Yield ``(before, after)`` placements for patients changed in this flush.
+
+    A placement is a ``(hospital_id, department_id, user_id)`` tuple; ``before``
+    is None for a new patient and ``after`` is None for a deleted one.
+    """
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, Patient):
+            continue
+        state = inspect(obj)
+        current = tuple(state.dict.get(column) for column in PLACEMENT_COLUMNS)
+        previous = tuple(
+            (state.attrs[column].history.deleted or [value])[0]
+            for column, value in zip(PLACEMENT_COLUMNS, current)
+        )
+        if obj in session.new:
+            yield None, current
+        elif obj in session.deleted:
+            yield previous, None
+        elif previous != current:
+            yield previous, current
+
+
+def changed_census_cells(session):
+    cells = set()
+    for before, after in changed_placements(session):
+        if before and after and before[:2] == after[:2]:
+            continue
+        # A move changes the census of both the old and the new department.
+        for placement in (before, after):
+            if placement:
+                cells.add(placement[:2])
+    return cells
+
+
+@event.listens_for(Session, 'after_flush')
+def record_changed_census(session, flush_context):
+    cells = changed_census_cells(session)
+    if cells:
+        record_census_changes(session.connection(), cells)
+
+    deltas = Counter()
+    for before, after in changed_placements(session):
+        if before:
+            deltas.subtract(census_keys(*before))
+        if after:
+            deltas.update(census_keys(*after))
+    adjust_census(session.connection(), deltas)
+
+
+CHANGE_CHUNK_SIZE = 1000
+ID_LIST_CHUNK_SIZE = 1000
+
+
+def id_list(ids):
+    """SELECT ``ids`` from one JSON array parameter (SQLite's json_each)
+    rather than binding a parameter per id, for id lists in the thousands."""
+    return select(func.json_each(json.dumps(list(ids))).table_valued('value').c.value)
+
+
+def ids_in(connection, column, ids):
+    """Yield conditions that together match ``column`` to ``ids``: one
+    ``id_list`` on SQLite, else one expanding IN per ID_LIST_CHUNK_SIZE ids."""
+    ids = list(ids)
+    if connection.dialect.name == 'sqlite':
+        yield column.in_(id_list(ids))
+        return
+    for start in range(0, len(ids), ID_LIST_CHUNK_SIZE):
+        yield column.in_(ids[start:start + ID_LIST_CHUNK_SIZE])
+
+
+def record_changes(connection, changes):
+    """Append ``(table_name, row_id, user_id, deleted)`` changes to the change
+    feed, replacing any earlier change for the same row and user."""
+    latest = {}
+    for table_name, row_id, user_id, deleted in changes:
+        latest[(table_name, row_id, user_id)] = deleted
+    if not latest:
+        return
+
+    table = Change.__table__
+    changed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    if connection.dialect.name == 'sqlite':
+        # One statement per table, audience and kind. REPLACE deletes a row's
+        # earlier change through the unique constraint as it inserts, and the
+        # new row still takes the next id.
+        groups = defaultdict(list)
+        for (table_name, row_id, user_id), deleted in latest.items():
+            groups[table_name, user_id, deleted].append(row_id)
+        for (table_name, user_id, deleted), row_ids in groups.items():
+            row_id = id_list(row_ids).subquery().c.value
+            connection.execute(table.insert().prefix_with('OR REPLACE').from_select(
+                ['table_name', 'row_id', 'user_id', 'deleted', 'changed_at'],
+                select(literal(table_name), row_id, literal(user_id), literal(deleted), literal(changed_at, DateTime)),
+            ))
+        return
+
+    keys = list(latest)
+    for start in range(0, len(keys), CHANGE_CHUNK_SIZE):
+        chunk = keys[start:start + CHANGE_CHUNK_SIZE]
+        connection.execute(table.delete().where(tuple_(table.c.table_name, table.c.row_id, table.c.user_id).in_(chunk)))
+        connection.execute(table.insert(), [
+            {'table_name': table_name, 'row_id': row_id, 'user_id': user_id,
+             'deleted': latest[(table_name, row_id, user_id)], 'changed_at': changed_at}
+            for table_name, row_id, user_id in chunk
+        ])
+
+
+def changed_rows(session):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+
+        if isinstance(obj, VERSIONED_MODELS):
+            yield obj.__tablename__, obj.id, 0, obj in session.deleted
+        elif isinstance(obj, Patient):
+            state = inspect(obj)
+            user_id = state.dict.get('user_id')
+            previous = (state.attrs.user_id.history.deleted or [user_id])[0]
+            # A patient moved to another nurse is deleted from the old caseload.
+            if previous is not None and (obj in session.deleted or previous != user_id):
+                yield Patient.__tablename__, obj.id, previous, True
+            if user_id is not None and obj not in session.deleted:
+                yield Patient.__tablename__, obj.id, user_id, False
+
+
+@event.listens_for(Session, 'after_flush')
+def record_changed_rows(session, flush_context):
+    changes = list(changed_rows(session))
+    record_changes(session.connection(), changes)
+    queue_events(session, changes)
+
+
+def queue_events(session, changes):
+    """Publish ``changes`` to the event streams once ``session`` commits."""
+    session.info.setdefault('unpublished_changes', []).extend(changes)
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_changes(session):
+    changes = session.info.pop('unpublished_changes', None)
+    if changes:
+        broker.publish(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_changes(session):
+    session.info.pop('unpublished_changes', None)
@@ -0,0 +1,497 @@
+# Standard library imports
+import heapq
+import math
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta, timezone
+
+# Remote library imports
+import click
+from sqlalchemy import delete, insert, select, tuple_
+
+# Local imports
+from config import app, db
+from models import Assignment, Availability, CensusCount, Patient, PendingCensusChange, Shift, User
+
+
+# A shift as the solver sees it; ``cell`` is its (hospital_id, department_id).
+ShiftDemand = namedtuple("ShiftDemand", ["id", "cell", "starts_at", "ends_at", "hours", "demand"])
+# ``windows`` is empty when the nurse has not recorded any availability for the
+# week, which means they can work any shift. ``cells`` are the (hospital_id,
+# department_id) pairs the nurse has patients in.
+Nurse = namedtuple("Nurse", ["id", "max_hours", "windows", "cells"])
+Schedule = namedtuple("Schedule", ["assignments", "unfilled", "cost"])
+Repair = namedtuple("Repair", ["added", "removed", "unfilled", "cost"])
+
+INFINITY = float("inf")
+
+
+# --------------------
+# Min-cost Flow
+# --------------------
+
+class MinCostFlow:
+    """Min-cost max-flow by the primal-dual method.
+
+    Each round runs Dijkstra on reduced costs (Johnson potentials), then pushes
+    blocking flows over the edges whose reduced cost is zero, so one shortest
+    path search serves every augmenting path of the same cost. Costs must be
+    non-negative integers; with the small costs used here there are only a
+    handful of rounds per solve.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.adjacent = [[] for _ in range(size)]
+        self.head = []
+        self.capacity = []
+        self.cost = []
+
+    def add_edge(self, tail, head, capacity, cost):
+        # Edges are stored in pairs, so ``edge ^ 1`` is always the reverse edge.
+        edge = len(self.head)
+        self.adjacent[tail].append(edge)
+        self.head.append(head)
+        self.capacity.append(capacity)
+        self.cost.append(cost)
+        self.adjacent[head].append(edge + 1)
+        self.head.append(tail)
+        self.capacity.append(0)
+        self.cost.append(-cost)
+        return edge
+
+    def flow(self, edge):
+        return self.capacity[edge ^ 1]
+
+    def solve(self, source, sink):
+        self.potential = [0] * self.size
+        total_flow = total_cost = 0
+        while self._shortest_paths(source, sink):
+            while True:
+                pushed = self._blocking_flow(source, sink)
+                if not pushed:
+                    break
+                total_flow += pushed
+                total_cost += pushed * (self.potential[sink] - self.potential[source])
+        return total_flow, total_cost
+
+    def _shortest_paths(self, source, sink):
+        head, capacity, cost, adjacent, potential = self.head, self.capacity, self.cost, self.adjacent, self.potential
+        distance = [INFINITY] * self.size
+        distance[source] = 0
+        queue = [(0, source)]
+        while queue:
+            reached, node = heapq.heappop(queue)
+            if reached > distance[node]:
+                continue
+            base = reached + potential[node]
+            for edge in adjacent[node]:
+                if capacity[edge]:
+                    target = head[edge]
+                    candidate = base + cost[edge] - potential[target]
+                    if candidate < distance[target]:
+                        distance[target] = candidate
+                        heapq.heappush(queue, (candidate, target))
+
+        if distance[sink] == INFINITY:
+            return False
+        # Nodes that are unreachable now stay unreachable: flow only ever
+        # opens reverse edges between nodes on an augmenting path.
+        for node in range(self.size):
+            if distance[node] < INFINITY:
+                potential[node] += distance[node]
+        return True
+
+    def _blocking_flow(self, source, sink):
+        head, capacity, cost, adjacent, potential = self.head, self.capacity, self.cost, self.adjacent, self.potential
+
+        # Dinic levels over the admissible (zero reduced cost) residual edges.
+        level = [-1] * self.size
+        level[source] = 0
+        frontier = [source]
+        while frontier and level[sink] < 0:
+            following = []
+            for node in frontier:
+                for edge in adjacent[node]:
+                    target = head[edge]
+                    if level[target] < 0 and capacity[edge] and cost[edge] + potential[node] == potential[target]:
+                        level[target] = level[node] + 1
+                        following.append(target)
+            frontier = following
+        if level[sink] < 0:
+            return 0
+
+        position = [0] * self.size
+
+        def push(node, limit):
+            if node == sink:
+                return limit
+            edges = adjacent[node]
+            while position[node] < len(edges):
+                edge = edges[position[node]]
+                target = head[edge]
+                if (capacity[edge] and level[target] == level[node] + 1
+                        and cost[edge] + potential[node] == potential[target]):
+                    pushed = push(target, min(limit, capacity[edge]))
+                    if pushed:
+                        capacity[edge] -= pushed
+                        capacity[edge ^ 1] += pushed
+                        return pushed
+                position[node] += 1
+            return 0
+
+        total = 0
+        while True:
+            pushed = push(source, INFINITY)
+            if not pushed:
+                return total
+            total += pushed
+
+
+# --------------------
+# Solver
+# --------------------
+
+def waves(shifts):
+    """Split shifts, in start order, into runs that all overlap one another.
+
+    Every shift in a wave starts before the earliest end in that wave, so a
+    nurse can work at most one shift per wave.
+    """
+    wave, earliest_end = [], None
+    for shift in sorted(shifts, key=lambda shift: (shift.starts_at, shift.id)):
+        if wave and shift.starts_at >= earliest_end:
+            yield wave
+            wave = []
+        earliest_end = shift.ends_at if not wave else min(earliest_end, shift.ends_at)
+        wave.append(shift)
+    if wave:
+        yield wave
+
+
+def available(nurse, starts_at, ends_at):
+    if not nurse.windows:
+        return True
+    return any(opens <= starts_at and ends_at <= closes for opens, closes in nurse.windows)
+
+
+def overlaps(bookings, starts_at, ends_at):
+    return any(booked_from < ends_at and starts_at < booked_until for booked_from, booked_until in bookings)
+
+
+def nurse_classes(wave, nurses, hours_worked, booked):
+    """Group the nurses who can take a shift in ``wave`` by what they cost.
+
+    Nurses with the same hours so far, the same eligible shifts and the same
+    familiar shifts are interchangeable, so the flow network gets one node per
+    class instead of one per nurse.
+    """
+    wanted = tuple(index for index, shift in enumerate(wave) if shift.demand)
+    first_start = min(wave[index].starts_at for index in wanted)
+    last_end = max(wave[index].ends_at for index in wanted)
+    shortest = min(wave[index].hours for index in wanted)
+    longest = max(wave[index].hours for index in wanted)
+    cells = {wave[index].cell for index in wanted}
+
+    # Shifts in a wave mostly share their times, and only times decide eligibility.
+    timings = defaultdict(list)
+    for index in wanted:
+        timings[wave[index].starts_at, wave[index].ends_at, wave[index].hours].append(index)
+
+    classes = defaultdict(list)
+    for nurse in nurses:
+        worked = hours_worked[nurse.id]
+        if worked + shortest > nurse.max_hours:
+            continue
+        bookings = booked.get(nurse.id, ())
+
+        if not nurse.windows and worked + longest <= nurse.max_hours and not overlaps(bookings, first_start, last_end):
+            eligible = wanted
+        else:
+            eligible = tuple(
+                index
+                for (starts_at, ends_at, hours), indexes in timings.items()
+                if worked + hours <= nurse.max_hours
+                and not overlaps(bookings, starts_at, ends_at)
+                and available(nurse, starts_at, ends_at)
+                for index in indexes
+            )
+            if not eligible:
+                continue
+
+        familiar = ()
+        if not nurse.cells.isdisjoint(cells):
+            familiar = tuple(index for index in eligible if wave[index].cell in nurse.cells)
+        classes[(round(worked), eligible, familiar)].append(nurse.id)
+    return classes
+
+
+def solve_wave(wave, nurses, hours_worked, booked, float_penalty):
+    """Fill one wave at minimum cost, covering as much demand as possible.
+
+    Assigning a nurse costs the hours they already work this week, which
+    spreads the load, plus ``float_penalty`` when they have no patients in the
+    shift's hospital and department.
+    """
+    placed = [[] for _ in wave]
+    demand = sum(shift.demand for shift in wave)
+    if not demand:
+        return placed, 0
+
+    classes = list(nurse_classes(wave, nurses, hours_worked, booked).items())
+    source, sink, first_class = 0, 1, 2 + len(wave)
+    graph = MinCostFlow(first_class + len(classes))
+
+    options = [[] for _ in wave]
+    for number, ((worked, eligible, familiar), members) in enumerate(classes):
+        node = first_class + number
+        graph.add_edge(node, sink, len(members), 0)
+        familiar = set(familiar)
+        at_home = (worked, node, len(members))
+        floating = (worked + float_penalty, node, len(members))
+        for index in eligible:
+            options[index].append(at_home if index in familiar else floating)
+
+    # Only the cheapest classes holding ``demand`` nurses can matter to a
+    # shift: with fewer than ``demand`` nurses placed in the whole wave, one
+    # of them always has a spare nurse at least as cheap as anything further down.
+    edges = []
+    for index, shift in enumerate(wave):
+        if not shift.demand:
+            continue
+        graph.add_edge(source, 2 + index, shift.demand, 0)
+        covered = 0
+        for cost, node, size in sorted(options[index]):
+            if covered >= demand:
+                break
+            edges.append((index, node, graph.add_edge(2 + index, node, size, cost)))
+            covered += size
+
+    _, cost = graph.solve(source, sink)
+
+    members = {first_class + number: iter(nurse_ids) for number, (_, nurse_ids) in enumerate(classes)}
+    for index, node, edge in edges:
+        for _ in range(graph.flow(edge)):
+            placed[index].append(next(members[node]))
+    return placed, cost
+
+
+def solve(shifts, nurses, float_penalty, hours_worked=None, booked=None):
+    """Assign ``nurses`` to ``shifts``, one wave of overlapping shifts at a time.
+
+    Each wave is solved exactly as a min-cost max-flow problem; waves are solved
+    in start order and the hours they assign carry into the next one.
+    ``hours_worked`` and ``booked`` (nurse id to ``(starts_at, ends_at)`` pairs)
+    seed that state with shifts the nurses already work.
+    """
+    hours_worked = defaultdict(float, hours_worked or {})
+    booked = defaultdict(list, {nurse_id: list(bookings) for nurse_id, bookings in (booked or {}).items()})
+    assignments, unfilled, total_cost = [], {}, 0
+
+    for wave in waves(shifts):
+        placed, cost = solve_wave(wave, nurses, hours_worked, booked, float_penalty)
+        total_cost += cost
+        for shift, nurse_ids in zip(wave, placed):
+            for nurse_id in nurse_ids:
+                assignments.append((shift.id, nurse_id))
+                hours_worked[nurse_id] += shift.hours
+                booked[nurse_id].append((shift.starts_at, shift.ends_at))
+            if len(nurse_ids) < shift.demand:
+                unfilled[shift.id] = shift.demand - len(nurse_ids)
+
+    return Schedule(assignments, unfilled, total_cost)
+
+
+def repair(shifts, assignments, changed, nurses, float_penalty):
+    """Adjust an existing week of ``assignments`` to new demand on ``changed`` shifts.
+
+    ``shifts`` are all the week's shifts; only the demand of the ``changed``
+    ones is used. Over-staffed shifts release their most expensive nurses,
+    floats and then the busiest. Short-staffed shifts are filled by the solver,
+    warm-started with every other assignment in the week. Nothing outside
+    ``changed`` moves, so the result can cost a little more than a full solve.
+    """
+    by_id = {shift.id: shift for shift in shifts}
+    cells = {nurse.id: nurse.cells for nurse in nurses}
+    hours_worked = defaultdict(float)
+    booked = defaultdict(list)
+    staffed = defaultdict(list)
+    for shift_id, nurse_id in assignments:
+        shift = by_id[shift_id]
+        hours_worked[nurse_id] += shift.hours
+        booked[nurse_id].append((shift.starts_at, shift.ends_at))
+        staffed[shift_id].append(nurse_id)
+
+    removed, short = [], []
+    for shift_id in sorted(changed):
+        shift = by_id[shift_id]
+        nurse_ids = staffed[shift_id]
+        extra = len(nurse_ids) - shift.demand
+        if extra < 0:
+            short.append(shift._replace(demand=-extra))
+            continue
+
+        nurse_ids.sort(key=lambda nurse_id: (shift.cell in cells.get(nurse_id, ()), -hours_worked[nurse_id], nurse_id))
+        for nurse_id in nurse_ids[:extra]:
+            removed.append((shift_id, nurse_id))
+            hours_worked[nurse_id] -= shift.hours
+            booked[nurse_id].remove((shift.starts_at, shift.ends_at))
+
+    schedule = solve(short, nurses, float_penalty, hours_worked, booked)
+    return Repair(schedule.assignments, removed, schedule.unfilled, schedule.cost)
+
+
+# --------------------
+# Loading and Saving
+# --------------------
+
+def current_time():
+    # Shift times are stored naive, in UTC.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def week_bounds(day):
+    monday = day - timedelta(days=day.weekday())
+    starts_at = datetime.combine(monday, time.min)
+    return starts_at, starts_at + timedelta(days=7)
+
+
+def in_cells(hospital_id, department_id, cells):
+    return tuple_(hospital_id, department_id).in_(sorted(cells))
+
+
+def census_by_cell(cells=None):
+    query = (
+        select(CensusCount.hospital_id, CensusCount.department_id, CensusCount.patient_count)
+        .where(CensusCount.hospital_id > 0, CensusCount.department_id > 0, CensusCount.user_id == 0)
+    )
+    if cells is not None:
+        query = query.where(in_cells(CensusCount.hospital_id, CensusCount.department_id, cells))
+    return {(hospital_id, department_id): count for hospital_id, department_id, count in db.session.execute(query)}
+
+
+def load_shifts(starts_at, ends_at, patients_per_nurse, census=None):
+    if census is None:
+        census = census_by_cell()
+    rows = db.session.execute(
+        select(Shift.id, Shift.hospital_id, Shift.department_id, Shift.starts_at, Shift.ends_at, Shift.required_nurses)
+        .where(Shift.starts_at >= starts_at, Shift.starts_at < ends_at)
+    )
+
+    shifts = []
+    for id, hospital_id, department_id, shift_starts_at, shift_ends_at, required_nurses in rows:
+        cell = (hospital_id, department_id)
+        demand = required_nurses
+        if demand is None:
+            demand = math.ceil(census.get(cell, 0) / patients_per_nurse)
+        hours = (shift_ends_at - shift_starts_at).total_seconds() / 3600
+        shifts.append(ShiftDemand(id, cell, shift_starts_at, shift_ends_at, hours, demand))
+    return shifts
+
+
+def load_nurses(starts_at, ends_at, cells=None):
+    windows = defaultdict(list)
+    for user_id, window_starts_at, window_ends_at in db.session.execute(
+        select(Availability.user_id, Availability.starts_at, Availability.ends_at)
+        .where(Availability.ends_at > starts_at, Availability.starts_at < ends_at)
+    ):
+        windows[user_id].append((window_starts_at, window_ends_at))
+
+    # Familiarity only matters for the cells being scheduled.
+    query = select(Patient.user_id, Patient.hospital_id, Patient.department_id).where(Patient.user_id.is_not(None))
+    if cells is not None:
+        query = query.where(in_cells(Patient.hospital_id, Patient.department_id, cells))
+
+    familiar = defaultdict(set)
+    for user_id, hospital_id, department_id in db.session.execute(query.distinct()):
+        familiar[user_id].add((hospital_id, department_id))
+
+    return [
+        Nurse(id, max_hours, tuple(windows.get(id, ())), frozenset(familiar.get(id, ())))
+        for id, max_hours in db.session.execute(select(User.id, User.max_weekly_hours).order_by(User.id))
+    ]
+
+
+def schedule_week(day, patients_per_nurse, float_penalty):
+    """Replace the assignments for the week containing ``day``.
+
+    The caller commits. Returns the week's shifts and the new schedule.
+    """
+    starts_at, ends_at = week_bounds(day)
+    shifts = load_shifts(starts_at, ends_at, patients_per_nurse)
+    schedule = solve(shifts, load_nurses(starts_at, ends_at), float_penalty)
+
+    week_shift_ids = select(Shift.id).where(Shift.starts_at >= starts_at, Shift.starts_at < ends_at)
+    db.session.execute(delete(Assignment).where(Assignment.shift_id.in_(week_shift_ids)))
+    if schedule.assignments:
+        db.session.execute(insert(Assignment.__table__), [
+            {"shift_id": shift_id, "user_id": user_id} for shift_id, user_id in schedule.assignments
+        ])
+    return shifts, schedule
+
+
+def repair_schedules(now, patients_per_nurse, float_penalty):
+    """Consume pending census changes and repair the shifts they affect.
+
+    Only shifts that start after ``now``, have no fixed ``required_nurses``
+    and are in a hospital/department whose census changed are re-staffed.
+    The caller commits. Returns the changed cells and one Repair per week.
+    """
+    cells = set(db.session.execute(select(PendingCensusChange.hospital_id, PendingCensusChange.department_id)).all())
+    if not cells:
+        return cells, []
+    db.session.execute(delete(PendingCensusChange).where(
+        in_cells(PendingCensusChange.hospital_id, PendingCensusChange.department_id, cells)
+    ))
+
+    changed = db.session.execute(
+        select(Shift.id, Shift.starts_at)
+        .where(in_cells(Shift.hospital_id, Shift.department_id, cells))
+        .where(Shift.starts_at >= now, Shift.required_nurses.is_(None))
+    ).all()
+    weeks = defaultdict(set)
+    for shift_id, starts_at in changed:
+        weeks[week_bounds(starts_at.date())].add(shift_id)
+
+    # Only the changed shifts' demand is read, so only their cells' census is needed.
+    census = census_by_cell(cells)
+    repairs = []
+    for (starts_at, ends_at), shift_ids in sorted(weeks.items()):
+        shifts = load_shifts(starts_at, ends_at, patients_per_nurse, census)
+        assignments = db.session.execute(
+            select(Assignment.shift_id, Assignment.user_id)
+            .join(Shift)
+            .where(Shift.starts_at >= starts_at, Shift.starts_at < ends_at)
+        ).all()
+        result = repair(shifts, assignments, shift_ids, load_nurses(starts_at, ends_at, cells), float_penalty)
+
+        if result.removed:
+            db.session.execute(delete(Assignment).where(
+                tuple_(Assignment.shift_id, Assignment.user_id).in_(result.removed)
+            ))
+        if result.added:
+            db.session.execute(insert(Assignment.__table__), [
+                {"shift_id": shift_id, "user_id": user_id} for shift_id, user_id in result.added
+            ])
+        repairs.append(result)
+    return cells, repairs
+
+
+def repair_summary(cells, repairs):
+    return {
+        "cells": len(cells),
+        "weeks": len(repairs),
+        "added": sum(len(result.added) for result in repairs),
+        "removed": sum(len(result.removed) for result in repairs),
+        "unfilled": sum(sum(result.unfilled.values()) for result in repairs),
+    }
+
+
+@click.command('repair-schedules')
+def repair_command():
+    """Re-staff upcoming shifts whose department census changed since the last repair."""
+    with app.app_context():
+        cells, repairs = repair_schedules(
+            current_time(), app.config['SCHEDULER_PATIENTS_PER_NURSE'], app.config['SCHEDULER_FLOAT_PENALTY']
+        )
+        db.session.commit()
+    click.echo(', '.join(f'{key}: {value}' for key, value in repair_summary(cells, repairs).items()))
@@ -0,0 +1,144 @@
+# Standard library imports
+import json
+import re
+
+# Remote library imports
+from sqlalchemy import event, text
+
+# Local imports
+from config import db
+
+# Patients, hospitals and departments share one SQLite FTS5 index, kept in
+# sync by triggers, so every write path (ORM, bulk imports, set-based deletes,
+# seeding) updates it. A row's rowid is ``id * 4 + kind``. ``scope`` holds
+# ``u<user_id>`` for a patient and ``all`` for reference data, and searches
+# match it alongside the name, so a nurse only finds their own patients.
+
+SEARCH_INDEX = "search_index"
+# kind: (result type, table, scope expression, columns the index depends on)
+SEARCH_KINDS = {
+    1: ("patient", "patients", "'u' || {row}.user_id", "name, user_id"),
+    2: ("hospital", "hospitals", "'all'", "name"),
+    3: ("department", "departments", "'all'", "name"),
+}
+SEARCH_TABLES = tuple(table for _, table, _, _ in SEARCH_KINDS.values())
+MAX_SEARCH_TERMS = 8
+TERM = re.compile(r"\w+")
+
+
+def search_ddl():
+    # detail=column drops term positions, which prefix queries never use, and
+    # the 1-3 character prefix indexes keep typeahead queries off long term scans.
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_INDEX} USING fts5(name, scope, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3', detail = column)"
+    ]
+    for kind, (_, table, scope, columns) in SEARCH_KINDS.items():
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {SEARCH_INDEX} (rowid, name, scope) VALUES (NEW.id * 4 + {kind}, NEW.name, {scope.format(row='NEW')}); "
+            "END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {columns} ON {table} BEGIN "
+            f"DELETE FROM {SEARCH_INDEX} WHERE rowid = OLD.id * 4 + {kind}; "
+            f"INSERT INTO {SEARCH_INDEX} (rowid, name, scope) VALUES (NEW.id * 4 + {kind}, NEW.name, {scope.format(row='NEW')}); "
+            "END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM {SEARCH_INDEX} WHERE rowid = OLD.id * 4 + {kind}; "
+            "END",
+        ]
+    return statements
+
+
+# The migration creates the index on existing databases; this covers
+# ``db.create_all()``, which only knows the mapped tables.
+@event.listens_for(db.metadata, "after_create")
+def create_search_index(metadata, connection, **kw):
+    create_search_triggers(connection)
+
+
+@event.listens_for(db.metadata, "before_drop")
+def drop_search_index(metadata, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_INDEX}")
+
+
+def optimize_search_index(connection):
+    """Merge the index into one segment, e.g. after a bulk load, so prefix
+    lookups read one doclist instead of one per segment."""
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"INSERT INTO {SEARCH_INDEX} ({SEARCH_INDEX}) VALUES ('optimize')")
+
+
+def drop_search_triggers(connection, *tables):
+    """Stop keeping ``tables`` indexed row by row, for a bulk load that
+    indexes its rows itself with ``index_rows`` and then calls
+    ``create_search_triggers``. SQLite only makes the DROP part of the
+    transaction once it has written something, so that a rollback restores
+    the triggers; call this after the load's first write."""
+    if connection.dialect.name == "sqlite":
+        for table in tables:
+            for action in ("insert", "update", "delete"):
+                connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_search_{action}")
+
+
+def create_search_triggers(connection):
+    """Create the index and whichever of its triggers are missing."""
+    if connection.dialect.name == "sqlite":
+        for statement in search_ddl():
+            connection.exec_driver_sql(statement)
+
+
+def clear_search_index(connection):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DELETE FROM {SEARCH_INDEX}")
+
+
+def index_rows(connection, table, ids=None):
+    """Add the rows of ``table`` to the index with one INSERT ... SELECT:
+    those whose id is in ``ids``, or all of them."""
+    if connection.dialect.name != "sqlite":
+        return
+    kind, scope = next((kind, scope) for kind, (_, name, scope, _) in SEARCH_KINDS.items() if name == table)
+    statement = (
+        f"INSERT INTO {SEARCH_INDEX} (rowid, name, scope) "
+        f"SELECT id * 4 + {kind}, name, {scope.format(row=table)} FROM {table}"
+    )
+    if ids is None:
+        connection.exec_driver_sql(statement)
+    else:
+        # One JSON array parameter rather than one per id.
+        connection.execute(
+            text(f"{statement} WHERE id IN (SELECT value FROM json_each(:ids))"), {"ids": json.dumps(list(ids))}
+        )
+
+
+def match_expression(query, user_id):
+    """Build an FTS5 query matching names with every word of ``query`` as a
+    prefix, or None if it has no words. User input is reduced to quoted
+    words, so it can never inject FTS5 syntax."""
+    terms = TERM.findall(query)[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    names = " AND ".join(f'"{term}"*' for term in terms)
+    return f'name : ({names}) AND scope : ("u{int(user_id)}" OR "all")'
+
+
+def search(user_id, query, limit, offset):
+    """Return one page of ``{"type", "id", "name"}`` results for ``query``,
+    best match first, and whether more follow; ``(None, False)`` if
+    ``query`` has no words."""
+    match = match_expression(query, user_id)
+    if match is None:
+        return None, False
+
+    # bm25 weights: the name counts, the scope filter does not.
+    rows = db.session.execute(text(
+        f"SELECT rowid, name FROM {SEARCH_INDEX} WHERE {SEARCH_INDEX} MATCH :match "
+        f"ORDER BY bm25({SEARCH_INDEX}, 1.0, 0.0), rowid LIMIT :limit OFFSET :offset"
+    ), {"match": match, "limit": limit + 1, "offset": offset}).all()
+
+    results = [
+        {"type": SEARCH_KINDS[rowid % 4][0], "id": rowid // 4, "name": name}
+        for rowid, name in rows[:limit]
+    ]
+    return results, len(rows) > limit
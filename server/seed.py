@@ -1,96 +1,234 @@
 #!/usr/bin/env python3
 
 # Standard library imports
-from random import randint, choice as rc
-from datetime import date
+import math
+import random
+import time
+from datetime import date, datetime, timedelta
 
 # Remote library imports
+import click
 from faker import Faker
+from sqlalchemy import delete, insert
 
 # Local imports
-from app import app
-from models import db, User, Patient, Hospital, Department
-
-if __name__ == '__main__':
+from changes import latest_version
+from config import app, db, bcrypt
+from models import (
+    User, Patient, Hospital, Department, Shift, Assignment, Availability, PendingCensusChange, CensusCount, Change,
+    ALL_PATIENTS_VERSION, CHANGES_FLOOR_VERSION, bump_versions, rebuild_census, set_version
+)
+from scheduler import week_bounds
+from search import (
+    SEARCH_TABLES, clear_search_index, create_search_triggers, drop_search_triggers, index_rows, optimize_search_index
+)
+
+
+DEPARTMENT_NAMES = [
+    'Cardiology', 'Neurology', 'Oncology', 'Emergency Medicine', 'Orthopedics',
+    'Pediatrics', 'Radiology', 'Intensive Care', 'Obstetrics', 'Gastroenterology',
+    'Nephrology', 'Pulmonology', 'Urology', 'Dermatology', 'Psychiatry',
+    'Geriatrics', 'Endocrinology', 'Hematology', 'Infectious Disease', 'Rheumatology',
+]
+HOSPITAL_SUFFIXES = ['General Hospital', 'Medical Center', 'Memorial Hospital', 'Community Hospital']
+SHIFT_STARTS = [7, 15, 23]
+SHIFT_HOURS = 8
+
+
+# --------------------
+# Generators
+# --------------------
+
+def unique_names(make_name, count):
+    names = []
+    seen = set()
+    while len(names) < count:
+        name = make_name()
+        if name in seen:
+            name = f'{name} {len(names) + 1}'
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def name_pool(make_name, size, max_attempts):
+    pool = set()
+    for _ in range(max_attempts):
+        if len(pool) >= size:
+            break
+        pool.add(make_name())
+    return sorted(pool)
+
+
+def patient_names(fake, rng, count):
+    # Combine pools of first and last names so a million distinct names need
+    # only a few thousand Faker calls.
+    side = max(1, math.isqrt(count) + 1)
+    first_names = name_pool(fake.first_name, side, side * 20)
+    last_names = name_pool(fake.last_name, side, side * 20)
+    combinations = len(first_names) * len(last_names)
+
+    for index in rng.sample(range(combinations), min(count, combinations)):
+        first, last = divmod(index, len(last_names))
+        yield f'{first_names[first]} {last_names[last]}'
+
+    for position in range(combinations, count):
+        yield f'{rng.choice(first_names)} {rng.choice(last_names)} {position}'
+
+
+def shift_rows(count, hospitals, departments):
+    # Fill this week's day/evening/night slots in turn, moving to the next
+    # hospital/department pair with every shift and every pass over the week.
+    week_start = week_bounds(date.today())[0]
+    slots = [week_start + timedelta(days=day, hours=hour) for day in range(7) for hour in SHIFT_STARTS]
+    cells = [(hospital_id, department_id)
+             for hospital_id in range(1, hospitals + 1) for department_id in range(1, departments + 1)]
+    for id in range(1, count + 1):
+        rounds, slot = divmod(id - 1, len(slots))
+        starts_at = slots[slot]
+        hospital_id, department_id = cells[(slot + rounds) % len(cells)]
+        yield {
+            'id': id,
+            'hospital_id': hospital_id,
+            'department_id': department_id,
+            'starts_at': starts_at,
+            'ends_at': starts_at + timedelta(hours=SHIFT_HOURS),
+        }
+
+
+def department_names(count):
+    names = DEPARTMENT_NAMES[:count]
+    names += [f'{DEPARTMENT_NAMES[i % len(DEPARTMENT_NAMES)]} {i // len(DEPARTMENT_NAMES) + 1}'
+              for i in range(len(names), count)]
+    return names
+
+
+# --------------------
+# Seeding
+# --------------------
+
+def clear_tables():
+    # Every row is replaced, so every client polling the change feed must
+    # reload: raise the floor past the latest version.
+    floor = latest_version() + 1
+    set_version(db.session.connection(), CHANGES_FLOOR_VERSION, floor)
+    # Row-by-row index triggers would double the seed's time; generate()
+    # indexes every row at the end and puts them back.
+    drop_search_triggers(db.session.connection(), *SEARCH_TABLES)
+    clear_search_index(db.session.connection())
+    for model in (Change, CensusCount, PendingCensusChange, Assignment, Availability, Shift, Patient, User, Hospital, Department):
+        db.session.execute(delete(model))
+
+    # Autoincrement never reuses an id, so a placeholder at the floor makes
+    # the next change's version greater than the floor clients reload at.
+    placeholder = {'id': floor, 'table_name': '', 'row_id': 0, 'user_id': 0, 'deleted': True, 'changed_at': datetime.now()}
+    db.session.execute(insert(Change.__table__), [placeholder])
+    db.session.execute(delete(Change).where(Change.id == floor))
+
+
+def insert_batches(model, rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(insert(model.__table__), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(model.__table__), batch)
+
+
+def quiet(message):
+    pass
+
+
+def generate(users=4, hospitals=5, departments=5, patients=20, seed=0,
+             shared_password=None, batch_size=10_000, shifts=21, log=quiet):
     fake = Faker()
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+
+    clear_tables()
+
+    log(f'Creating {users} users...')
+    shared_hash = None
+    if shared_password:
+        shared_hash = bcrypt.generate_password_hash(shared_password.encode('utf-8')).decode('utf-8')
+    user_names = unique_names(fake.first_name, users)
+    insert_batches(User, (
+        {
+            'id': id,
+            'name': name,
+            '_password_hash': shared_hash or bcrypt.generate_password_hash(name.encode('utf-8')).decode('utf-8'),
+        }
+        for id, name in enumerate(user_names, start=1)
+    ), batch_size)
+
+    log(f'Creating {hospitals} hospitals...')
+    hospital_names = unique_names(lambda: f'{fake.city()} {rng.choice(HOSPITAL_SUFFIXES)}', hospitals)
+    insert_batches(Hospital, (
+        {'id': id, 'name': name, 'phone_number': fake.numerify('##########')}
+        for id, name in enumerate(hospital_names, start=1)
+    ), batch_size)
+
+    log(f'Creating {departments} departments...')
+    insert_batches(Department, (
+        {'id': id, 'name': name}
+        for id, name in enumerate(department_names(departments), start=1)
+    ), batch_size)
+
+    log(f'Creating {patients} patients...')
+    oldest = date.today() - timedelta(days=365 * 100)
+    insert_batches(Patient, (
+        {
+            'id': id,
+            'name': name,
+            'date_of_birth': oldest + timedelta(days=rng.randrange(365 * 99)),
+            'user_id': rng.randint(1, users) if users else None,
+            'hospital_id': rng.randint(1, hospitals) if hospitals else None,
+            'department_id': rng.randint(1, departments) if departments else None,
+        }
+        for id, name in enumerate(patient_names(fake, rng, patients), start=1)
+    ), batch_size)
+
+    if hospitals and departments:
+        log(f'Creating {shifts} shifts...')
+        insert_batches(Shift, shift_rows(shifts, hospitals, departments), batch_size)
+
+    rebuild_census(db.session.connection())
+    for table in SEARCH_TABLES:
+        index_rows(db.session.connection(), table)
+    optimize_search_index(db.session.connection())
+    create_search_triggers(db.session.connection())
+    bump_versions(db.session.connection(), Hospital.__tablename__, Department.__tablename__, ALL_PATIENTS_VERSION)
+    db.session.commit()
+    return user_names
+
+
+@click.command('seed')
+@click.option('--users', default=4, show_default=True, help='Number of nurses.')
+@click.option('--hospitals', default=5, show_default=True)
+@click.option('--departments', default=5, show_default=True)
+@click.option('--patients', default=20, show_default=True)
+@click.option('--seed', 'seed', default=0, show_default=True, help='Random seed for Faker and the generator.')
+@click.option('--shared-password', default=None,
+              help='Hash this password once and give it to every user. '
+                   'By default each user gets their own name as password, hashed separately.')
+@click.option('--batch-size', default=10_000, show_default=True)
+@click.option('--shifts', default=21, show_default=True,
+              help="Department shifts to create in the current week, three 8-hour shifts a day.")
+def seed_command(users, hospitals, departments, patients, seed, shared_password, batch_size, shifts):
+    """Replace the database contents with a generated dataset."""
+    started = time.perf_counter()
     with app.app_context():
-        print("Starting seed...")
-        
-        User.query.delete()
-        Hospital.query.delete()
-        Department.query.delete()
-        Patient.query.delete()
-
-        print('Creating users...')
-
-        lashawn = User(name='Lashawn')
-        lashawn.password_hash = 'Lashawn'
-        khalid = User(name='Khalid')
-        khalid.password_hash = 'Khalid'
-        joseph = User(name='Joseph')
-        joseph.password_hash = 'Joseph'
-        yazen = User(name='Yazen')
-        yazen.password_hash = 'Yazen'
-
-        users = [lashawn, khalid, joseph, yazen]
-
-        print('Creating hospitals...')
-
-        u_chicago = Hospital(name='University of Chicago Medicine', phone_number='7737021000')
-        northwestern = Hospital(name='Northwestern Memorial Hospital', phone_number='3129262000')
-        rush = Hospital(name='Rush University Medical Center', phone_number='8883527874')
-        evanston = Hospital(name='Evanston Hospital', phone_number='8475702000')
-        christ = Hospital(name='Advocate Christ Medical Center', phone_number='7086848000')
-
-        hospitals = [u_chicago, northwestern, rush, evanston, christ]
-
-        print('Creating departments...')
-
-        cardiology = Department(name='Cardiology')
-        neurology = Department(name='Neurology')
-        oncology = Department(name='Oncology')
-        emergency = Department(name='Emergency Medicine')
-        orthopedics = Department(name='Orthopedics')
-
-        departments = [cardiology, neurology, oncology, emergency, orthopedics]
-
-        print('Creating patients...')
-
-        maria = Patient(name='Maria Gonzalez', date_of_birth=date(1980, 4, 12), user=lashawn, hospital=u_chicago, department=cardiology)
-        james = Patient(name='James Carter', date_of_birth=date(1975, 11, 8), user=lashawn, hospital=rush, department=neurology)
-        alicia = Patient(name='Alicia Kim', date_of_birth=date(1990, 6, 20), user=lashawn, hospital=christ, department=oncology)
-        robert = Patient(name='Robert Thomas', date_of_birth=date(1968, 2, 14), user=lashawn, hospital=evanston, department=orthopedics)
-        linda = Patient(name='Linda Perez', date_of_birth=date(2001, 10, 25), user=lashawn, hospital=northwestern, department=emergency)
-
-        anthony = Patient(name='Anthony Davis', date_of_birth=date(1985, 1, 13), user=khalid, hospital=u_chicago, department=neurology)
-        sophia = Patient(name='Sophia Patel', date_of_birth=date(1998, 12, 30), user=khalid, hospital=christ, department=cardiology)
-        brian = Patient(name='Brian Lee', date_of_birth=date(1979, 9, 3), user=khalid, hospital=northwestern, department=oncology)
-        karen = Patient(name='Karen Smith', date_of_birth=date(1965, 5, 10), user=khalid, hospital=rush, department=orthopedics)
-        william = Patient(name='William Brown', date_of_birth=date(1992, 7, 19), user=khalid, hospital=evanston, department=emergency)
-
-        emily = Patient(name='Emily Johnson', date_of_birth=date(2000, 8, 28), user=joseph, hospital=rush, department=cardiology)
-        jason = Patient(name='Jason Nguyen', date_of_birth=date(1983, 3, 16), user=joseph, hospital=u_chicago, department=oncology)
-        angela = Patient(name='Angela White', date_of_birth=date(1977, 6, 4), user=joseph, hospital=christ, department=neurology)
-        michael = Patient(name='Michael Rodriguez', date_of_birth=date(1969, 12, 9), user=joseph, hospital=northwestern, department=orthopedics)
-        david = Patient(name='David Wilson', date_of_birth=date(1994, 2, 22), user=joseph, hospital=evanston, department=emergency)
-
-        hannah = Patient(name='Hannah Green', date_of_birth=date(1999, 11, 11), user=yazen, hospital=northwestern, department=neurology)
-        ethan = Patient(name='Ethan Martinez', date_of_birth=date(1986, 9, 7), user=yazen, hospital=u_chicago, department=emergency)
-        olivia = Patient(name='Olivia Turner', date_of_birth=date(1972, 1, 28), user=yazen, hospital=christ, department=oncology)
-        daniel = Patient(name='Daniel Scott', date_of_birth=date(1991, 5, 3), user=yazen, hospital=rush, department=cardiology)
-        grace = Patient(name='Grace Evans', date_of_birth=date(2004, 3, 17), user=yazen, hospital=evanston, department=orthopedics)
-
-        patients = [
-            maria, james, alicia, robert, linda,
-            anthony, sophia, brian, karen, william,
-            emily, jason, angela, michael, david,
-            hannah, ethan, olivia, daniel, grace
-        ]
-
-        db.session.add_all(users)
-        db.session.add_all(hospitals)
-        db.session.add_all(departments)
-        db.session.add_all(patients)
-        db.session.commit()
-
-        print('Seeding complete!')
\ No newline at end of file
+        click.echo('Starting seed...')
+        user_names = generate(users, hospitals, departments, patients, seed,
+                              shared_password, batch_size, shifts, log=click.echo)
+
+    click.echo(f'Seeding complete in {time.perf_counter() - started:.1f}s!')
+    if user_names:
+        password = shared_password or user_names[0]
+        click.echo(f'Log in as {user_names[0]!r} with password {password!r}.')
+
+
+if __name__ == '__main__':
+    seed_command()
@@ -0,0 +1,67 @@
+# Standard library imports
+import os
+import tempfile
+
+# The app reads its configuration on import, so point it at a throwaway
+# database, with cheap bcrypt hashing done inline, before anything imports it.
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='tests-'), 'app.db')}"
+os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["RESPONSE_CACHE_BACKEND"] = "memory"
+
+# Remote library imports
+import pytest
+from sqlalchemy import event
+
+# Local imports
+from app import app as flask_app, response_cache, user_identities, versioned_responses
+from config import db
+from seed import generate
+
+PASSWORD = "password"
+
+
+@pytest.fixture(scope="session")
+def app():
+    with flask_app.app_context():
+        db.create_all()
+    return flask_app
+
+
+@pytest.fixture
+def seed(app):
+    """Replace the database with a generated dataset; returns the nurses' names."""
+    def seed(**shape):
+        shape.setdefault("shifts", 0)
+        with app.app_context():
+            names = generate(**shape, shared_password=PASSWORD)
+        for cache in (user_identities, versioned_responses, response_cache):
+            cache.clear()
+        return names
+    return seed
+
+
+@pytest.fixture
+def login(app):
+    """Return a test client logged in as the named nurse."""
+    def login(name):
+        client = app.test_client()
+        response = client.post("/login", json={"name": name, "password": PASSWORD})
+        assert response.status_code == 200, response.get_json()
+        return client
+    return login
+
+
+@pytest.fixture
+def statements(app):
+    """The SQL of every statement executed while the test runs."""
+    executed = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
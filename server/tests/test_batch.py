@@ -0,0 +1,104 @@
+# Standard library imports
+from datetime import date
+
+# Remote library imports
+from sqlalchemy import func, select
+
+# Local imports
+from config import db
+from models import Patient, deferred_unique_checks
+
+
+def nurse_patients(app, user_id):
+    with app.app_context():
+        return dict(db.session.execute(
+            select(Patient.id, Patient.department_id).where(Patient.user_id == user_id).order_by(Patient.id)
+        ).all())
+
+
+def test_batch_commits_every_operation_or_none(app, seed, login):
+    names = seed(users=1, hospitals=2, departments=3, patients=6, seed=1)
+    client = login(names[0])
+    before = nurse_patients(app, 1)
+    first, second = list(before)[:2]
+    target = 3 if before[first] != 3 else 2
+
+    response = client.post("/batch", json={"requests": [
+        {"method": "PATCH", "path": f"/patients/{first}", "body": {"department_id": target}},
+        {"method": "POST", "path": "/patients", "body": {
+            "name": "Cosima Hale", "date_of_birth": "1988-08-08", "hospital_id": 1, "department_id": 2,
+        }},
+        {"method": "PATCH", "path": "/patients/999999", "body": {"department_id": 1}},
+        {"method": "PATCH", "path": f"/patients/{second}", "body": {"department_id": 3}},
+    ]})
+    body = response.get_json()
+    assert response.status_code == 404
+    assert body["committed"] is False
+    # The batch stops at the first failure.
+    assert [result["status"] for result in body["results"]] == [202, 201, 404]
+    assert nurse_patients(app, 1) == before
+    assert client.get("/census").get_json()["caseload"] == len(before)
+
+    response = client.post("/batch", json={"requests": [
+        {"method": "PATCH", "path": f"/patients/{first}", "body": {"department_id": target}},
+        {"method": "GET", "path": f"/patients/{first}"},
+    ]})
+    body = response.get_json()
+    assert response.status_code == 200 and body["committed"] is True
+    # Later operations see the batch's earlier, not yet committed, writes.
+    assert body["results"][1]["body"]["department"]["id"] == target
+    assert nurse_patients(app, 1)[first] == target
+
+
+def name_lookups(statements):
+    return [statement for statement in statements if "WHERE patients.name" in statement]
+
+
+def new_patient(name):
+    return {"method": "POST", "path": "/patients", "body": {
+        "name": name, "date_of_birth": "1990-01-01", "hospital_id": 1, "department_id": 1,
+    }}
+
+
+def test_deferred_checks_look_up_every_new_name_in_one_query(app, seed, statements):
+    seed(users=1, hospitals=1, departments=1, patients=5, seed=1)
+    with app.app_context():
+        del statements[:]
+        with deferred_unique_checks(db.session) as session:
+            session.add_all(
+                Patient(name=f"Deferred Patient {n}", date_of_birth=date(1970, 1, 1), user_id=1,
+                        hospital_id=1, department_id=1)
+                for n in range(50)
+            )
+            session.flush()
+        lookups = name_lookups(statements)
+        assert len(lookups) == 1 and " IN " in lookups[0]
+        db.session.rollback()
+
+
+def test_batch_checks_each_new_name_once_at_flush(app, seed, login, statements):
+    names = seed(users=1, hospitals=1, departments=1, patients=5, seed=1)
+    client = login(names[0])
+
+    del statements[:]
+    response = client.post("/batch", json={"requests": [new_patient(f"Batch Patient {n}") for n in range(5)]})
+    assert response.status_code == 200 and response.get_json()["committed"] is True
+    lookups = name_lookups(statements)
+    assert len(lookups) == 5 and all(" IN " in lookup for lookup in lookups)
+
+
+def test_duplicate_name_inside_a_batch_rolls_the_batch_back(app, seed, login):
+    names = seed(users=1, hospitals=1, departments=1, patients=5, seed=1)
+    client = login(names[0])
+    with app.app_context():
+        count = db.session.execute(select(func.count()).select_from(Patient)).scalar()
+
+    response = client.post("/batch", json={"requests": [
+        new_patient("Evander Quill"), new_patient("Evander Quill"), new_patient("Marisol Teague"),
+    ]})
+    body = response.get_json()
+    assert response.status_code == 400 and body["committed"] is False
+    assert [result["status"] for result in body["results"]] == [201, 400]
+    assert body["results"][1]["body"] == {"error": "400: This patient name is already in use."}
+    with app.app_context():
+        assert db.session.execute(select(func.count()).select_from(Patient)).scalar() == count
@@ -0,0 +1,52 @@
+# Standard library imports
+import json
+
+# Remote library imports
+from sqlalchemy import select, text
+
+# Local imports
+from census import current_counts
+from config import db
+from models import Change, Patient, rebuild_census
+
+
+def ndjson(rows):
+    return "".join(json.dumps(row) + "\n" for row in rows)
+
+
+def test_import_in_chunks_keeps_search_census_and_changes_exact(app, seed, login, monkeypatch):
+    names = seed(users=2, hospitals=3, departments=3, patients=30, seed=1)
+    with app.app_context():
+        taken = db.session.execute(select(Patient.name).limit(1)).scalar()
+        triggers = db.session.execute(text("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'")).scalar()
+    # Three full chunks and a partial one; the first is indexed by triggers, the rest by the import.
+    monkeypatch.setitem(app.config, "BULK_CHUNK_SIZE", 10)
+    rows = [
+        {"name": f"Imported Quillon {number}", "date_of_birth": "1980-01-01",
+         "hospital_id": number % 3 + 1, "department_id": number % 3 + 1}
+        for number in range(35)
+    ]
+    rows.insert(5, {**rows[0], "name": taken})
+
+    client = login(names[0])
+    response = client.post("/patients/bulk", data=ndjson(rows), content_type="application/x-ndjson")
+    assert response.status_code == 201
+    assert response.get_json() == {
+        "inserted": 35, "error_count": 1, "errors": [{"row": 6, "error": "This patient name is already in use."}]
+    }
+
+    found = client.get("/search", query_string={"q": "quillon", "limit": 100}).get_json()
+    assert sorted(result["name"] for result in found) == sorted(row["name"] for row in rows if row["name"] != taken)
+
+    with app.app_context():
+        assert db.session.execute(text("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'")).scalar() == triggers
+        imported = set(db.session.execute(select(Patient.id).where(Patient.name.like("Imported %"))).scalars())
+        recorded = set(db.session.execute(
+            select(Change.row_id).where(Change.table_name == "patients", Change.row_id.in_(imported))
+        ).scalars())
+        assert recorded == imported
+
+        counts = current_counts()
+        rebuild_census(db.session.connection())
+        assert current_counts() == counts
+        db.session.rollback()
@@ -0,0 +1,77 @@
+# Standard library imports
+import itertools
+
+# Remote library imports
+import pytest
+
+# Local imports
+from caching import MemoryCache, SQLiteCache
+from config import db
+from models import Patient
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make_cache(max_bytes):
+        if request.param == "memory":
+            return MemoryCache(max_bytes)
+        # Every call is a second later, so each read refreshes the entry's LRU position.
+        ticks = itertools.count(step=SQLiteCache.TOUCH_INTERVAL + 1)
+        return SQLiteCache(str(tmp_path / "cache.db"), max_bytes, clock=lambda: next(ticks))
+    return make_cache
+
+
+def test_cache_evicts_least_recently_used_entries_past_max_bytes(make_cache):
+    cache = make_cache(10)
+    cache.set("a", b"aaaa")
+    cache.set("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+
+    cache.set("c", b"cccc")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (b"aaaa", b"cccc")
+    assert cache.size == 8
+
+    cache.set("a", b"aa")
+    assert cache.size == 6
+    cache.set("d", b"d" * 11)
+    assert cache.get("d") is None
+    cache.delete("c")
+    assert cache.size == 2
+    cache.clear()
+    assert cache.size == 0 and cache.get("a") is None
+
+
+def test_sqlite_cache_is_shared_across_connections(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first, second = SQLiteCache(path, 10), SQLiteCache(path, 10)
+    first.set("a", b"aaaa")
+    assert second.get("a") == b"aaaa"
+
+    second.set("b", b"bbbbbb")
+    first.set("c", b"cc")
+    assert first.get("a") is None and second.size == 8
+
+    second.delete("b")
+    assert first.get("b") is None and first.size == 2
+
+
+def patient_names(client):
+    return {patient["name"] for patient in client.get("/patients").get_json()}
+
+
+def test_patient_writes_invalidate_the_nurses_cached_patients(app, seed, login):
+    names = seed(users=2, hospitals=2, departments=2, patients=10, seed=1)
+    nurse, other = login(names[0]), login(names[1])
+    theirs = patient_names(other)
+    patient = nurse.get("/patients").get_json()[0]
+
+    assert nurse.patch(f"/patients/{patient['id']}", json={"name": "Rosalind Fairweather"}).status_code == 202
+    mine = patient_names(nurse)
+    assert "Rosalind Fairweather" in mine and patient["name"] not in mine
+
+    with app.app_context():
+        db.session.get(Patient, patient["id"]).user_id = 2
+        db.session.commit()
+    assert patient_names(nurse) == mine - {"Rosalind Fairweather"}
+    assert patient_names(other) == theirs | {"Rosalind Fairweather"}
@@ -0,0 +1,65 @@
+# Remote library imports
+from sqlalchemy import func, select
+
+# Local imports
+from census import current_counts
+from config import db
+from models import Patient, rebuild_census
+
+
+def patient_counts(app, user_id):
+    with app.app_context():
+        hospitals = dict(db.session.execute(
+            select(Patient.hospital_id, func.count()).group_by(Patient.hospital_id)
+        ).all())
+        departments = dict(db.session.execute(
+            select(Patient.department_id, func.count()).group_by(Patient.department_id)
+        ).all())
+        caseload = db.session.execute(select(func.count()).where(Patient.user_id == user_id)).scalar()
+    return hospitals, departments, caseload
+
+
+def assert_census_matches_patients(app, client):
+    report = client.get("/census").get_json()
+    hospitals, departments, caseload = patient_counts(app, 1)
+    for rows, expected in ((report["hospitals"], hospitals), (report["departments"], departments)):
+        assert {row["id"]: row["patient_count"] for row in rows if row["patient_count"]} == expected
+    assert report["caseload"] == caseload
+
+    with app.app_context():
+        counts = current_counts()
+        rebuild_census(db.session.connection())
+        assert current_counts() == counts
+        db.session.rollback()
+
+
+def test_census_follows_patient_writes(app, seed, login):
+    names = seed(users=2, hospitals=3, departments=3, patients=30, seed=1)
+    client = login(names[0])
+    assert_census_matches_patients(app, client)
+
+    response = client.post("/patients", json={
+        "name": "Ottoline Marsh", "date_of_birth": "1950-06-01", "hospital_id": 1, "department_id": 1,
+    })
+    assert response.status_code == 201
+    patient_id = response.get_json()["id"]
+    assert_census_matches_patients(app, client)
+
+    assert client.patch(f"/patients/{patient_id}", json={"hospital_id": 2, "department_id": 3}).status_code == 202
+    assert_census_matches_patients(app, client)
+
+    assert client.delete(f"/patients/{patient_id}").status_code == 204
+    assert_census_matches_patients(app, client)
+
+
+def test_census_follows_a_placement_set_on_an_expired_patient(app, seed, login):
+    names = seed(users=2, hospitals=3, departments=3, patients=30, seed=1)
+    with app.app_context():
+        patient = db.session.execute(select(Patient).where(Patient.user_id == 1)).scalars().first()
+        hospital_id = patient.hospital_id % 3 + 1
+        db.session.commit()
+        # The commit expired the patient, so these assignments must load the old values.
+        patient.hospital_id = hospital_id
+        patient.user_id = 2
+        db.session.commit()
+    assert_census_matches_patients(app, login(names[0]))
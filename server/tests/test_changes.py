@@ -0,0 +1,36 @@
+def test_change_feed_reports_upserts_and_tombstones_per_nurse(seed, login):
+    names = seed(users=2, hospitals=2, departments=2, patients=10, seed=1)
+    nurse, other = login(names[0]), login(names[1])
+    version = nurse.get("/changes").get_json()["version"]
+
+    response = nurse.post("/patients", json={
+        "name": "Perpetua Vane", "date_of_birth": "1961-02-03", "hospital_id": 1, "department_id": 1,
+    })
+    patient_id = response.get_json()["id"]
+    assert nurse.patch("/hospitals/2", json={"name": "Harbour View Hospital"}).status_code == 202
+
+    feed = nurse.get("/changes", query_string={"since": version}).get_json()
+    assert [patient["id"] for patient in feed["patients"]["upserted"]] == [patient_id]
+    assert [hospital["name"] for hospital in feed["hospitals"]["upserted"]] == ["Harbour View Hospital"]
+    assert feed["more"] is False
+
+    # Other nurses see the hospital but not the patient.
+    feed = other.get("/changes", query_string={"since": version}).get_json()
+    assert feed["patients"] == {"upserted": [], "deleted": []}
+    assert [hospital["id"] for hospital in feed["hospitals"]["upserted"]] == [2]
+
+    version = feed["version"]
+    assert nurse.delete(f"/patients/{patient_id}").status_code == 204
+    feed = nurse.get("/changes", query_string={"since": version}).get_json()
+    assert feed["patients"] == {"upserted": [], "deleted": [patient_id]}
+    assert nurse.get("/changes", query_string={"since": feed["version"]}).get_json()["patients"]["deleted"] == []
+
+
+def test_change_feed_sends_clients_from_before_a_seed_to_reload(seed, login):
+    names = seed(users=1, hospitals=1, departments=1, patients=5, seed=1)
+    version = login(names[0]).get("/changes").get_json()["version"]
+
+    names = seed(users=1, hospitals=1, departments=1, patients=5, seed=2)
+    response = login(names[0]).get("/changes", query_string={"since": version})
+    assert response.status_code == 410
+    assert response.get_json()["version"] > version
@@ -0,0 +1,92 @@
+# Remote library imports
+import pytest
+from flask import Flask, request
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine, select, text, update
+
+# Local imports
+from config import db
+from database import RoutingSession, configure_replicas
+
+
+def test_sqlite_profile_applies_to_the_app_engines_only(app):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert connection.execute(text("PRAGMA cache_size")).scalar() == -64 * 1024
+
+    with create_engine("sqlite://").connect() as connection:
+        assert connection.execute(text("PRAGMA cache_size")).scalar() == -2000
+
+
+@pytest.fixture
+def replicated(tmp_path):
+    """A primary and one replica whose notes differ, and a client of an app reading both."""
+    replica_app = Flask(__name__)
+    replica_app.secret_key = "test"
+    replica_app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+        READ_REPLICA_URLS=[f"sqlite:///{tmp_path / 'replica.db'}"],
+        READ_YOUR_WRITES_SECONDS=60,
+    )
+    configure_replicas(replica_app)
+    replica_db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+    class Note(replica_db.Model):
+        id = replica_db.Column(replica_db.Integer, primary_key=True)
+        body = replica_db.Column(replica_db.String, nullable=False)
+
+    replica_db.init_app(replica_app)
+    with replica_app.app_context():
+        for key, body in ((None, "primary"), ("replica_0", "replica")):
+            engine = replica_db.engines[key]
+            Note.__table__.create(engine)
+            with engine.begin() as connection:
+                connection.execute(Note.__table__.insert().values(id=1, body=body))
+
+    def notes():
+        return sorted(replica_db.session.execute(select(Note.body)).scalars())
+
+    @replica_app.route("/notes", methods=["GET", "POST"])
+    def read_notes():
+        seen = [notes()]
+        if "add" in request.args:
+            replica_db.session.add(Note(body=request.args["add"]))
+            replica_db.session.flush()
+            seen.append(notes())
+        if "rename" in request.args:
+            replica_db.session.execute(update(Note).where(Note.id == 1).values(body=request.args["rename"]))
+            seen.append(notes())
+        replica_db.session.commit()
+        return {"seen": seen}
+
+    return replica_app.test_client()
+
+
+def test_get_requests_read_from_the_replica(replicated):
+    assert replicated.get("/notes").get_json()["seen"] == [["replica"]]
+    # Only writes pin the client to the primary.
+    with replicated.session_transaction() as session:
+        assert "primary_until" not in session
+
+
+def test_a_flush_moves_the_rest_of_the_request_to_the_primary(replicated):
+    seen = replicated.get("/notes", query_string={"add": "flushed"}).get_json()["seen"]
+    assert seen == [["replica"], ["flushed", "primary"]]
+    with replicated.session_transaction() as session:
+        assert session["primary_until"] > 0
+
+
+def test_dml_runs_on_the_primary_and_the_next_get_stays_there(replicated):
+    seen = replicated.get("/notes", query_string={"rename": "renamed"}).get_json()["seen"]
+    assert seen == [["replica"], ["renamed"]]
+    # Read your writes: the cookie keeps this client's next GET on the primary.
+    assert replicated.get("/notes").get_json()["seen"] == [["renamed"]]
+
+    with replicated.session_transaction() as session:
+        session["primary_until"] = 0
+    assert replicated.get("/notes").get_json()["seen"] == [["replica"]]
+
+
+def test_non_get_requests_read_from_the_primary(replicated):
+    assert replicated.post("/notes").get_json()["seen"] == [["primary"]]
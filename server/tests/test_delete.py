@@ -0,0 +1,44 @@
+# Remote library imports
+from sqlalchemy import func, select
+
+# Local imports
+from census import current_counts
+from config import db
+from models import Assignment, CensusCount, Hospital, Patient, Shift, rebuild_census
+
+
+def rows_by_hospital(app):
+    with app.app_context():
+        return {
+            model.__tablename__: dict(db.session.execute(
+                select(model.hospital_id, func.count()).group_by(model.hospital_id)
+            ).all())
+            for model in (Patient, Shift, CensusCount)
+        }
+
+
+def test_deleting_a_hospital_removes_its_rows_in_chunks(app, seed, login, monkeypatch):
+    names = seed(users=2, hospitals=2, departments=2, patients=60, shifts=21, seed=1)
+    monkeypatch.setitem(app.config, "BULK_DELETE_CHUNK_SIZE", 7)
+    client = login(names[0])
+    assert client.post("/schedules", json={}).status_code == 201
+    before = rows_by_hospital(app)
+    assert before["patients"][1] > app.config["BULK_DELETE_CHUNK_SIZE"]
+    assert 1 in before["shifts"] and 1 in before["census_counts"]
+
+    response = client.delete("/hospitals/1")
+    assert response.status_code == 200
+    assert response.get_json() == {"deleted_patients": before["patients"][1]}
+
+    after = rows_by_hospital(app)
+    assert after["patients"] == {2: before["patients"][2]}
+    assert after["shifts"] == {2: before["shifts"][2]}
+    assert 1 not in after["census_counts"]
+    with app.app_context():
+        assert db.session.get(Hospital, 1) is None
+        orphaned = select(func.count()).select_from(Assignment).where(Assignment.shift_id.not_in(select(Shift.id)))
+        assert db.session.execute(orphaned).scalar() == 0
+        counts = current_counts()
+        rebuild_census(db.session.connection())
+        assert current_counts() == counts
+        db.session.rollback()
@@ -0,0 +1,26 @@
+# Standard library imports
+from types import SimpleNamespace
+
+# Remote library imports
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, exc, text
+
+# Local imports
+from instrumentation import Instrumentation, current_stats
+
+
+def test_failed_statement_does_not_leave_its_start_time_behind():
+    app = Flask(__name__)
+    app.config["N_PLUS_ONE_THRESHOLD"] = 10
+    engine = create_engine("sqlite://")
+    Instrumentation(app, SimpleNamespace(engines={None: engine}))
+
+    with app.test_request_context(), engine.connect() as connection:
+        app.preprocess_request()
+        with pytest.raises(exc.OperationalError):
+            connection.execute(text("SELECT * FROM missing"))
+        connection.execute(text("SELECT 1"))
+
+        assert connection.info["query_started"] == []
+        assert current_stats().statements == 2
@@ -0,0 +1,42 @@
+# Remote library imports
+import pytest
+from sqlalchemy import select
+
+# Local imports
+from config import db, password_hasher
+from models import User
+from passwords import PasswordHasherBusy, hash_rounds
+from tests.conftest import PASSWORD
+
+
+def stored_hash(app, name):
+    with app.app_context():
+        return db.session.execute(select(User._password_hash).where(User.name == name)).scalar_one()
+
+
+@pytest.fixture
+def stale_nurse(app, seed, monkeypatch):
+    """A nurse whose hash was made with fewer rounds than the hasher now uses."""
+    name = seed(users=1, hospitals=1, departments=1, patients=1, seed=1)[0]
+    monkeypatch.setattr(password_hasher, "rounds", hash_rounds(stored_hash(app, name)) + 1)
+    return name
+
+
+def test_login_upgrades_a_stale_hash(app, stale_nurse):
+    response = app.test_client().post("/login", json={"name": stale_nurse, "password": PASSWORD})
+    assert response.status_code == 200
+    assert hash_rounds(stored_hash(app, stale_nurse)) == password_hasher.rounds
+
+
+def test_login_succeeds_when_the_hasher_is_too_busy_to_upgrade(app, stale_nurse, monkeypatch):
+    before = stored_hash(app, stale_nurse)
+
+    def busy(password):
+        raise PasswordHasherBusy()
+    monkeypatch.setattr(password_hasher, "hash", busy)
+
+    client = app.test_client()
+    response = client.post("/login", json={"name": stale_nurse, "password": PASSWORD})
+    assert response.status_code == 200
+    assert client.get("/check_session").status_code == 200
+    assert stored_hash(app, stale_nurse) == before
@@ -0,0 +1,99 @@
+# Standard library imports
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# Local imports
+from scheduler import Nurse, ShiftDemand, repair, solve
+
+MONDAY = datetime(2026, 1, 5)
+FLOAT_PENALTY = 12
+
+
+def shift(id, cell, day, hour, demand, hours=8):
+    starts_at = MONDAY + timedelta(days=day, hours=hour)
+    return ShiftDemand(id, cell, starts_at, starts_at + timedelta(hours=hours), hours, demand)
+
+
+def nurse(id, max_hours=40, windows=(), cells=()):
+    return Nurse(id, max_hours, tuple(windows), frozenset(cells))
+
+
+def test_nurse_works_one_of_two_overlapping_shifts():
+    schedule = solve([shift(1, (1, 1), 0, 7, 1), shift(2, (1, 2), 0, 11, 1)], [nurse(1)], FLOAT_PENALTY)
+    assert len(schedule.assignments) == 1
+    assert sum(schedule.unfilled.values()) == 1
+
+
+def test_nurse_stops_at_max_weekly_hours():
+    shifts = [shift(id, (1, 1), day, 7, 1) for id, day in enumerate(range(3), start=1)]
+    schedule = solve(shifts, [nurse(1, max_hours=16)], FLOAT_PENALTY)
+    assert len(schedule.assignments) == 2
+    assert schedule.unfilled == {3: 1}
+
+
+def test_nurse_only_works_inside_recorded_availability():
+    monday_only = [(MONDAY, MONDAY + timedelta(days=1))]
+    shifts = [shift(1, (1, 1), 0, 7, 1), shift(2, (1, 1), 1, 7, 1)]
+    schedule = solve(shifts, [nurse(1, windows=monday_only)], FLOAT_PENALTY)
+    assert schedule.assignments == [(1, 1)]
+    assert schedule.unfilled == {2: 1}
+
+
+def test_familiar_nurse_is_preferred_over_a_float():
+    nurses = [nurse(1, cells=[(2, 2)]), nurse(2, cells=[(1, 1)])]
+    schedule = solve([shift(1, (1, 1), 0, 7, 1)], nurses, FLOAT_PENALTY)
+    assert schedule.assignments == [(1, 2)]
+
+
+def test_scheduled_week_respects_overlaps_and_hours(seed, login):
+    names = seed(users=6, hospitals=2, departments=2, patients=80, shifts=21, seed=1)
+    client = login(names[0])
+
+    summary = client.post("/schedules", json={}).get_json()
+    assert summary["shifts"] == 21
+    assert summary["assigned"] + summary["unfilled"] == summary["demand"]
+    assert summary["assigned"] > 0
+
+    worked = defaultdict(list)
+    for scheduled in client.get("/schedules").get_json():
+        for assigned in scheduled["nurses"]:
+            worked[assigned["id"]].append(
+                (datetime.fromisoformat(scheduled["starts_at"]), datetime.fromisoformat(scheduled["ends_at"]))
+            )
+    assert sum(len(shifts) for shifts in worked.values()) == summary["assigned"]
+    for shifts in worked.values():
+        shifts.sort()
+        assert all(earlier[1] <= later[0] for earlier, later in zip(shifts, shifts[1:]))
+        assert sum((ends_at - starts_at).total_seconds() / 3600 for starts_at, ends_at in shifts) <= 40
+
+
+def test_repair_releases_floats_from_an_over_staffed_shift():
+    shifts = [shift(1, (1, 1), 0, 7, 1), shift(2, (1, 1), 1, 7, 2)]
+    assignments = [(1, 1), (1, 2), (2, 1), (2, 2)]
+    nurses = [nurse(1, cells=[(2, 2)]), nurse(2, cells=[(1, 1)])]
+    result = repair(shifts, assignments, {1}, nurses, FLOAT_PENALTY)
+    assert result.removed == [(1, 1)]
+    assert result.added == []
+
+
+def test_repair_fills_a_short_shift_around_the_rest_of_the_week():
+    # Nurse 1 already works an overlapping shift that did not change.
+    shifts = [shift(1, (1, 1), 0, 7, 2), shift(2, (1, 2), 0, 7, 1)]
+    result = repair(shifts, [(1, 2), (2, 1)], {1}, [nurse(1), nurse(2), nurse(3)], FLOAT_PENALTY)
+    assert result.removed == []
+    assert result.added == [(1, 3)]
+    assert result.unfilled == {}
+
+
+def test_repair_consumes_pending_census_changes(seed, login):
+    names = seed(users=2, hospitals=2, departments=2, patients=20, shifts=21, seed=1)
+    client = login(names[0])
+    assert client.post("/schedules", json={}).status_code == 201
+    assert client.post("/schedules/repair").get_json()["cells"] == 0
+
+    response = client.post("/patients", json={
+        "name": "Linus Ardent", "date_of_birth": "1979-04-04", "hospital_id": 2, "department_id": 1,
+    })
+    assert response.status_code == 201
+    assert client.post("/schedules/repair").get_json()["cells"] == 1
+    assert client.post("/schedules/repair").get_json()["cells"] == 0
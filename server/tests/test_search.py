@@ -0,0 +1,28 @@
+# Remote library imports
+from sqlalchemy import func, select, text
+
+# Local imports
+from config import db
+from models import Department, Hospital, Patient
+from search import SEARCH_INDEX
+
+
+def test_seed_indexes_every_row_and_restores_the_triggers(app, seed, login):
+    names = seed(users=2, hospitals=3, departments=3, patients=50, seed=1)
+    with app.app_context():
+        rows = sum(db.session.execute(select(func.count()).select_from(model)).scalar()
+                   for model in (Patient, Hospital, Department))
+        indexed = db.session.execute(text(f"SELECT count(*) FROM {SEARCH_INDEX}")).scalar()
+        patient = db.session.execute(select(Patient).where(Patient.user_id == 1).limit(1)).scalar_one()
+        placement = {"hospital_id": patient.hospital_id, "department_id": patient.department_id}
+    assert indexed == rows
+
+    client = login(names[0])
+    found = client.get("/search", query_string={"q": patient.name}).get_json()
+    assert {"type": "patient", "id": patient.id, "name": patient.name} in found
+
+    # Written after the seed, so only the triggers can have indexed it.
+    response = client.post("/patients", json={"name": "Zebedee Quarrington", "date_of_birth": "1970-01-01", **placement})
+    assert response.status_code == 201
+    found = client.get("/search", query_string={"q": "zebedee"}).get_json()
+    assert found == [{"type": "patient", "id": response.get_json()["id"], "name": "Zebedee Quarrington"}]
@@ -0,0 +1,22 @@
+# Session and login responses serialize the nurse's hospital and department
+# trees from one query over their own caseload, so the statements they run
+# must not grow with the census: not with other nurses' patients, and not with
+# the number of hospitals and departments the nurse's patients are spread over.
+
+def statement_counts(seed, login, statements, patients):
+    names = seed(users=4, hospitals=20, departments=20, patients=patients, seed=1)
+    statements.clear()
+    client = login(names[0])
+    counts = {"login": len(statements)}
+
+    for path in ("/check_session", "/users/1"):
+        statements.clear()
+        assert client.get(path).status_code == 200
+        counts[path] = len(statements)
+    return counts
+
+
+def test_session_statements_do_not_grow_with_census(seed, login, statements):
+    small = statement_counts(seed, login, statements, patients=40)
+    large = statement_counts(seed, login, statements, patients=4000)
+    assert small == large
@@ -0,0 +1,83 @@
+# Standard library imports
+from types import SimpleNamespace
+
+# Remote library imports
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+# Local imports
+from census import current_counts
+from config import db
+from models import ID_LIST_CHUNK_SIZE, Change, Patient, ids_in, rebuild_census
+
+
+def placements(app, user_id):
+    with app.app_context():
+        rows = db.session.execute(
+            select(Patient.id, Patient.hospital_id, Patient.department_id).where(Patient.user_id == user_id)
+        )
+        return {patient_id: (hospital_id, department_id) for patient_id, hospital_id, department_id in rows}
+
+
+def assert_census_exact(app):
+    with app.app_context():
+        counts = current_counts()
+        rebuild_census(db.session.connection())
+        assert current_counts() == counts
+        db.session.rollback()
+
+
+def test_transfer_by_placement_moves_only_the_nurses_patients(app, seed, login, monkeypatch):
+    names = seed(users=2, hospitals=3, departments=2, patients=120, seed=1)
+    monkeypatch.setitem(app.config, "BULK_TRANSFER_CHUNK_SIZE", 7)
+    before, others = placements(app, 1), placements(app, 2)
+    at_hospital_1 = [patient_id for patient_id, placement in before.items() if placement[0] == 1]
+    already_there = sum(placement == (1, 2) for placement in before.values())
+
+    client = login(names[0])
+    version = client.get("/changes").get_json()["version"]
+    response = client.post("/patients/transfer", json={"from": {"hospital_id": 1}, "to": {"department_id": 2}})
+    assert response.get_json() == {
+        "matched": len(at_hospital_1),
+        "transferred": len(at_hospital_1) - already_there,
+        "unchanged": already_there,
+    }
+
+    after = placements(app, 1)
+    assert all(after[patient_id] == (1, 2) for patient_id in at_hospital_1)
+    assert {patient_id: placement for patient_id, placement in after.items() if patient_id not in at_hospital_1} == {
+        patient_id: placement for patient_id, placement in before.items() if patient_id not in at_hospital_1
+    }
+    assert placements(app, 2) == others
+    assert_census_exact(app)
+
+    with app.app_context():
+        changed = set(db.session.execute(select(Change.row_id).where(Change.id > version)).scalars())
+    assert changed == {patient_id for patient_id in at_hospital_1 if before[patient_id] != (1, 2)}
+
+
+def test_transfer_by_id_counts_other_nurses_patients_as_not_found(app, seed, login):
+    names = seed(users=2, hospitals=2, departments=2, patients=40, seed=1)
+    others = placements(app, 2)
+    mine, theirs = list(placements(app, 1)), list(others)
+
+    response = login(names[0]).post(
+        "/patients/transfer", json={"patient_ids": mine[:5] + theirs[:3] + [10 ** 6], "to": {"hospital_id": 2}}
+    )
+    body = response.get_json()
+    assert body["matched"] == 5 and body["not_found"] == 4
+    assert all(placements(app, 1)[patient_id][0] == 2 for patient_id in mine[:5])
+    assert placements(app, 2) == others
+    assert_census_exact(app)
+
+
+def test_ids_in_binds_one_json_array_on_sqlite_and_chunks_elsewhere(app):
+    ids = range(ID_LIST_CHUNK_SIZE * 2 + 1)
+    with app.app_context():
+        assert len(list(ids_in(db.session.connection(), Patient.id, ids))) == 1
+        db.session.rollback()
+
+    conditions = list(ids_in(SimpleNamespace(dialect=postgresql.dialect()), Patient.id, ids))
+    assert [len(condition.compile(dialect=postgresql.dialect()).params["id_1"]) for condition in conditions] == [
+        ID_LIST_CHUNK_SIZE, ID_LIST_CHUNK_SIZE, 1
+    ]
@@ -0,0 +1,42 @@
+def test_unchanged_collection_answers_not_modified(seed, login):
+    names = seed(users=1, hospitals=3, departments=3, patients=5, seed=1)
+    client = login(names[0])
+
+    response = client.get("/hospitals")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200 and etag.startswith('"hospitals-')
+    assert len(response.get_json()) == 3
+
+    response = client.get("/hospitals", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.headers["ETag"] == etag
+    assert response.get_data() == b""
+
+    # Other query strings are other representations.
+    assert client.get("/hospitals", query_string={"limit": 1}).headers["ETag"] != etag
+
+
+def test_repeat_fetch_only_looks_up_the_version(seed, login, statements):
+    names = seed(users=1, hospitals=3, departments=3, patients=5, seed=1)
+    client = login(names[0])
+    first = client.get("/departments")
+
+    del statements[:]
+    repeat = client.get("/departments")
+    assert repeat.get_data() == first.get_data() and repeat.headers["ETag"] == first.headers["ETag"]
+    assert len(statements) == 1 and "FROM table_versions" in statements[0]
+
+
+def test_hospital_and_department_writes_change_the_etag(seed, login):
+    names = seed(users=1, hospitals=3, departments=3, patients=5, seed=1)
+    client = login(names[0])
+    hospitals, departments = client.get("/hospitals"), client.get("/departments")
+
+    assert client.patch("/hospitals/2", json={"name": "Larkspur General"}).status_code == 202
+    response = client.get("/hospitals", headers={"If-None-Match": hospitals.headers["ETag"]})
+    assert response.status_code == 200 and response.headers["ETag"] != hospitals.headers["ETag"]
+    assert "Larkspur General" in {hospital["name"] for hospital in response.get_json()}
+
+    assert client.post("/departments", json={"name": "Hyperbaric Medicine"}).status_code == 201
+    response = client.get("/departments", headers={"If-None-Match": departments.headers["ETag"]})
+    assert response.status_code == 200 and response.headers["ETag"] != departments.headers["ETag"]
+    assert len(response.get_json()) == 4